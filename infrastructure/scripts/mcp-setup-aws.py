@@ -14,6 +14,10 @@ import sys
 from typing import Dict, List, Any, Optional
 from botocore.exceptions import ClientError, BotoCoreError
 
+# Lambda共通ライブラリ（infrastructure/shared）を参照
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from itsandbox_common import create_client
+
 # ログ設定
 logging.basicConfig(
     level=logging.INFO,
@@ -34,14 +38,14 @@ class ITSANDBOXAWSSetup:
             else:
                 session = boto3.Session()
             
-            # クライアント初期化
-            self.organizations = session.client('organizations', region_name=region)
-            self.iam = session.client('iam', region_name=region)
-            self.sts = session.client('sts', region_name=region)
-            self.budgets = session.client('budgets', region_name=region)
-            self.sns = session.client('sns', region_name=region)
-            self.s3 = session.client('s3', region_name=region)
-            self.dynamodb = session.client('dynamodb', region_name=region)
+            # クライアント初期化（共通の接続プール・リトライ設定）
+            self.organizations = create_client('organizations', session=session, region_name=region)
+            self.iam = create_client('iam', session=session, region_name=region)
+            self.sts = create_client('sts', session=session, region_name=region)
+            self.budgets = create_client('budgets', session=session, region_name=region)
+            self.sns = create_client('sns', session=session, region_name=region)
+            self.s3 = create_client('s3', session=session, region_name=region)
+            self.dynamodb = create_client('dynamodb', session=session, region_name=region)
             
             # 現在のアカウント情報取得
             self.current_account = self.sts.get_caller_identity()
@@ -0,0 +1,50 @@
+"""
+ITSANDBOX Lambda 共通ライブラリ
+全Lambda関数・セットアップスクリプトで共有するユーティリティ
+"""
+
+from .aws_config import (
+    DEFAULT_MAX_WORKERS,
+    build_client_config,
+    create_client,
+    retry_budget_for,
+)
+from .concurrency import batched, bounded_map
+from .continuation import ContinuationManager, TimeBudget
+from .metrics import InvocationMetrics, instrument_client, start_invocation_metrics
+from .output_sink import LocalOutputSink, NDJSONWriter, OutputSink, S3OutputSink, open_output_sink
+from .rate_limit import TokenBucket, attach_rate_limiter, create_rate_limiter, rate_limiter_for
+from .state_store import LocalStateStore, S3StateStore, StateStore, open_state_store
+from .structured_logging import JsonFormatter, LogAggregator, SamplingFilter, configure_logging, log_fields
+
+__all__ = [
+    'DEFAULT_MAX_WORKERS',
+    'ContinuationManager',
+    'InvocationMetrics',
+    'JsonFormatter',
+    'LocalOutputSink',
+    'LocalStateStore',
+    'LogAggregator',
+    'NDJSONWriter',
+    'OutputSink',
+    'S3OutputSink',
+    'S3StateStore',
+    'SamplingFilter',
+    'StateStore',
+    'TimeBudget',
+    'TokenBucket',
+    'attach_rate_limiter',
+    'batched',
+    'bounded_map',
+    'build_client_config',
+    'configure_logging',
+    'create_client',
+    'create_rate_limiter',
+    'instrument_client',
+    'log_fields',
+    'open_output_sink',
+    'open_state_store',
+    'rate_limiter_for',
+    'retry_budget_for',
+    'start_invocation_metrics',
+]
@@ -0,0 +1,106 @@
+"""
+ITSANDBOX AWS クライアント共通設定
+スレッドプールでのファンアウトに合わせた接続プール・リトライ・タイムアウト設定
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+from .metrics import instrument_client
+from .rate_limit import attach_rate_limiter, create_rate_limiter
+
+# 並列実行ワーカー数（ThreadPoolExecutorの幅）
+DEFAULT_MAX_WORKERS = int(os.environ.get('AWS_MAX_WORKERS', '16'))
+
+# ワーカー以外（通知・チェックポイント等）からの呼び出し用の余裕分
+POOL_HEADROOM = 2
+
+# サービス別リトライ予算（adaptiveモードでの最大リトライ回数、初回呼び出しを除く）
+SERVICE_RETRY_BUDGETS: Dict[str, int] = {
+    'iam': 10,            # IAMはアカウント単位のスロットリングが厳しい
+    'organizations': 8,
+    'ec2': 8,
+    'ce': 5,              # Cost Explorerは1リクエストごとに課金される
+    'rds': 6,
+    's3': 6,
+    'sts': 5,
+    'budgets': 5,
+    'sns': 4,
+    'ses': 4,
+    'lambda': 4,
+}
+DEFAULT_RETRY_BUDGET = 5
+
+# サービス別タイムアウト（接続秒, 読み取り秒）
+SERVICE_TIMEOUTS: Dict[str, Tuple[int, int]] = {
+    'ce': (5, 30),        # 集計クエリは応答が遅い
+    'iam': (5, 20),       # 認証情報レポート・権限詳細は応答が大きい
+    'organizations': (5, 20),
+    's3': (5, 30),
+}
+DEFAULT_TIMEOUTS = (3, 10)
+
+# warm invocation間で再利用するクライアントのキャッシュ
+_client_cache: Dict[Tuple[str, Optional[str], int], Any] = {}
+_client_cache_lock = threading.Lock()
+
+
+def retry_budget_for(service_name: str) -> int:
+    """サービスのリトライ予算を取得（環境変数 AWS_RETRY_BUDGET_<SERVICE> で上書き可能）"""
+    override = os.environ.get(f"AWS_RETRY_BUDGET_{service_name.upper()}")
+    if override:
+        return int(override)
+    return SERVICE_RETRY_BUDGETS.get(service_name, DEFAULT_RETRY_BUDGET)
+
+
+def build_client_config(service_name: str, max_workers: Optional[int] = None) -> Config:
+    """サービスとワーカー数に合わせたbotocore設定を生成"""
+    workers = max_workers or DEFAULT_MAX_WORKERS
+    connect_timeout, read_timeout = SERVICE_TIMEOUTS.get(service_name, DEFAULT_TIMEOUTS)
+
+    return Config(
+        max_pool_connections=workers + POOL_HEADROOM,
+        retries={
+            'mode': 'adaptive',
+            'max_attempts': retry_budget_for(service_name)
+        },
+        tcp_keepalive=True,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout
+    )
+
+
+def create_client(service_name: str,
+                  session: Optional[boto3.Session] = None,
+                  region_name: Optional[str] = None,
+                  max_workers: Optional[int] = None):
+    """共通設定を適用したクライアントを生成
+
+    session を指定しない場合はデフォルトセッションのクライアントをキャッシュし、
+    warm invocation間で接続プールを使い回す。生成したクライアントには
+    実行メトリクス（metrics.py）の収集ハンドラとレート制限（rate_limit.py）を登録する。
+    レート制限はアカウント単位のため、session 指定時はクライアントごとに別のバケットを使う。
+    """
+    workers = max_workers or DEFAULT_MAX_WORKERS
+    config = build_client_config(service_name, workers)
+
+    if session is not None:
+        client = instrument_client(
+            session.client(service_name, region_name=region_name, config=config)
+        )
+        return attach_rate_limiter(client, create_rate_limiter(service_name))
+
+    cache_key = (service_name, region_name, workers)
+    with _client_cache_lock:
+        client = _client_cache.get(cache_key)
+        if client is None:
+            # boto3のデフォルトセッションはスレッドセーフではないためロック内で生成
+            client = attach_rate_limiter(instrument_client(
+                boto3.client(service_name, region_name=region_name, config=config)
+            ))
+            _client_cache[cache_key] = client
+        return client
@@ -0,0 +1,33 @@
+"""
+ITSANDBOX 並列実行制御
+上限付きスレッドプールでの並列処理（完了順に関係なく入力順で結果を返す）
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, TypeVar
+
+from .aws_config import DEFAULT_MAX_WORKERS
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def bounded_map(func: Callable[[T], R], items: Iterable[T],
+                max_workers: int = DEFAULT_MAX_WORKERS) -> List[R]:
+    """items を並列に処理し、完了順に関係なく入力と同じ順序で結果を返す"""
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """イテラブルを size 件ずつのリストに分割（ジェネレータを先読みしすぎない）"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
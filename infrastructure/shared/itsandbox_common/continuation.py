@@ -0,0 +1,183 @@
+"""
+ITSANDBOX 継続実行フレームワーク
+Lambdaの残り実行時間を監視し、タイムアウト前にチェックポイントを保存して
+非同期の自己再呼び出しで処理を継続する
+"""
+
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from .aws_config import create_client
+from .state_store import StateStore, open_state_store
+
+logger = logging.getLogger(__name__)
+
+# タイムアウト前に確保する安全マージン（チェックポイント保存・再呼び出し用）
+DEFAULT_SAFETY_MARGIN_MS = int(os.environ.get('CONTINUATION_SAFETY_MARGIN_MS', '30000'))
+
+# 1回の実行で許可する継続呼び出しの世代数（チェックポイントが進まない場合の無限再呼び出しを防止）
+MAX_CONTINUATION_GENERATIONS = int(os.environ.get('MAX_CONTINUATION_GENERATIONS', '20'))
+
+CONTINUATION_TOKEN_KEY = 'continuation_token'
+CONTINUATION_GENERATION_KEY = 'continuation_generation'
+
+
+class TimeBudget:
+    """Lambdaコンテキストの残り実行時間を監視"""
+
+    def __init__(self, context: Any, safety_margin_ms: int = DEFAULT_SAFETY_MARGIN_MS):
+        self.context = context
+        self.safety_margin_ms = safety_margin_ms
+
+    def remaining_ms(self) -> Optional[int]:
+        """残り実行時間（ミリ秒）。ローカル実行などで取得できない場合はNone"""
+        get_remaining = getattr(self.context, 'get_remaining_time_in_millis', None)
+        if get_remaining is None:
+            return None
+        return get_remaining()
+
+    def exhausted(self) -> bool:
+        remaining = self.remaining_ms()
+        return remaining is not None and remaining < self.safety_margin_ms
+
+
+class ContinuationManager:
+    """ステージ単位のチェックポイント保存と非同期自己再呼び出しを管理
+
+    チェックポイントには実行中ステージ・カーソル・部分結果と、
+    完了済みステージの結果を保存する。再呼び出し後は resume() と
+    stage_result() で中断位置から処理を再開する。
+    """
+
+    def __init__(self, event: Dict[str, Any], context: Any,
+                 store: Optional[StateStore] = None,
+                 lambda_client=None,
+                 safety_margin_ms: int = DEFAULT_SAFETY_MARGIN_MS):
+        self.event = event
+        self.context = context
+        self.budget = TimeBudget(context, safety_margin_ms)
+        self.store = store or open_state_store('continuations')
+        self.lambda_client = lambda_client
+        self.token = event.get(CONTINUATION_TOKEN_KEY)
+        # 継続呼び出しをまたいで同じ実行を識別するID（中断時はそのまま継続トークンになる）
+        self.run_id = self.token or uuid.uuid4().hex
+        self.generation = int(event.get(CONTINUATION_GENERATION_KEY, 0))
+        if self.generation > MAX_CONTINUATION_GENERATIONS:
+            raise RuntimeError(
+                f"継続呼び出しが上限（{MAX_CONTINUATION_GENERATIONS}世代）を超えました: token={self.token}"
+            )
+        self.suspended = False
+        self._progress = 0
+        self._inline_warned = False
+        self._checkpoint = self._load()
+        self._completed = dict(self._checkpoint.get('completed', {})) if self._checkpoint else {}
+
+    def _checkpoint_key(self) -> str:
+        return f"{self.token}.json"
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        if not self.token:
+            return None
+        checkpoint = self.store.get_json(self._checkpoint_key())
+        if checkpoint is None:
+            if self.generation > 0:
+                # 最初から実行し直すと再び中断して同じ状況を繰り返すため中止
+                raise RuntimeError(
+                    f"チェックポイント {self.token}（{self.generation}世代目）が見つかりません。"
+                    f"状態ストアが呼び出し間で共有されているか確認してください（STATE_BUCKET）"
+                )
+            logger.warning(f"チェックポイント {self.token} が見つかりません。最初から実行します")
+        return checkpoint
+
+    def stage_result(self, stage: str) -> Optional[Any]:
+        """以前の呼び出しで完了済みのステージ結果を取得"""
+        return self._completed.get(stage)
+
+    def resume(self, stage: str) -> Tuple[int, Optional[Any]]:
+        """中断したステージのカーソルと部分結果を取得"""
+        if self._checkpoint and self._checkpoint.get('stage') == stage:
+            return self._checkpoint.get('cursor', 0), self._checkpoint.get('partial')
+        return 0, None
+
+    def complete_stage(self, stage: str, result: Any):
+        """ステージ完了を記録（以降の継続呼び出しで再実行しない）"""
+        self._completed[stage] = result
+
+    def record_progress(self, count: int = 1):
+        self._progress += count
+
+    def should_yield(self) -> bool:
+        """処理を中断して継続呼び出しに引き継ぐべきか
+
+        1件も処理していない呼び出しでは中断しない（無限の再呼び出しを防止）。
+        状態ストアが呼び出し間で共有されない場合も中断せず、この呼び出しの中で続ける。
+        """
+        if self._progress == 0 or not self.budget.exhausted():
+            return False
+        if not self.store.persistent:
+            if not self._inline_warned:
+                logger.warning("残り時間が少なくなりましたが、STATE_BUCKET が未設定のため継続呼び出しせずに処理を続けます")
+                self._inline_warned = True
+            return False
+        return True
+
+    def suspend(self, stage: str, cursor: int, partial: Any) -> str:
+        """チェックポイントを保存して自身を非同期に再呼び出し
+
+        再呼び出し先が読めない状態ストア（Lambda上のローカルディスク）や、
+        世代数の上限に達した場合は中断せずにエラーとする。
+        """
+        if not self.store.persistent:
+            raise RuntimeError(
+                f"{stage} を継続実行できません: チェックポイントの保存先が呼び出し間で共有されません"
+                f"（STATE_BUCKET を設定してください）"
+            )
+        if self.generation + 1 > MAX_CONTINUATION_GENERATIONS:
+            raise RuntimeError(
+                f"{stage} を継続実行できません: 継続呼び出しが上限（{MAX_CONTINUATION_GENERATIONS}世代）に達しました"
+            )
+        if not self.token:
+            self.token = self.run_id
+
+        self.store.put_json(self._checkpoint_key(), {
+            'stage': stage,
+            'cursor': cursor,
+            'partial': partial,
+            'completed': self._completed,
+            'generation': self.generation + 1
+        })
+
+        next_event = dict(self.event)
+        next_event[CONTINUATION_TOKEN_KEY] = self.token
+        next_event[CONTINUATION_GENERATION_KEY] = self.generation + 1
+
+        lambda_client = self.lambda_client or create_client('lambda')
+        lambda_client.invoke(
+            FunctionName=self.context.invoked_function_arn,
+            InvocationType='Event',
+            Payload=json.dumps(next_event, default=str).encode('utf-8')
+        )
+
+        self.suspended = True
+        logger.info(f"継続実行を登録しました: token={self.token} stage={stage} "
+                    f"cursor={cursor} generation={self.generation + 1}")
+        return self.token
+
+    def finish(self):
+        """全ステージ完了後にチェックポイントを削除"""
+        if self.token:
+            self.store.delete(self._checkpoint_key())
+
+    def suspended_response(self, message: str) -> Dict[str, Any]:
+        """継続中であることを示すLambdaレスポンス"""
+        return {
+            'statusCode': 202,
+            'body': json.dumps({
+                'message': message,
+                'continuation_token': self.token,
+                'continuation_generation': self.generation + 1
+            })
+        }
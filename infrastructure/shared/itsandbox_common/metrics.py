@@ -0,0 +1,209 @@
+"""
+ITSANDBOX 実行メトリクス（CloudWatch Embedded Metric Format）
+botocoreイベントでAPI呼び出し回数・レイテンシ・リトライ・スロットリングを集計し、
+ステージごとの処理時間とあわせて1回の呼び出しにつき1行のEMFログとして出力する。
+PutMetricData は呼び出さないため追加のAPI課金は発生しない。
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'ITSANDBOX/Lambda')
+
+# EMFの1ディレクティブで定義できるメトリクス数の上限
+MAX_METRIC_DEFINITIONS = 100
+
+THROTTLING_ERROR_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'LimitExceededException',
+    'SlowDown',
+}
+
+_START_TIME_KEY = 'itsandbox_metrics_start'
+
+# 現在の呼び出しで集計中のメトリクス（クライアントはwarm invocation間で共有されるため）
+_active_metrics: Optional['InvocationMetrics'] = None
+
+
+class InvocationMetrics:
+    """1回のLambda呼び出し分のAPI・ステージメトリクス"""
+
+    def __init__(self, context: Any = None, namespace: str = METRICS_NAMESPACE):
+        self.namespace = namespace
+        self.function_name = (
+            getattr(context, 'function_name', None)
+            or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+        )
+        self.started_at = time.time()
+        self.operations: Dict[str, Dict[str, float]] = {}
+        self.stages: Dict[str, float] = {}
+        self.properties: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def activate(self) -> 'InvocationMetrics':
+        """このインスタンスをAPI呼び出しの集計先に設定"""
+        global _active_metrics
+        _active_metrics = self
+        return self
+
+    def _operation(self, service: str, operation: str) -> Dict[str, float]:
+        key = f"{service}.{operation}"
+        stats = self.operations.get(key)
+        if stats is None:
+            stats = {'Calls': 0, 'LatencyMs': 0.0, 'Retries': 0, 'Throttles': 0, 'Errors': 0}
+            self.operations[key] = stats
+        return stats
+
+    def record_call(self, service: str, operation: str, latency_ms: float,
+                    retries: int = 0, error: bool = False):
+        with self._lock:
+            stats = self._operation(service, operation)
+            stats['Calls'] += 1
+            stats['LatencyMs'] += latency_ms
+            stats['Retries'] += retries
+            if error:
+                stats['Errors'] += 1
+
+    def record_throttle(self, service: str, operation: str):
+        with self._lock:
+            self._operation(service, operation)['Throttles'] += 1
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """ステージの処理時間を計測"""
+        started = time.time()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.time() - started) * 1000
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+
+    def set_property(self, key: str, value: Any):
+        """メトリクスではない検索用の付加情報を設定"""
+        self.properties[key] = value
+
+    def to_emf(self) -> Dict[str, Any]:
+        """EMF形式のログドキュメントを生成"""
+        totals = {'Calls': 0, 'LatencyMs': 0.0, 'Retries': 0, 'Throttles': 0, 'Errors': 0}
+        for stats in self.operations.values():
+            for name in totals:
+                totals[name] += stats[name]
+
+        values: Dict[str, float] = {
+            'Duration': round((time.time() - self.started_at) * 1000, 1),
+            'ApiCalls': totals['Calls'],
+            'ApiLatency': round(totals['LatencyMs'], 1),
+            'ApiRetries': totals['Retries'],
+            'ApiThrottles': totals['Throttles'],
+            'ApiErrors': totals['Errors'],
+        }
+        units = {'Duration': 'Milliseconds', 'ApiLatency': 'Milliseconds'}
+
+        for stage, elapsed_ms in self.stages.items():
+            name = f"Stage.{stage}.Duration"
+            values[name] = round(elapsed_ms, 1)
+            units[name] = 'Milliseconds'
+
+        for key, stats in sorted(self.operations.items()):
+            for stat_name, value in stats.items():
+                name = f"{key}.{stat_name}"
+                values[name] = round(value, 1) if stat_name == 'LatencyMs' else value
+                if stat_name == 'LatencyMs':
+                    units[name] = 'Milliseconds'
+
+        # 上限を超えたメトリクスは値のみ出力（Logs Insightsで検索可能）
+        definitions: List[Dict[str, str]] = [
+            {'Name': name, 'Unit': units.get(name, 'Count')}
+            for name in list(values)[:MAX_METRIC_DEFINITIONS]
+        ]
+
+        document: Dict[str, Any] = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [['FunctionName']],
+                    'Metrics': definitions
+                }]
+            },
+            'FunctionName': self.function_name,
+        }
+        document.update(self.properties)
+        document.update(values)
+        return document
+
+    def emit(self):
+        """EMFログを1行出力し、集計を終了"""
+        global _active_metrics
+        print(json.dumps(self.to_emf(), default=str))
+        if _active_metrics is self:
+            _active_metrics = None
+
+
+def _on_before_call(context=None, **kwargs):
+    if _active_metrics is not None and context is not None:
+        context[_START_TIME_KEY] = time.time()
+
+
+def _on_after_call(http_response=None, parsed=None, model=None, context=None, **kwargs):
+    metrics = _active_metrics
+    if metrics is None or model is None or context is None or _START_TIME_KEY not in context:
+        return
+    latency_ms = (time.time() - context.pop(_START_TIME_KEY)) * 1000
+    metadata = (parsed or {}).get('ResponseMetadata', {})
+    status_code = getattr(http_response, 'status_code', 200)
+    metrics.record_call(
+        model.service_model.service_id.hyphenize(),
+        model.name,
+        latency_ms,
+        retries=metadata.get('RetryAttempts', 0),
+        error=status_code >= 300
+    )
+
+
+def _on_after_call_error(exception=None, context=None, **kwargs):
+    metrics = _active_metrics
+    if metrics is None or context is None or _START_TIME_KEY not in context:
+        return
+    latency_ms = (time.time() - context.pop(_START_TIME_KEY)) * 1000
+    # イベント名: after-call-error.<service>.<operation>
+    _, service, operation = (kwargs.get('event_name', '').split('.') + ['', '', ''])[:3]
+    metrics.record_call(service, operation, latency_ms, error=True)
+
+
+def _on_needs_retry(response=None, operation=None, **kwargs):
+    # 戻り値は常にNone（リトライ判定そのものには関与しない）
+    metrics = _active_metrics
+    if metrics is None or response is None or operation is None:
+        return None
+    parsed = response[1] if len(response) > 1 else {}
+    error_code = (parsed or {}).get('Error', {}).get('Code')
+    if error_code in THROTTLING_ERROR_CODES:
+        metrics.record_throttle(operation.service_model.service_id.hyphenize(), operation.name)
+    return None
+
+
+def instrument_client(client):
+    """クライアントにメトリクス収集用のイベントハンドラを登録（重複登録されない）"""
+    events = client.meta.events
+    events.register('before-call', _on_before_call, unique_id='itsandbox-metrics-before-call')
+    events.register('after-call', _on_after_call, unique_id='itsandbox-metrics-after-call')
+    events.register('after-call-error', _on_after_call_error,
+                    unique_id='itsandbox-metrics-after-call-error')
+    events.register('needs-retry', _on_needs_retry, unique_id='itsandbox-metrics-needs-retry')
+    return client
+
+
+def start_invocation_metrics(context: Any = None) -> InvocationMetrics:
+    """呼び出し開始時に集計を開始"""
+    return InvocationMetrics(context).activate()
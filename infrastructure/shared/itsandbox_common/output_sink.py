@@ -0,0 +1,258 @@
+"""
+ITSANDBOX 出力シンク
+大きな実行結果を1件ずつ改行区切りJSON（NDJSON）としてバッファ付きで書き出す
+（ローカルディスクまたはS3マルチパートアップロード）
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from .aws_config import create_client
+
+# 出力先（OUTPUT_BUCKET未設定時はローカルディスクを使用）
+OUTPUT_BUCKET = os.environ.get('OUTPUT_BUCKET', '')
+OUTPUT_PREFIX = os.environ.get('OUTPUT_PREFIX', 'itsandbox-output')
+OUTPUT_DIR = os.environ.get('OUTPUT_DIR', '/tmp/itsandbox-output')
+
+# 書き出し単位（S3のマルチパートは最後以外のパートが5MiB以上である必要がある）
+DEFAULT_BUFFER_BYTES = 1024 * 1024
+MIN_S3_PART_BYTES = 5 * 1024 * 1024
+DEFAULT_S3_PART_BYTES = int(os.environ.get('OUTPUT_PART_SIZE_MB', '8')) * 1024 * 1024
+
+
+class OutputUpload(ABC):
+    """1オブジェクト分の書き込み（write はバッファが溜まるたび、commit は最後に1回）"""
+
+    @abstractmethod
+    def write(self, data: bytes):
+        ...
+
+    @abstractmethod
+    def commit(self, data: bytes):
+        ...
+
+    @abstractmethod
+    def abort(self):
+        ...
+
+
+class OutputSink(ABC):
+    """NDJSON出力先の基底クラス"""
+
+    buffer_bytes = DEFAULT_BUFFER_BYTES
+
+    @abstractmethod
+    def begin(self, key: str) -> OutputUpload:
+        ...
+
+    @abstractmethod
+    def put_json(self, key: str, value: Any):
+        ...
+
+    @abstractmethod
+    def list_objects(self, prefix: str = '') -> List[Dict[str, Any]]:
+        """prefix 配下のオブジェクト（キー順、{'key', 'bytes'}）"""
+        ...
+
+    @abstractmethod
+    def location(self, key: str) -> str:
+        ...
+
+    def open_writer(self, key: str) -> 'NDJSONWriter':
+        return NDJSONWriter(self.begin(key), key, self.buffer_bytes)
+
+
+class NDJSONWriter:
+    """レコードを1行ずつシリアライズし、バッファが一定量に達するたびに出力先へ書き出す"""
+
+    def __init__(self, upload: OutputUpload, key: str, buffer_bytes: int = DEFAULT_BUFFER_BYTES):
+        self.upload = upload
+        self.key = key
+        self.buffer_bytes = buffer_bytes
+        self.records = 0
+        self.bytes = 0
+        self._buffer = bytearray()
+        self._closed = False
+
+    def write(self, record: Any):
+        line = json.dumps(record, default=str, ensure_ascii=False, separators=(',', ':'))
+        self._buffer += line.encode('utf-8')
+        self._buffer += b'\n'
+        self.records += 1
+        if len(self._buffer) >= self.buffer_bytes:
+            self._flush()
+
+    def _flush(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        self.upload.write(data)
+        self.bytes += len(data)
+
+    def close(self) -> Dict[str, Any]:
+        """残りのバッファを書き出してオブジェクトを確定"""
+        if not self._closed:
+            self._closed = True
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            self.upload.commit(data)
+            self.bytes += len(data)
+        return {'key': self.key, 'records': self.records, 'bytes': self.bytes}
+
+    def abort(self):
+        """書き込み途中のオブジェクトを破棄"""
+        if not self._closed:
+            self._closed = True
+            self._buffer.clear()
+            self.upload.abort()
+
+    def __enter__(self) -> 'NDJSONWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class _LocalUpload(OutputUpload):
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 書き込み途中のファイルを読まれないよう一時ファイルに書いてから置き換え
+        self.tmp_path = f"{path}.tmp"
+        self.file = open(self.tmp_path, 'wb')
+
+    def write(self, data: bytes):
+        self.file.write(data)
+
+    def commit(self, data: bytes):
+        self.file.write(data)
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class LocalOutputSink(OutputSink):
+    """ローカルディスク上の出力先（S3の代替）"""
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.base_dir, *key.split('/'))
+
+    def begin(self, key: str) -> OutputUpload:
+        return _LocalUpload(self._path(key))
+
+    def put_json(self, key: str, value: Any):
+        upload = self.begin(key)
+        upload.commit(json.dumps(value, default=str, ensure_ascii=False).encode('utf-8'))
+
+    def list_objects(self, prefix: str = '') -> List[Dict[str, Any]]:
+        objects = []
+        for root, _, files in os.walk(self.base_dir):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                key = os.path.relpath(path, self.base_dir).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    objects.append({'key': key, 'bytes': os.path.getsize(path)})
+        return sorted(objects, key=lambda obj: obj['key'])
+
+    def location(self, key: str) -> str:
+        return self._path(key)
+
+
+class _S3MultipartUpload(OutputUpload):
+    """最初のパートが溜まった時点でマルチパートアップロードを開始（小さい出力は1回のPutObject）"""
+
+    def __init__(self, s3_client, bucket: str, key: str):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.upload_id: Optional[str] = None
+        self.parts: List[Dict[str, Any]] = []
+
+    def write(self, data: bytes):
+        if self.upload_id is None:
+            self.upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType='application/x-ndjson'
+            )['UploadId']
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=part_number, Body=data
+        )
+        self.parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+    def commit(self, data: bytes):
+        if self.upload_id is None:
+            self.s3_client.put_object(
+                Bucket=self.bucket, Key=self.key, Body=data, ContentType='application/x-ndjson'
+            )
+            return
+        if data:
+            self.write(data)
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={'Parts': self.parts}
+        )
+
+    def abort(self):
+        if self.upload_id is not None:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+            )
+
+
+class S3OutputSink(OutputSink):
+    """S3上の出力先"""
+
+    def __init__(self, bucket: str, prefix: str, s3_client=None,
+                 part_bytes: int = DEFAULT_S3_PART_BYTES):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.s3_client = s3_client or create_client('s3')
+        self.buffer_bytes = max(part_bytes, MIN_S3_PART_BYTES)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def begin(self, key: str) -> OutputUpload:
+        return _S3MultipartUpload(self.s3_client, self.bucket, self._key(key))
+
+    def put_json(self, key: str, value: Any):
+        self.s3_client.put_object(
+            Bucket=self.bucket, Key=self._key(key),
+            Body=json.dumps(value, default=str, ensure_ascii=False).encode('utf-8'),
+            ContentType='application/json'
+        )
+
+    def list_objects(self, prefix: str = '') -> List[Dict[str, Any]]:
+        objects = []
+        strip = len(self._key(''))
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            for obj in page.get('Contents', []):
+                objects.append({'key': obj['Key'][strip:], 'bytes': obj['Size']})
+        return sorted(objects, key=lambda obj: obj['key'])
+
+    def location(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._key(key)}"
+
+
+def open_output_sink(namespace: str) -> OutputSink:
+    """名前空間ごとの出力先を取得（OUTPUT_BUCKET設定時はS3）"""
+    if OUTPUT_BUCKET:
+        return S3OutputSink(OUTPUT_BUCKET, f"{OUTPUT_PREFIX}/{namespace}")
+    return LocalOutputSink(os.path.join(OUTPUT_DIR, namespace))
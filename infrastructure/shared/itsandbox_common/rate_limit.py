@@ -0,0 +1,111 @@
+"""
+ITSANDBOX APIレート制限
+サービス単位で共有するトークンバケット。スロットリング応答で送信レートを下げ、
+成功応答で徐々に元のレートへ戻す（AIMD）
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from .metrics import THROTTLING_ERROR_CODES
+
+# サービス別の送信レート（リクエスト/秒, バースト）。IAMはアカウント単位で制限が厳しい
+SERVICE_RATE_LIMITS: Dict[str, tuple] = {
+    'iam': (float(os.environ.get('IAM_REQUESTS_PER_SECOND', '10')),
+            int(os.environ.get('IAM_REQUEST_BURST', '20'))),
+    'organizations': (5.0, 10),
+    'sts': (20.0, 40),
+}
+
+# スロットリング時にレートへ掛ける係数と、成功時の回復量（リクエスト/秒）
+THROTTLE_DECREASE_FACTOR = 0.5
+SUCCESS_INCREASE_STEP = 0.1
+MIN_RATE = 0.5
+
+
+class TokenBucket:
+    """スレッド間で共有するトークンバケット（スロットリングでレートを半減し、成功で徐々に回復）"""
+
+    def __init__(self, rate: float, burst: int):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.throttle_count = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """トークンを1つ取得（不足している場合は補充まで待機）"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttle_count += 1
+            self.rate = max(MIN_RATE, self.rate * THROTTLE_DECREASE_FACTOR)
+            # 溜まっているトークンも破棄して直後の集中送信を防ぐ
+            self.tokens = min(self.tokens, 0.0)
+
+    def on_success(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + SUCCESS_INCREASE_STEP)
+
+
+def create_rate_limiter(service_name: str) -> Optional[TokenBucket]:
+    """サービスの既定レートで新しいトークンバケットを生成（制限対象外のサービスはNone）"""
+    if service_name not in SERVICE_RATE_LIMITS:
+        return None
+    rate, burst = SERVICE_RATE_LIMITS[service_name]
+    return TokenBucket(rate, burst)
+
+
+_rate_limiters: Dict[str, Optional[TokenBucket]] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def rate_limiter_for(service_name: str) -> Optional[TokenBucket]:
+    """自アカウント向けのサービス共通レート制限（warm invocation・全スレッドで共有）"""
+    with _rate_limiters_lock:
+        if service_name not in _rate_limiters:
+            _rate_limiters[service_name] = create_rate_limiter(service_name)
+        return _rate_limiters[service_name]
+
+
+def attach_rate_limiter(client, limiter: Optional[TokenBucket] = None):
+    """クライアントの全API送信（リトライを含む）にレート制限を適用"""
+    limiter = limiter or rate_limiter_for(client.meta.service_model.service_name)
+    if limiter is None:
+        return client
+
+    def before_send(**kwargs):
+        limiter.acquire()
+
+    def needs_retry(response=None, **kwargs):
+        if response is None:
+            return None
+        parsed = response[1] if len(response) > 1 else {}
+        if (parsed or {}).get('Error', {}).get('Code') in THROTTLING_ERROR_CODES:
+            limiter.on_throttle()
+        elif response[0] is not None and response[0].status_code < 300:
+            limiter.on_success()
+        return None
+
+    events = client.meta.events
+    events.register('before-send', before_send, unique_id='itsandbox-rate-limit-before-send')
+    events.register('needs-retry', needs_retry, unique_id='itsandbox-rate-limit-needs-retry')
+    return client
@@ -0,0 +1,135 @@
+"""
+ITSANDBOX 状態ストア
+チェックポイント・監査状態をローカルディスクまたはS3に保存する
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional
+
+from .aws_config import create_client
+
+# 状態保存先（STATE_BUCKET未設定時はローカルディスクを使用）
+STATE_BUCKET = os.environ.get('STATE_BUCKET', '')
+STATE_PREFIX = os.environ.get('STATE_PREFIX', 'itsandbox-state')
+STATE_DIR = os.environ.get('STATE_DIR', '/tmp/itsandbox-state')
+
+# Lambdaのローカルディスク（/tmp）は実行環境ごとに別のため、呼び出しをまたいで共有できない
+RUNNING_IN_LAMBDA = bool(os.environ.get('AWS_LAMBDA_FUNCTION_NAME'))
+
+
+class StateStore(ABC):
+    """キー/値形式の状態ストア基底クラス"""
+
+    # 別の呼び出し（別の実行環境を含む）から保存した状態を読めるか
+    persistent = True
+
+    @abstractmethod
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def put_bytes(self, key: str, data: bytes):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def list_keys(self, prefix: str = '') -> List[str]:
+        ...
+
+    def get_json(self, key: str) -> Optional[Any]:
+        data = self.get_bytes(key)
+        return json.loads(data) if data is not None else None
+
+    def put_json(self, key: str, value: Any):
+        self.put_bytes(key, json.dumps(value, default=str, ensure_ascii=False).encode('utf-8'))
+
+
+class LocalStateStore(StateStore):
+    """ローカルディスク上の状態ストア（Lambdaでは /tmp、S3の代替）"""
+
+    def __init__(self, base_dir: str, persistent: bool = not RUNNING_IN_LAMBDA):
+        self.base_dir = base_dir
+        self.persistent = persistent
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.base_dir, *key.split('/'))
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put_bytes(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 書き込み途中のファイルを読まれないよう一時ファイル経由で置き換え
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def list_keys(self, prefix: str = '') -> List[str]:
+        keys = []
+        for root, _, files in os.walk(self.base_dir):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                rel = os.path.relpath(os.path.join(root, name), self.base_dir)
+                key = rel.replace(os.sep, '/')
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+
+class S3StateStore(StateStore):
+    """S3上の状態ストア"""
+
+    def __init__(self, bucket: str, prefix: str, s3_client=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.s3_client = s3_client or create_client('s3')
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self._key(key))
+            return response['Body'].read()
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+
+    def put_bytes(self, key: str, data: bytes):
+        self.s3_client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def delete(self, key: str):
+        self.s3_client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def list_keys(self, prefix: str = '') -> List[str]:
+        keys = []
+        strip = len(self._key(''))
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            for obj in page.get('Contents', []):
+                keys.append(obj['Key'][strip:])
+        return sorted(keys)
+
+
+def open_state_store(namespace: str) -> StateStore:
+    """名前空間ごとの状態ストアを取得（STATE_BUCKET設定時はS3）"""
+    if STATE_BUCKET:
+        return S3StateStore(STATE_BUCKET, f"{STATE_PREFIX}/{namespace}")
+    return LocalStateStore(os.path.join(STATE_DIR, namespace))
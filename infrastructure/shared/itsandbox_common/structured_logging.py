@@ -0,0 +1,144 @@
+"""
+ITSANDBOX 構造化ログ
+JSON形式の1行ログ、大量に出る行のレベル別サンプリング、ユーザー単位の警告の集約により
+CloudWatch Logs の取り込みコストを抑える。サンプリングは log_fields(sampled=True) を
+指定した行だけに適用し、それ以外の行とERROR以上は常に全件出力する。
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# sampled 指定の行のレベル別サンプリング率（0.0〜1.0）。ERROR以上は常に出力
+LOG_SAMPLE_RATES: Dict[int, float] = {
+    logging.DEBUG: float(os.environ.get('LOG_SAMPLE_RATE_DEBUG', '0')),
+    logging.INFO: float(os.environ.get('LOG_SAMPLE_RATE_INFO', '0.1')),
+    logging.WARNING: float(os.environ.get('LOG_SAMPLE_RATE_WARNING', '1.0')),
+}
+
+# 集約した警告のサマリーに含める対象（ユーザー名等）の最大件数
+AGGREGATE_SAMPLE_SIZE = int(os.environ.get('LOG_AGGREGATE_SAMPLE_SIZE', '5'))
+
+_STANDARD_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+def log_fields(always: bool = False, sampled: bool = False, **fields: Any) -> Dict[str, Any]:
+    """logger呼び出しの extra に渡す構造化フィールド
+
+    sampled=True はユーザーごと等、1回の実行で大量に出る行（レベル別の率でサンプリング）。
+    always=True の行は sampled の指定にかかわらず常に出力する（実行サマリー等）。
+    例: logger.info("監査完了", extra=log_fields(always=True, total_users=120))
+    """
+    return {'fields': fields, 'always': always, 'sampled': sampled}
+
+
+class JsonFormatter(logging.Formatter):
+    """ログレコードを1行のJSONに整形"""
+
+    def __init__(self):
+        super().__init__()
+        self.request_id: Optional[str] = None
+        self.function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+
+    def format(self, record: logging.LogRecord) -> str:
+        document: Dict[str, Any] = {
+            'timestamp': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'function': self.function_name,
+        }
+        if self.request_id:
+            document['request_id'] = self.request_id
+        document.update(getattr(record, 'fields', None) or {})
+        # extra で直接渡された属性も出力
+        for key, value in vars(record).items():
+            if key not in _STANDARD_RECORD_ATTRS and key not in ('fields', 'always', 'sampled'):
+                document.setdefault(key, value)
+        if record.exc_info:
+            document['exception'] = self.formatException(record.exc_info)
+        return json.dumps(document, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """sampled 指定の行のレベル別サンプリング（指定のない行・ERROR以上・always指定の行は常に通過）"""
+
+    def __init__(self, sample_rates: Optional[Dict[int, float]] = None):
+        super().__init__()
+        self.sample_rates = sample_rates or LOG_SAMPLE_RATES
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            record.levelno >= logging.ERROR
+            or getattr(record, 'always', False)
+            or not getattr(record, 'sampled', False)
+        ):
+            return True
+        rate = self.sample_rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class LogAggregator:
+    """繰り返し発生する警告（ユーザーごとのチェック失敗等）を1行のサマリーに集約"""
+
+    def __init__(self, logger: logging.Logger, sample_size: int = AGGREGATE_SAMPLE_SIZE):
+        self.logger = logger
+        self.sample_size = sample_size
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def warning(self, key: str, subject: str, detail: str = ''):
+        """警告を集約に追加（subject はユーザー名・キーID等の対象）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {'count': 0, 'subjects': [], 'first_detail': detail}
+                self._entries[key] = entry
+            entry['count'] += 1
+            if len(entry['subjects']) < self.sample_size:
+                entry['subjects'].append(subject)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {key: entry['count'] for key, entry in self._entries.items()}
+
+    def flush(self):
+        """集約した警告をキーごとに1行出力してリセット"""
+        with self._lock:
+            entries, self._entries = self._entries, {}
+        for key, entry in sorted(entries.items()):
+            self.logger.warning(
+                f"{key}: {entry['count']}件",
+                extra=log_fields(
+                    always=True,
+                    aggregate_key=key,
+                    count=entry['count'],
+                    sample_subjects=entry['subjects'],
+                    first_detail=entry['first_detail']
+                )
+            )
+
+
+_formatter = JsonFormatter()
+_sampling_filter = SamplingFilter()
+
+
+def configure_logging(context: Any = None, level: int = logging.INFO) -> logging.Logger:
+    """ルートロガーに構造化ログ・サンプリングを設定（warm invocationで再実行しても重複しない）"""
+    root = logging.getLogger()
+    root.setLevel(level)
+    if not root.handlers:
+        root.addHandler(logging.StreamHandler())
+
+    handlers: List[logging.Handler] = root.handlers
+    for handler in handlers:
+        handler.setFormatter(_formatter)
+        if _sampling_filter not in handler.filters:
+            handler.addFilter(_sampling_filter)
+
+    _formatter.request_id = getattr(context, 'aws_request_id', None)
+    return root
@@ -4,29 +4,39 @@ ITSANDBOX Cost Optimizer Lambda Function
 """
 
 import json
-import boto3
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import logging
 
+from itsandbox_common import (
+    ContinuationManager,
+    configure_logging,
+    create_client,
+    log_fields,
+    start_invocation_metrics,
+)
+
 # ログ設定
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# AWS clients
-ce_client = boto3.client('ce')
-ec2_client = boto3.client('ec2')
-rds_client = boto3.client('rds')
-s3_client = boto3.client('s3')
-sns_client = boto3.client('sns')
-budgets_client = boto3.client('budgets')
+# AWS clients（共通の接続プール・リトライ設定）
+ce_client = create_client('ce')
+ec2_client = create_client('ec2')
+rds_client = create_client('rds')
+s3_client = create_client('s3')
+sns_client = create_client('sns')
+budgets_client = create_client('budgets')
 
 # 環境変数
 ORGANIZATION_BUDGET = float(os.environ.get('ORGANIZATION_BUDGET', '100'))
 SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN', '')
 SLACK_WEBHOOK_URL = os.environ.get('SLACK_WEBHOOK_URL', '')
 
+# 未使用リソース分析の対象（この順に分析し、種別の境界で継続呼び出しに引き継げる）
+UNUSED_RESOURCE_TYPES = ('ec2_instances', 'ebs_snapshots', 'elastic_ips', 'rds_instances')
+
 class ITSANDBOXCostOptimizer:
     def __init__(self):
         self.organization_budget = ORGANIZATION_BUDGET
@@ -77,69 +87,100 @@ class ITSANDBOXCostOptimizer:
             logger.error(f"コスト取得エラー: {str(e)}")
             return {'total_cost': 0, 'service_costs': {}, 'project_costs': {}, 'budget_usage_percentage': 0}
     
-    def analyze_unused_resources(self) -> Dict[str, List[str]]:
-        """未使用リソースの分析"""
-        unused_resources = {
-            'ec2_instances': [],
-            'ebs_snapshots': [],
-            'elastic_ips': [],
-            'rds_instances': []
-        }
+    def analyze_unused_resources(self, continuation: Optional[ContinuationManager] = None) -> Dict[str, List[str]]:
+        """未使用リソースの分析
+
+        continuation を指定すると、リソース種別の境界でチェックポイントを判定し、
+        中断時は分析済みの種別数をカーソルとして保存する。
+        """
+        unused_resources = {resource_type: [] for resource_type in UNUSED_RESOURCE_TYPES}
+        start = 0
+        if continuation:
+            start, partial = continuation.resume('unused_resources')
+            if partial:
+                unused_resources = partial
         
-        try:
-            # 停止中のEC2インスタンス
-            ec2_response = ec2_client.describe_instances(
-                Filters=[{'Name': 'instance-state-name', 'Values': ['stopped']}]
-            )
-            
-            for reservation in ec2_response['Reservations']:
-                for instance in reservation['Instances']:
-                    # 7日以上停止中のインスタンス
-                    if instance['State']['Name'] == 'stopped':
-                        state_transition_time = instance['StateTransitionReason']
-                        if '7 days ago' in state_transition_time or 'weeks ago' in state_transition_time:
-                            unused_resources['ec2_instances'].append({
-                                'InstanceId': instance['InstanceId'],
-                                'InstanceType': instance['InstanceType'],
-                                'StoppedTime': state_transition_time
-                            })
-            
-            # 古いEBSスナップショット（30日以上）
-            snapshots_response = ec2_client.describe_snapshots(OwnerIds=['self'])
-            cutoff_date = self.current_date - timedelta(days=30)
-            
-            for snapshot in snapshots_response['Snapshots']:
-                if snapshot['StartTime'].replace(tzinfo=None) < cutoff_date:
-                    unused_resources['ebs_snapshots'].append({
-                        'SnapshotId': snapshot['SnapshotId'],
-                        'Size': snapshot['VolumeSize'],
-                        'StartTime': snapshot['StartTime'].isoformat()
-                    })
-            
-            # 未使用のElastic IP
-            eip_response = ec2_client.describe_addresses()
-            for address in eip_response['Addresses']:
-                if 'InstanceId' not in address:  # アタッチされていないEIP
-                    unused_resources['elastic_ips'].append({
-                        'AllocationId': address['AllocationId'],
-                        'PublicIp': address['PublicIp']
-                    })
+        collectors = {
+            'ec2_instances': self._stopped_ec2_instances,
+            'ebs_snapshots': self._old_ebs_snapshots,
+            'elastic_ips': self._unattached_elastic_ips,
+            'rds_instances': self._stopped_rds_instances,
+        }
+        for index in range(start, len(UNUSED_RESOURCE_TYPES)):
+            # タイムアウト前に中断して継続呼び出しへ引き継ぎ
+            if continuation and continuation.should_yield():
+                continuation.suspend('unused_resources', index, unused_resources)
+                return unused_resources
             
-            # 停止中のRDSインスタンス
-            rds_response = rds_client.describe_db_instances()
-            for db_instance in rds_response['DBInstances']:
-                if db_instance['DBInstanceStatus'] == 'stopped':
-                    unused_resources['rds_instances'].append({
-                        'DBInstanceIdentifier': db_instance['DBInstanceIdentifier'],
-                        'DBInstanceClass': db_instance['DBInstanceClass'],
-                        'Engine': db_instance['Engine']
-                    })
-                    
-        except Exception as e:
-            logger.error(f"未使用リソース分析エラー: {str(e)}")
+            resource_type = UNUSED_RESOURCE_TYPES[index]
+            try:
+                unused_resources[resource_type] = collectors[resource_type]()
+            except Exception as e:
+                logger.error(f"未使用リソース分析エラー ({resource_type}): {str(e)}")
+            if continuation:
+                continuation.record_progress()
         
         return unused_resources
     
+    def _stopped_ec2_instances(self) -> List[Dict[str, Any]]:
+        """7日以上停止中のEC2インスタンス"""
+        instances = []
+        ec2_response = ec2_client.describe_instances(
+            Filters=[{'Name': 'instance-state-name', 'Values': ['stopped']}]
+        )
+        
+        for reservation in ec2_response['Reservations']:
+            for instance in reservation['Instances']:
+                if instance['State']['Name'] == 'stopped':
+                    state_transition_time = instance['StateTransitionReason']
+                    if '7 days ago' in state_transition_time or 'weeks ago' in state_transition_time:
+                        instances.append({
+                            'InstanceId': instance['InstanceId'],
+                            'InstanceType': instance['InstanceType'],
+                            'StoppedTime': state_transition_time
+                        })
+        return instances
+    
+    def _old_ebs_snapshots(self) -> List[Dict[str, Any]]:
+        """古いEBSスナップショット（30日以上）"""
+        snapshots = []
+        snapshots_response = ec2_client.describe_snapshots(OwnerIds=['self'])
+        cutoff_date = self.current_date - timedelta(days=30)
+        
+        for snapshot in snapshots_response['Snapshots']:
+            if snapshot['StartTime'].replace(tzinfo=None) < cutoff_date:
+                snapshots.append({
+                    'SnapshotId': snapshot['SnapshotId'],
+                    'Size': snapshot['VolumeSize'],
+                    'StartTime': snapshot['StartTime'].isoformat()
+                })
+        return snapshots
+    
+    def _unattached_elastic_ips(self) -> List[Dict[str, Any]]:
+        """未使用のElastic IP"""
+        addresses = []
+        eip_response = ec2_client.describe_addresses()
+        for address in eip_response['Addresses']:
+            if 'InstanceId' not in address:  # アタッチされていないEIP
+                addresses.append({
+                    'AllocationId': address['AllocationId'],
+                    'PublicIp': address['PublicIp']
+                })
+        return addresses
+    
+    def _stopped_rds_instances(self) -> List[Dict[str, Any]]:
+        """停止中のRDSインスタンス"""
+        db_instances = []
+        rds_response = rds_client.describe_db_instances()
+        for db_instance in rds_response['DBInstances']:
+            if db_instance['DBInstanceStatus'] == 'stopped':
+                db_instances.append({
+                    'DBInstanceIdentifier': db_instance['DBInstanceIdentifier'],
+                    'DBInstanceClass': db_instance['DBInstanceClass'],
+                    'Engine': db_instance['Engine']
+                })
+        return db_instances
+    
     def get_cost_recommendations(self, costs: Dict[str, Any]) -> List[str]:
         """コスト最適化の推奨事項を生成"""
         recommendations = []
@@ -274,27 +315,49 @@ class ITSANDBOXCostOptimizer:
 
 def lambda_handler(event, context):
     """Lambda エントリーポイント"""
+    # 構造化ログ（サンプリング有効）とAPI呼び出し・ステージ時間の集計を開始
+    configure_logging(context)
+    metrics = start_invocation_metrics(context)
+    
     try:
         optimizer = ITSANDBOXCostOptimizer()
+        continuation = ContinuationManager(event, context)
         
-        # コスト分析
-        costs = optimizer.get_current_month_costs()
-        logger.info(f"現在のコスト: ${costs['total_cost']:.2f} ({costs['budget_usage_percentage']:.1f}%)")
-        
-        # 未使用リソース分析
-        unused_resources = optimizer.analyze_unused_resources()
+        # コスト分析（継続呼び出し時は保存済みの結果を再利用し、CE APIを再課金しない）
+        costs = continuation.stage_result('costs')
+        if costs is None:
+            with metrics.stage('get_current_month_costs'):
+                costs = optimizer.get_current_month_costs()
+            continuation.complete_stage('costs', costs)
+            continuation.record_progress()
+        logger.info(
+            f"現在のコスト: ${costs['total_cost']:.2f} ({costs['budget_usage_percentage']:.1f}%)",
+            extra=log_fields(
+                always=True,
+                total_cost=round(costs['total_cost'], 2),
+                budget_usage_percentage=round(costs['budget_usage_percentage'], 1)
+            )
+        )
         
-        # 推奨事項生成
-        recommendations = optimizer.get_cost_recommendations(costs)
+        # 未使用リソース分析（残り時間が少なくなればリソース種別の境界で継続呼び出しに引き継ぐ）
+        with metrics.stage('analyze_unused_resources'):
+            unused_resources = optimizer.analyze_unused_resources(continuation)
+        if continuation.suspended:
+            return continuation.suspended_response('Cost analysis continues asynchronously')
+        continuation.finish()
         
-        # レポート生成
-        report = optimizer.create_cost_report(costs, unused_resources, recommendations)
+        # 推奨事項生成・レポート生成
+        with metrics.stage('create_cost_report'):
+            recommendations = optimizer.get_cost_recommendations(costs)
+            report = optimizer.create_cost_report(costs, unused_resources, recommendations)
         
         # 緊急レベルの判定
         is_critical = costs['budget_usage_percentage'] >= 85
+        metrics.set_property('BudgetUsagePercentage', round(costs['budget_usage_percentage'], 1))
         
         # 通知送信
-        optimizer.send_notification(report, is_critical)
+        with metrics.stage('send_notification'):
+            optimizer.send_notification(report, is_critical)
         
         return {
             'statusCode': 200,
@@ -326,6 +389,9 @@ def lambda_handler(event, context):
                 'error': str(e)
             })
         }
+    
+    finally:
+        metrics.emit()
 
 # ローカルテスト用
 if __name__ == "__main__":
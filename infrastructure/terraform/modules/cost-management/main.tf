@@ -247,6 +247,7 @@ resource "aws_lambda_function" "cost_optimizer" {
       ORGANIZATION_BUDGET = var.organization_budget_limit
       SNS_TOPIC_ARN      = aws_sns_topic.budget_alerts.arn
       SLACK_WEBHOOK_URL  = var.slack_webhook_url
+      STATE_BUCKET       = var.lambda_state_bucket
     }
   }
 
@@ -279,7 +280,7 @@ resource "aws_iam_role_policy" "lambda_cost_optimizer_policy" {
 
   policy = jsonencode({
     Version = "2012-10-17"
-    Statement = [
+    Statement = concat([
       {
         Effect = "Allow"
         Action = [
@@ -289,6 +290,14 @@ resource "aws_iam_role_policy" "lambda_cost_optimizer_policy" {
         ]
         Resource = "arn:aws:logs:*:*:*"
       },
+      {
+        # タイムアウト前の継続実行（自身の非同期再呼び出し）
+        Effect = "Allow"
+        Action = [
+          "lambda:InvokeFunction"
+        ]
+        Resource = aws_lambda_function.cost_optimizer.arn
+      },
       {
         Effect = "Allow"
         Action = [
@@ -325,10 +334,34 @@ resource "aws_iam_role_policy" "lambda_cost_optimizer_policy" {
         ]
         Resource = "*"
       }
-    ]
+    ], var.lambda_state_bucket != "" ? [
+      {
+        # チェックポイント保存用
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject",
+          "s3:DeleteObject"
+        ]
+        Resource = "arn:aws:s3:::${var.lambda_state_bucket}/itsandbox-state/*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:ListBucket"
+        ]
+        Resource = "arn:aws:s3:::${var.lambda_state_bucket}"
+      }
+    ] : [])
   })
 }
 
+# Lambda共通ライブラリ（infrastructure/shared/itsandbox_common）
+locals {
+  shared_lambda_dir   = "${path.module}/../../../shared"
+  shared_lambda_files = fileset(local.shared_lambda_dir, "itsandbox_common/*.py")
+}
+
 # Lambda function code archive
 data "archive_file" "cost_optimizer_zip" {
   type        = "zip"
@@ -340,6 +373,14 @@ data "archive_file" "cost_optimizer_zip" {
     })
     filename = "index.py"
   }
+
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.shared_lambda_dir}/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 # ====================
@@ -125,4 +125,10 @@ variable "budget_action_thresholds" {
     critical_threshold   = 85  # 85%で重要アラート
     emergency_threshold  = 95  # 95%で緊急対応
   }
-}
\ No newline at end of file
+}
+
+variable "lambda_state_bucket" {
+  description = "S3 bucket for Lambda checkpoints and persisted state (empty = local /tmp stand-in, which is not shared between invocations: long runs that need to continue asynchronously fail instead)"
+  type        = string
+  default     = ""
+}
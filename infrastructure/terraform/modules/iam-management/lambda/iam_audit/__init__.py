@@ -0,0 +1,52 @@
+"""
+ITSANDBOX IAM監査エンジン
+user_management Lambda が使用する一括取得・キャッシュ・評価コンポーネント
+"""
+
+from .access_advisor import AccessAdvisorPipeline
+from .audit_index import AuditIndex
+from .audit_output import AuditOutputStream
+from .authorization_snapshot import AuthorizationSnapshot
+from .compliance import ComplianceRuleEngine, user_record
+from .credential_report import CredentialReport
+from .entity_index import IAMEntityIndex
+from .fingerprints import FingerprintCache, next_threshold_crossing, user_fingerprint
+from .history import AuditHistory
+from .iam_events import affected_usernames, event_summary, is_iam_change_event
+from .memoized_client import MemoizedIAMClient
+from .organization import OrganizationAudit, list_member_accounts, merge_account_results
+from .policy_documents import PolicyDocumentCache
+from .policy_evaluator import PolicyEvaluator, principal_context, user_policy_documents
+from .principal_audit import PrincipalAudit
+from .remediation import RemediationRunner, plan_remediation
+from .result_store import AuditResultStore
+
+__all__ = [
+    'AccessAdvisorPipeline',
+    'AuditHistory',
+    'AuditIndex',
+    'AuditOutputStream',
+    'AuditResultStore',
+    'AuthorizationSnapshot',
+    'ComplianceRuleEngine',
+    'CredentialReport',
+    'FingerprintCache',
+    'IAMEntityIndex',
+    'MemoizedIAMClient',
+    'OrganizationAudit',
+    'PolicyDocumentCache',
+    'PolicyEvaluator',
+    'PrincipalAudit',
+    'RemediationRunner',
+    'affected_usernames',
+    'event_summary',
+    'is_iam_change_event',
+    'list_member_accounts',
+    'merge_account_results',
+    'next_threshold_crossing',
+    'plan_remediation',
+    'principal_context',
+    'user_fingerprint',
+    'user_policy_documents',
+    'user_record',
+]
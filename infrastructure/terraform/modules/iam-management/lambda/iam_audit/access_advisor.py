@@ -0,0 +1,133 @@
+"""
+ITSANDBOX Access Advisor パイプライン
+全ユーザー分の generate_service_last_accessed_details ジョブをまとめて投入し、
+ジョブIDをまとめてバックオフ付きでポーリングして、ユーザーごとの未使用サービス表を作成する
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from itsandbox_common import bounded_map
+
+logger = logging.getLogger(__name__)
+
+# ポーリング間隔（秒）。未完了のジョブが残るたびに倍にし、上限で頭打ち
+POLL_INITIAL_INTERVAL_SECONDS = 1.0
+POLL_MAX_INTERVAL_SECONDS = 16.0
+
+JOB_COMPLETED = 'COMPLETED'
+JOB_FAILED = 'FAILED'
+
+
+def summarize_services(services: List[Dict[str, Any]], threshold: datetime) -> Dict[str, Any]:
+    """ServicesLastAccessed を未使用サービス表の1行に変換
+
+    ポリシーで許可されているが一度も使われていない、または threshold 以降に使われていない
+    サービスを未使用とする。
+    """
+    never_used = []
+    stale = []
+    used = []
+    for service in services:
+        namespace = service['ServiceNamespace']
+        last_authenticated = service.get('LastAuthenticated')
+        if last_authenticated is None:
+            never_used.append(namespace)
+        elif last_authenticated.replace(tzinfo=None) < threshold:
+            stale.append(namespace)
+        else:
+            used.append(namespace)
+    return {
+        'granted_services': len(services),
+        'used_services': sorted(used),
+        'never_used_services': sorted(never_used),
+        'stale_services': sorted(stale),
+        'unused_services': sorted(never_used + stale),
+    }
+
+
+class AccessAdvisorPipeline:
+    """Access Advisor ジョブの一括投入・ポーリング・集計"""
+
+    def __init__(self, iam_client, unused_threshold: datetime, max_workers: int = 4):
+        self.iam_client = iam_client
+        self.unused_threshold = unused_threshold
+        self.max_workers = max_workers
+
+    def submit(self, principals: Dict[str, str]) -> Dict[str, str]:
+        """{名前: ARN} のジョブをまとめて投入し {名前: ジョブID} を返す（失敗した名前は含まない）"""
+        names = list(principals)
+
+        def submit_one(name: str) -> Optional[str]:
+            try:
+                response = self.iam_client.generate_service_last_accessed_details(
+                    Arn=principals[name], Granularity='SERVICE_LEVEL'
+                )
+                return response['JobId']
+            except Exception as e:
+                logger.warning(f"Access Advisorジョブ投入失敗 {name}: {str(e)}")
+                return None
+
+        job_ids = bounded_map(submit_one, names, self.max_workers)
+        return {name: job_id for name, job_id in zip(names, job_ids) if job_id}
+
+    def fetch(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """ジョブの結果（未完了はNone、失敗時は error を含む辞書）"""
+        response = self.iam_client.get_service_last_accessed_details(JobId=job_id)
+        status = response['JobStatus']
+        if status == JOB_FAILED:
+            return {'error': response.get('Error', {}).get('Message', 'job failed')}
+        if status != JOB_COMPLETED:
+            return None
+
+        services = list(response['ServicesLastAccessed'])
+        while response.get('IsTruncated'):
+            response = self.iam_client.get_service_last_accessed_details(
+                JobId=job_id, Marker=response['Marker']
+            )
+            services.extend(response['ServicesLastAccessed'])
+        return summarize_services(services, self.unused_threshold)
+
+    def poll(self, jobs: Dict[str, str], results: Dict[str, Any],
+             should_stop: Callable[[], bool] = lambda: False,
+             on_complete: Callable[[int], None] = lambda count: None,
+             timeout_seconds: float = 600.0) -> Dict[str, str]:
+        """未完了ジョブをまとめてポーリングし、完了分を results に追加
+
+        全ジョブ完了・should_stop が真・タイムアウトのいずれかで終了し、未完了の {名前: ジョブID} を返す。
+        """
+        pending = {name: job_id for name, job_id in jobs.items() if name not in results}
+        interval = POLL_INITIAL_INTERVAL_SECONDS
+        deadline = time.time() + timeout_seconds
+
+        while pending:
+            names = sorted(pending)
+            fetched = bounded_map(lambda name: self._fetch_safely(name, pending[name]),
+                                  names, self.max_workers)
+            completed = 0
+            for name, result in zip(names, fetched):
+                if result is not None:
+                    results[name] = result
+                    del pending[name]
+                    completed += 1
+            if completed:
+                on_complete(completed)
+                # 進捗があれば間隔を戻す
+                interval = POLL_INITIAL_INTERVAL_SECONDS
+
+            if not pending or should_stop() or time.time() + interval > deadline:
+                break
+            time.sleep(interval)
+            interval = min(interval * 2, POLL_MAX_INTERVAL_SECONDS)
+
+        return pending
+
+    def _fetch_safely(self, name: str, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.fetch(job_id)
+        except Exception as e:
+            logger.warning(f"Access Advisor結果取得失敗 {name}: {str(e)}")
+            return {'error': str(e)}
+
@@ -0,0 +1,237 @@
+"""
+ITSANDBOX 監査結果インデックス
+直近の監査結果（チェック別ビットセット・ユーザー別の指摘詳細・タグ別ビットセット）を
+状態ストアの1ファイルに保存し、query_audit アクションがIAMを呼び出さずに
+ユーザー・チェック・タグで検索できるようにする
+"""
+
+import base64
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .result_store import (
+    AUDITED,
+    KEY_AUDIT_CHECKS,
+    SERVICE_USAGE_CHECKS,
+    USER_AUDIT_CHECKS,
+    AuditResultStore,
+    decode_bitset,
+    encode_bitset,
+    finding_username,
+)
+
+INDEX_KEY = 'index/latest.json'
+INDEX_FORMAT_VERSION = 1
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# 検索できるチェック名
+ALL_AUDIT_CHECKS = tuple(sorted({
+    *USER_AUDIT_CHECKS.values(), *KEY_AUDIT_CHECKS.values(), *SERVICE_USAGE_CHECKS.values()
+}))
+
+
+def tag_filter(key: str, value: str) -> str:
+    return f"{key}={value}"
+
+
+class AuditIndex:
+    """検索用の監査結果インデックス"""
+
+    def __init__(self):
+        self.store = AuditResultStore()
+        # ユーザー名 -> チェック -> 指摘の詳細（アクセスキー等、1ユーザーに複数ある場合はすべて）
+        self.details: Dict[str, Dict[str, List[Any]]] = {}
+        self.user_tags: Dict[str, Dict[str, str]] = {}
+        # "キー=値" -> ビットセット
+        self.tags: Dict[str, int] = {}
+        # チェックごとの最終更新日時（アクションごとに別の実行で更新されるため）
+        self.checked_at: Dict[str, str] = {}
+        # イベント駆動で個別に再監査したユーザーの監査日時
+        self.user_checked_at: Dict[str, str] = {}
+        self.generated_at: Optional[str] = None
+
+    def set_users(self, user_tags: Dict[str, Dict[str, str]], generated_at: str):
+        """監査対象ユーザーとタグを置き換え（退職等でいなくなったユーザーは検索対象外になる）
+
+        ユーザーIDは今回の対象ユーザーで採番し直し、いなくなったユーザーの名前・詳細は残さない
+        （今回実行しない監査のチェックはユーザー名で新しいIDへ移す）。
+        """
+        self.generated_at = generated_at
+        self.user_checked_at = {}
+        self.store = self.store.rebuild(user_tags)
+        self.details = {username: checks for username, checks in self.details.items() if username in user_tags}
+        self.user_tags = {}
+        self.tags = {}
+        for username, tags in user_tags.items():
+            self.user_tags[username] = dict(tags)
+            user_bit = 1 << self.store.intern(username)
+            for key, value in tags.items():
+                name = tag_filter(key, value)
+                self.tags[name] = self.tags.get(name, 0) | user_bit
+
+    def update(self, checked_at: str, audit_results: Optional[Dict[str, Any]] = None,
+               key_audit_results: Optional[Dict[str, Any]] = None,
+               usage_results: Optional[Dict[str, Any]] = None):
+        """実行した監査の結果だけを反映（実行していない監査のチェックは前回の値を保持）"""
+        for results, categories in ((audit_results, USER_AUDIT_CHECKS),
+                                    (key_audit_results, KEY_AUDIT_CHECKS),
+                                    (usage_results, SERVICE_USAGE_CHECKS)):
+            if results and 'error' not in results:
+                self.apply(results, categories, checked_at)
+
+    def apply(self, results: Dict[str, Any], categories: Dict[str, str], checked_at: str):
+        """監査結果で該当カテゴリのチェックを置き換え"""
+        for category, check in categories.items():
+            if category not in results:
+                continue
+            self.store.bitsets[check] = 0
+            for user_details in self.details.values():
+                user_details.pop(check, None)
+            for finding in results[category]:
+                username = finding_username(finding)
+                self.store.mark(check, username)
+                if not isinstance(finding, str):
+                    self.details.setdefault(username, {}).setdefault(check, []).append(finding)
+            self.checked_at[check] = checked_at
+        self.details = {username: checks for username, checks in self.details.items() if checks}
+
+    def replace_user(self, username: str, tags: Dict[str, str], checked_at: str,
+                     audit_results: Dict[str, Any], key_audit_results: Dict[str, Any]):
+        """1ユーザー分の監査結果で該当ユーザーのビットと詳細だけを置き換え（イベント駆動の再監査用）
+
+        サービス利用状況のチェックは対象外（前回の値を保持）。
+        """
+        user_bit = 1 << self.store.intern(username)
+        self.store.bitsets[AUDITED] = self.store.bitsets.get(AUDITED, 0) | user_bit
+
+        for name in [name for name, bitset in self.tags.items() if bitset & user_bit]:
+            self.tags[name] &= ~user_bit
+            if not self.tags[name]:
+                del self.tags[name]
+        for key, value in tags.items():
+            name = tag_filter(key, value)
+            self.tags[name] = self.tags.get(name, 0) | user_bit
+        self.user_tags[username] = dict(tags)
+
+        user_details = self.details.pop(username, {})
+        for results, categories in ((audit_results, USER_AUDIT_CHECKS),
+                                    (key_audit_results, KEY_AUDIT_CHECKS)):
+            for category, check in categories.items():
+                findings = [finding for finding in results.get(category, [])
+                            if finding_username(finding) == username]
+                user_details.pop(check, None)
+                if findings:
+                    self.store.bitsets[check] = self.store.bitsets.get(check, 0) | user_bit
+                    details = [finding for finding in findings if not isinstance(finding, str)]
+                    if details:
+                        user_details[check] = details
+                else:
+                    self.store.bitsets[check] = self.store.bitsets.get(check, 0) & ~user_bit
+        if user_details:
+            self.details[username] = user_details
+        self.user_checked_at[username] = checked_at
+
+    def remove_user(self, username: str) -> bool:
+        """ユーザーを検索対象から外す（インデックスになかった場合はFalse）"""
+        user_id = self.store.user_id(username)
+        if user_id is None or not self.store.has(AUDITED, username):
+            return False
+        mask = ~(1 << user_id)
+        self.store.bitsets = {check: bitset & mask for check, bitset in self.store.bitsets.items()}
+        self.tags = {name: bitset & mask for name, bitset in self.tags.items() if bitset & mask}
+        self.details.pop(username, None)
+        self.user_tags.pop(username, None)
+        self.user_checked_at.pop(username, None)
+        return True
+
+    def user(self, username: str) -> Optional[Dict[str, Any]]:
+        """ユーザー1人分の監査状態（インデックスにない場合はNone）"""
+        if not self.store.has(AUDITED, username):
+            return None
+        checks = self.store.checks_for(username)
+        return {
+            'username': username,
+            'compliant': not checks,
+            'checks': checks,
+            'findings': self.details.get(username, {}),
+            'tags': self.user_tags.get(username, {}),
+            'checked_at': self.user_checked_at.get(username),
+        }
+
+    def select(self, all_of: Iterable[str] = (), any_of: Iterable[str] = (),
+               none_of: Iterable[str] = (), tags: Iterable[str] = ()) -> int:
+        """チェック条件とタグ（"キー=値"、すべて一致）に該当するユーザーのビットセット"""
+        bitset = self.store.select(all_of, any_of, none_of)
+        for name in tags:
+            bitset &= self.tags.get(name, 0)
+        return bitset
+
+    def page(self, bitset: int, cursor: Optional[str] = None,
+             limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[str], Optional[str]]:
+        """ビットセットのユーザーをID順に limit 件ずつ返す（続きがあれば次のカーソルも返す）"""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        if cursor:
+            after = self._decode_cursor(cursor)
+            bitset &= ~((1 << (after + 1)) - 1)
+
+        usernames = []
+        last_id = None
+        while bitset and len(usernames) < limit:
+            lowest = bitset & -bitset
+            last_id = lowest.bit_length() - 1
+            usernames.append(self.store.usernames[last_id])
+            bitset ^= lowest
+
+        next_cursor = self._encode_cursor(last_id) if bitset else None
+        return usernames, next_cursor
+
+    def _encode_cursor(self, user_id: int) -> str:
+        payload = json.dumps({'generated_at': self.generated_at, 'after': user_id}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def _decode_cursor(self, cursor: str) -> int:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            after = int(payload['after'])
+        except Exception:
+            raise ValueError('カーソルが不正です') from None
+        # インデックスが更新された後のカーソルは位置がずれるため使用できない
+        if payload.get('generated_at') != self.generated_at:
+            raise ValueError('監査インデックスが更新されたため、カーソルは無効です')
+        return after
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': INDEX_FORMAT_VERSION,
+            'generated_at': self.generated_at,
+            'checked_at': self.checked_at,
+            'store': self.store.to_dict(),
+            'tags': {name: encode_bitset(bitset) for name, bitset in sorted(self.tags.items())},
+            'user_tags': self.user_tags,
+            'user_checked_at': self.user_checked_at,
+            'details': self.details,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AuditIndex':
+        if data.get('version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"未対応の監査インデックス形式です: {data.get('version')}")
+        index = cls()
+        index.generated_at = data['generated_at']
+        index.checked_at = data['checked_at']
+        index.store = AuditResultStore.from_dict(data['store'])
+        index.tags = {name: decode_bitset(encoded) for name, encoded in data['tags'].items()}
+        index.user_tags = data['user_tags']
+        index.user_checked_at = data.get('user_checked_at', {})
+        index.details = data['details']
+        return index
+
+    @classmethod
+    def load(cls, state_store) -> Optional['AuditIndex']:
+        data = state_store.get_json(INDEX_KEY)
+        return cls.from_dict(data) if data else None
+
+    def save(self, state_store):
+        state_store.put_json(INDEX_KEY, self.to_dict())
@@ -0,0 +1,85 @@
+"""
+ITSANDBOX 監査結果のストリーミング出力
+ユーザーごとの監査結果を生成された時点でNDJSONとして書き出し、
+レスポンスにはマニフェストと件数だけを返す
+"""
+
+from typing import Any, Dict, Iterable, Optional
+
+# 1ユーザー分の結果が (ユーザーチェック, アクセスキーチェック) の組になるステージ
+COMBINED_RESULT_FIELDS = ('user', 'access_keys')
+
+# 件数にまとめるとユーザー数に比例する大きさのまま残るマップ（NDJSONにのみ出力）
+PER_USER_MAPS = ('service_usage',)
+
+
+def output_record(stage: str, username: str, result: Any) -> Dict[str, Any]:
+    """NDJSONの1行（増分監査で再利用した結果はJSON経由のためタプルがリストになっている）"""
+    if isinstance(result, (list, tuple)):
+        result = dict(zip(COMBINED_RESULT_FIELDS, result))
+    return {'stage': stage, 'username': username, 'result': result}
+
+
+def result_counts(value: Any) -> Any:
+    """監査結果の一覧を件数に置き換えたサマリー（ユーザー名・詳細を含まない）"""
+    if isinstance(value, dict):
+        return {
+            key: result_counts(item) for key, item in value.items()
+            if key not in PER_USER_MAPS
+        }
+    if isinstance(value, (list, tuple)):
+        return len(value)
+    return value
+
+
+class AuditOutputStream:
+    """1回の監査実行（継続呼び出しを含む）の出力
+
+    オブジェクトはステージと開始カーソルごとに分かれるため、継続呼び出しや
+    同じ世代の再実行でも既存の出力を上書きするだけで重複しない。
+    """
+
+    def __init__(self, sink, run_id: str):
+        self.sink = sink
+        self.run_id = run_id
+
+    def _prefix(self) -> str:
+        return f"runs/{self.run_id}/"
+
+    def segment(self, stage: str, start: int = 0):
+        """ステージの start 件目以降を書き出すライター"""
+        return self.sink.open_writer(f"{self._prefix()}{stage}-{start:08d}.ndjson")
+
+    def write_all(self, stage: str, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """ステージ完了後にまとめて得られる結果（サービス利用状況等）を書き出し"""
+        writer = self.segment(stage)
+        try:
+            for record in records:
+                writer.write(record)
+        except Exception:
+            writer.abort()
+            raise
+        return writer.close()
+
+    def write_manifest(self, generated_at: str, summary: Dict[str, Any],
+                       actions: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """この実行の全出力オブジェクトと件数のマニフェストを書き出して返す"""
+        prefix = self._prefix()
+        manifest_key = f"{prefix}manifest.json"
+        objects = [
+            dict(obj, location=self.sink.location(obj['key']))
+            for obj in self.sink.list_objects(prefix)
+            if obj['key'].endswith('.ndjson')
+        ]
+        manifest = {
+            'run_id': self.run_id,
+            'generated_at': generated_at,
+            'format': 'ndjson',
+            'actions': list(actions or []),
+            'objects': objects,
+            'total_bytes': sum(obj['bytes'] for obj in objects),
+            'summary': summary,
+            'location': self.sink.location(manifest_key),
+        }
+        self.sink.put_json(manifest_key, manifest)
+        return manifest
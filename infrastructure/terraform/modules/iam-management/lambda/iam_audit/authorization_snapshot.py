@@ -0,0 +1,177 @@
+"""
+ITSANDBOX 認可情報スナップショット
+get_account_authorization_details をページングで一度だけ取得し、
+ユーザー・グループ・ロールのポリシー、グループ所属、タグをメモリ上に索引化する
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+# 取得対象（AWS管理ポリシーの本文は件数が多いため含めない）
+SNAPSHOT_FILTER = ['User', 'Group', 'Role', 'LocalManagedPolicy']
+
+
+def decode_policy_document(document: Any) -> Dict[str, Any]:
+    """ポリシー本文を辞書に変換（APIによってはURLエンコードされたJSON文字列で返る）"""
+    if isinstance(document, dict):
+        return document
+    if not document:
+        return {}
+    return json.loads(unquote(document))
+
+
+def _tags(entries: Optional[List[Dict[str, str]]]) -> Dict[str, str]:
+    return {tag['Key']: tag['Value'] for tag in entries or []}
+
+
+def _inline_policies(entries: Optional[List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    return {
+        policy['PolicyName']: decode_policy_document(policy.get('PolicyDocument'))
+        for policy in entries or []
+    }
+
+
+def _attached_policies(entries: Optional[List[Dict[str, str]]]) -> List[str]:
+    return [policy['PolicyArn'] for policy in entries or []]
+
+
+def _boundary(detail: Dict[str, Any]) -> Optional[str]:
+    return (detail.get('PermissionsBoundary') or {}).get('PermissionsBoundaryArn')
+
+
+class AuthorizationSnapshot:
+    """アカウント内のIAM認可情報の索引"""
+
+    def __init__(self):
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.groups: Dict[str, Dict[str, Any]] = {}
+        self.roles: Dict[str, Dict[str, Any]] = {}
+        self.policies: Dict[str, Dict[str, Any]] = {}
+
+    def user(self, username: str) -> Optional[Dict[str, Any]]:
+        return self.users.get(username)
+
+    def group(self, group_name: str) -> Optional[Dict[str, Any]]:
+        return self.groups.get(group_name)
+
+    def role(self, role_name: str) -> Optional[Dict[str, Any]]:
+        return self.roles.get(role_name)
+
+    def policy(self, policy_arn: str) -> Optional[Dict[str, Any]]:
+        """カスタマー管理ポリシー（AWS管理ポリシーは含まれないためNone）"""
+        return self.policies.get(policy_arn)
+
+    def add_page(self, page: Dict[str, Any]):
+        """get_account_authorization_details の1ページ分を索引に追加"""
+        for detail in page.get('UserDetailList', []):
+            self.users[detail['UserName']] = {
+                'arn': detail['Arn'],
+                'path': detail.get('Path', '/'),
+                'create_date': detail.get('CreateDate'),
+                'attached_policies': _attached_policies(detail.get('AttachedManagedPolicies')),
+                'inline_policies': _inline_policies(detail.get('UserPolicyList')),
+                'groups': list(detail.get('GroupList', [])),
+                'tags': _tags(detail.get('Tags')),
+                'permissions_boundary': _boundary(detail),
+            }
+
+        for detail in page.get('GroupDetailList', []):
+            self.groups[detail['GroupName']] = {
+                'arn': detail['Arn'],
+                'path': detail.get('Path', '/'),
+                'attached_policies': _attached_policies(detail.get('AttachedManagedPolicies')),
+                'inline_policies': _inline_policies(detail.get('GroupPolicyList')),
+            }
+
+        for detail in page.get('RoleDetailList', []):
+            self.roles[detail['RoleName']] = {
+                'arn': detail['Arn'],
+                'path': detail.get('Path', '/'),
+                'create_date': detail.get('CreateDate'),
+                'assume_role_policy': decode_policy_document(detail.get('AssumeRolePolicyDocument')),
+                'attached_policies': _attached_policies(detail.get('AttachedManagedPolicies')),
+                'inline_policies': _inline_policies(detail.get('RolePolicyList')),
+                'tags': _tags(detail.get('Tags')),
+                'permissions_boundary': _boundary(detail),
+                'role_last_used': detail.get('RoleLastUsed') or {},
+            }
+
+        for detail in page.get('Policies', []):
+            default_version = next(
+                (v for v in detail.get('PolicyVersionList', []) if v.get('IsDefaultVersion')),
+                None
+            )
+            self.policies[detail['Arn']] = {
+                'name': detail['PolicyName'],
+                'default_version_id': detail.get('DefaultVersionId'),
+                'document': decode_policy_document(default_version.get('Document')) if default_version else {},
+            }
+
+    @classmethod
+    def fetch_user(cls, iam_client, username: str) -> 'AuthorizationSnapshot':
+        """1ユーザー分（所属グループのポリシーを含む）を個別APIで取得してスナップショットを構築
+
+        一括取得しない少数ユーザーの再監査用。管理ポリシーの本文は含めない
+        （評価時にポリシー文書キャッシュで解決する）。
+        """
+        user = iam_client.get_user(UserName=username)['User']
+        groups = iam_client.list_groups_for_user(UserName=username)['Groups']
+        page = {
+            'UserDetailList': [dict(
+                user,
+                AttachedManagedPolicies=iam_client.list_attached_user_policies(
+                    UserName=username
+                )['AttachedPolicies'],
+                UserPolicyList=[
+                    {
+                        'PolicyName': policy_name,
+                        'PolicyDocument': iam_client.get_user_policy(
+                            UserName=username, PolicyName=policy_name
+                        )['PolicyDocument'],
+                    }
+                    for policy_name in iam_client.list_user_policies(UserName=username)['PolicyNames']
+                ],
+                GroupList=[group['GroupName'] for group in groups],
+            )],
+            'GroupDetailList': [
+                dict(
+                    group,
+                    AttachedManagedPolicies=iam_client.list_attached_group_policies(
+                        GroupName=group['GroupName']
+                    )['AttachedPolicies'],
+                    GroupPolicyList=[
+                        {
+                            'PolicyName': policy_name,
+                            'PolicyDocument': iam_client.get_group_policy(
+                                GroupName=group['GroupName'], PolicyName=policy_name
+                            )['PolicyDocument'],
+                        }
+                        for policy_name in iam_client.list_group_policies(
+                            GroupName=group['GroupName']
+                        )['PolicyNames']
+                    ],
+                )
+                for group in groups
+            ],
+        }
+        snapshot = cls()
+        snapshot.add_page(page)
+        return snapshot
+
+    @classmethod
+    def fetch(cls, iam_client, filters: Optional[List[str]] = None) -> 'AuthorizationSnapshot':
+        """全ページを取得してスナップショットを構築"""
+        snapshot = cls()
+        paginator = iam_client.get_paginator('get_account_authorization_details')
+        for page in paginator.paginate(Filter=filters or SNAPSHOT_FILTER):
+            snapshot.add_page(page)
+        logger.info(
+            f"認可情報スナップショットを取得しました: ユーザー{len(snapshot.users)}件, "
+            f"グループ{len(snapshot.groups)}件, ロール{len(snapshot.roles)}件, "
+            f"ポリシー{len(snapshot.policies)}件"
+        )
+        return snapshot
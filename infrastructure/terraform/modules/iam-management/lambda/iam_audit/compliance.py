@@ -0,0 +1,177 @@
+"""
+ITSANDBOX コンプライアンスルールエンジン
+設定ファイル（JSON）のルールを起動時に一度だけ述語へコンパイルし、
+認可情報スナップショット上の全ユーザーへルール単位で一括適用する。
+ルールはスナップショットの情報だけを参照するため、ルールを追加してもAPI呼び出しは増えない。
+
+ルールの種類:
+    required_tags     tags の各タグが設定されていること（不足タグごとに1件）
+    tag_value         tag が設定されている場合、値が values のいずれか、または pattern に一致すること
+    name_pattern      ユーザー名が prefix で始まる、または pattern（正規表現）に一致すること
+    path_prefix       ユーザーのパスが prefix で始まること
+    group_membership  prefix で始まる、または groups に含まれるグループに所属していること
+"""
+
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .fingerprints import stable_hash
+
+RULES_FORMAT_VERSION = 1
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), 'compliance_rules.json')
+
+# 参照する情報を取得できなかったユーザーへの指摘
+UNAVAILABLE_MESSAGES = {
+    'tags': 'Unable to check user tags',
+    'groups': 'Unable to check group membership',
+    'path': 'Unable to check user path',
+}
+
+# ルールが評価するユーザー情報: {username, path, tags, groups}（取得できなかった項目はNone）
+UserRecord = Dict[str, Any]
+Predicate = Callable[[UserRecord], List[str]]
+
+
+def user_record(username: str, authorization: Optional[Dict[str, Any]]) -> UserRecord:
+    """スナップショットのユーザー情報をルール評価用のレコードに変換"""
+    authorization = authorization or {}
+    return {
+        'username': username,
+        'path': authorization.get('path'),
+        'tags': authorization.get('tags'),
+        'groups': authorization.get('groups'),
+    }
+
+
+def _matcher(rule: Dict[str, Any]) -> Callable[[str], bool]:
+    """prefix / pattern / 値の一覧から文字列の判定関数を作成"""
+    if 'pattern' in rule:
+        pattern = re.compile(rule['pattern'])
+        return lambda value: pattern.fullmatch(value) is not None
+    if 'prefix' in rule:
+        prefix = rule['prefix']
+        return lambda value: value.startswith(prefix)
+    raise ValueError(f"ルール {rule['id']} には prefix または pattern が必要です")
+
+
+def _compile_required_tags(rule: Dict[str, Any]) -> Predicate:
+    required_tags = tuple(rule['tags'])
+    message = rule.get('message', "Required tag '{tag}' is missing")
+
+    def predicate(record: UserRecord) -> List[str]:
+        tags = record['tags']
+        return [message.format(tag=tag) for tag in required_tags if tag not in tags]
+
+    return predicate
+
+
+def _compile_tag_value(rule: Dict[str, Any]) -> Predicate:
+    tag = rule['tag']
+    if 'values' in rule:
+        allowed = frozenset(rule['values'])
+        matches = allowed.__contains__
+    else:
+        matches = _matcher(rule)
+    message = rule.get('message', "Tag '{tag}' has a non-compliant value '{value}'")
+
+    def predicate(record: UserRecord) -> List[str]:
+        value = record['tags'].get(tag)
+        if value is None or matches(value):
+            return []
+        return [message.format(tag=tag, value=value)]
+
+    return predicate
+
+
+def _compile_name_pattern(rule: Dict[str, Any]) -> Predicate:
+    matches = _matcher(rule)
+    message = rule.get('message', "Username does not follow naming convention")
+    return lambda record: [] if matches(record['username']) else [message]
+
+
+def _compile_path_prefix(rule: Dict[str, Any]) -> Predicate:
+    prefix = rule['prefix']
+    message = rule.get('message', f"User path does not start with '{prefix}'")
+    return lambda record: [] if record['path'].startswith(prefix) else [message]
+
+
+def _compile_group_membership(rule: Dict[str, Any]) -> Predicate:
+    names = frozenset(rule.get('groups', []))
+    prefix = rule.get('prefix')
+    if not names and prefix is None:
+        raise ValueError(f"ルール {rule['id']} には groups または prefix が必要です")
+    message = rule.get('message', "User is not member of a required group")
+
+    def is_member(group: str) -> bool:
+        return group in names or (prefix is not None and group.startswith(prefix))
+
+    return lambda record: [] if any(is_member(group) for group in record['groups']) else [message]
+
+
+# ルールの種類ごとのコンパイラと、評価に必要なレコードの項目
+RULE_TYPES: Dict[str, Any] = {
+    'required_tags': (_compile_required_tags, 'tags'),
+    'tag_value': (_compile_tag_value, 'tags'),
+    'name_pattern': (_compile_name_pattern, 'username'),
+    'path_prefix': (_compile_path_prefix, 'path'),
+    'group_membership': (_compile_group_membership, 'groups'),
+}
+
+
+class CompiledRule:
+    """述語にコンパイル済みのルール"""
+
+    def __init__(self, rule: Dict[str, Any]):
+        if rule.get('type') not in RULE_TYPES:
+            raise ValueError(f"未対応のコンプライアンスルールです: {rule.get('type')} ({rule.get('id')})")
+        compile_rule, field = RULE_TYPES[rule['type']]
+        self.id = rule['id']
+        self.field = field
+        self.predicate = compile_rule(rule)
+
+    def evaluate(self, record: UserRecord) -> List[str]:
+        if record[self.field] is None:
+            return [UNAVAILABLE_MESSAGES.get(self.field, f"Unable to check {self.field}")]
+        return self.predicate(record)
+
+
+class ComplianceRuleEngine:
+    """コンパイル済みルールの集合"""
+
+    def __init__(self, config: Dict[str, Any]):
+        if config.get('version') != RULES_FORMAT_VERSION:
+            raise ValueError(f"未対応のコンプライアンスルール形式です: {config.get('version')}")
+        self.rules = [CompiledRule(rule) for rule in config['rules'] if rule.get('enabled', True)]
+        # ルールが参照するレコードの項目（個別APIへのフォールバック時に必要な情報だけ取得する）
+        self.fields = frozenset(rule.field for rule in self.rules)
+        # ルールの変更で増分監査の保存済み判定を無効化するためのハッシュ
+        self.rules_hash = stable_hash(config)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> 'ComplianceRuleEngine':
+        with open(path or DEFAULT_RULES_PATH, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def evaluate(self, record: UserRecord) -> List[str]:
+        """1ユーザー分の違反一覧（ルールの定義順）"""
+        violations = []
+        for rule in self.rules:
+            violations.extend(rule.evaluate(record))
+        return violations
+
+    def evaluate_all(self, records: Iterable[UserRecord]) -> Dict[str, List[str]]:
+        """全ユーザーへルール単位で一括適用し、違反のあるユーザーの {ユーザー名: 違反一覧} を返す"""
+        records = list(records)
+        violations: List[List[str]] = [[] for _ in records]
+        for rule in self.rules:
+            for index, record in enumerate(records):
+                found = rule.evaluate(record)
+                if found:
+                    violations[index].extend(found)
+        return {
+            record['username']: found
+            for record, found in zip(records, violations) if found
+        }
@@ -0,0 +1,118 @@
+"""
+ITSANDBOX 認証情報レポート
+generate_credential_report / get_credential_report を1回ずつ呼び出し、
+CSVをストリームとして解析して全ユーザーのパスワード・MFA・アクセスキー情報を提供する
+"""
+
+import codecs
+import csv
+import io
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# レポート生成完了までの最大待機時間（秒）
+REPORT_GENERATION_TIMEOUT_SECONDS = 120
+REPORT_POLL_INTERVAL_SECONDS = 2
+
+# 値が存在しないことを示すレポート上の表記
+_EMPTY_VALUES = {'', 'N/A', 'no_information', 'not_supported'}
+
+ACCESS_KEY_SLOTS = (1, 2)
+
+
+def _parse_datetime(value: str) -> Optional[datetime]:
+    if value in _EMPTY_VALUES:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def _parse_bool(value: str) -> bool:
+    return value == 'true'
+
+
+def parse_row(row: Dict[str, str]) -> Dict[str, Any]:
+    """CSVの1行を監査で使用する形式に変換"""
+    access_keys = []
+    for slot in ACCESS_KEY_SLOTS:
+        last_rotated = _parse_datetime(row.get(f'access_key_{slot}_last_rotated', 'N/A'))
+        if last_rotated is None:
+            # キーが存在しないスロット
+            continue
+        access_keys.append({
+            'slot': slot,
+            'active': _parse_bool(row.get(f'access_key_{slot}_active', 'false')),
+            'last_rotated': last_rotated,
+            'last_used': _parse_datetime(row.get(f'access_key_{slot}_last_used_date', 'N/A')),
+        })
+
+    return {
+        'user': row['user'],
+        'arn': row['arn'],
+        'user_creation_time': _parse_datetime(row['user_creation_time']),
+        'password_enabled': _parse_bool(row.get('password_enabled', 'false')),
+        'password_last_used': _parse_datetime(row.get('password_last_used', 'N/A')),
+        'password_last_changed': _parse_datetime(row.get('password_last_changed', 'N/A')),
+        'mfa_active': _parse_bool(row.get('mfa_active', 'false')),
+        'access_keys': access_keys,
+    }
+
+
+def iter_report_rows(content: bytes) -> Iterator[Dict[str, str]]:
+    """CSVを1行ずつ読み出す（全行をリストに展開しない）"""
+    lines = codecs.iterdecode(io.BytesIO(content), 'utf-8')
+    yield from csv.DictReader(lines)
+
+
+class CredentialReport:
+    """ユーザー名をキーとした認証情報レポート"""
+
+    def __init__(self, rows: Dict[str, Dict[str, Any]], generated_time: Optional[datetime] = None):
+        self.rows = rows
+        self.generated_time = generated_time
+
+    def row(self, username: str) -> Optional[Dict[str, Any]]:
+        return self.rows.get(username)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    def from_content(cls, content: bytes, path_prefix: str = '/',
+                     generated_time: Optional[datetime] = None) -> 'CredentialReport':
+        """CSVを解析し、対象パス配下のユーザーのみ保持"""
+        rows = {}
+        for raw in iter_report_rows(content):
+            # ARN形式: arn:aws:iam::<account>:user<path><name>
+            resource = raw.get('arn', '').split(':', 5)[-1]
+            user_path = resource[len('user'):] if resource.startswith('user') else ''
+            if not user_path.startswith(path_prefix):
+                continue
+            rows[raw['user']] = parse_row(raw)
+        return cls(rows, generated_time)
+
+    @classmethod
+    def fetch(cls, iam_client, path_prefix: str = '/',
+              timeout_seconds: int = REPORT_GENERATION_TIMEOUT_SECONDS) -> 'CredentialReport':
+        """レポートを生成（4時間以内の既存レポートはIAM側で再利用される）して取得"""
+        deadline = time.time() + timeout_seconds
+        while True:
+            state = iam_client.generate_credential_report().get('State')
+            if state == 'COMPLETE':
+                break
+            if time.time() >= deadline:
+                raise TimeoutError(f"認証情報レポートの生成がタイムアウトしました (state={state})")
+            time.sleep(REPORT_POLL_INTERVAL_SECONDS)
+
+        response = iam_client.get_credential_report()
+        generated_time = response.get('GeneratedTime')
+        report = cls.from_content(
+            response['Content'],
+            path_prefix,
+            generated_time.replace(tzinfo=None) if generated_time else None
+        )
+        logger.info(f"認証情報レポートを取得しました: {len(report)}ユーザー")
+        return report
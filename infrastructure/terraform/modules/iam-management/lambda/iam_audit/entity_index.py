@@ -0,0 +1,111 @@
+"""
+ITSANDBOX IAMエンティティインデックス
+1回の実行（バッチ内の全アクション）で共有し、同じ取得APIを一度だけ呼び出す
+ユーザー一覧はページ単位でストリーミングし、全件をメモリに保持しない
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .authorization_snapshot import AuthorizationSnapshot
+from .credential_report import CredentialReport
+from .memoized_client import MemoizedIAMClient
+
+logger = logging.getLogger(__name__)
+
+# list_users の1ページあたりの件数（APIの上限は1000）
+USER_PAGE_SIZE = 1000
+
+
+class IAMEntityIndex:
+    """実行単位で共有するIAMユーザー・アクセスキー情報のキャッシュ"""
+
+    def __init__(self, iam_client, path_prefix: str = '/itsandbox/', bulk: bool = True):
+        # 参照系の呼び出しは実行単位でメモ化（結果・NoSuchEntityの両方）
+        if not isinstance(iam_client, MemoizedIAMClient):
+            iam_client = MemoizedIAMClient(iam_client)
+        self.iam_client = iam_client
+        self.path_prefix = path_prefix
+        self._credential_report: Optional[CredentialReport] = None
+        self._authorization_snapshot: Optional[AuthorizationSnapshot] = None
+        # bulk=False（少数ユーザーの再監査）では一括取得せず最初から個別APIを使う
+        self._credential_report_loaded = not bulk
+        self._authorization_snapshot_loaded = not bulk
+        # 並列監査の各スレッドから呼ばれても一括取得は一度だけ行う
+        self._credential_report_lock = threading.Lock()
+        self._authorization_snapshot_lock = threading.Lock()
+        # 一括取得のスナップショットにないユーザーの個別取得分
+        self._user_snapshots: Dict[str, AuthorizationSnapshot] = {}
+        self._user_snapshots_lock = threading.Lock()
+
+    def iter_users(self, page_size: int = USER_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        """対象パス配下のユーザーをページ単位で取得しながら1件ずつ返す（全件をメモリに保持しない）"""
+        paginator = self.iam_client.get_paginator('list_users')
+        for page in paginator.paginate(PathPrefix=self.path_prefix,
+                                       PaginationConfig={'PageSize': page_size}):
+            yield from page['Users']
+
+    def credential_report(self) -> Optional[CredentialReport]:
+        """認証情報レポート（取得に失敗した場合はNoneを返し、呼び出し側は個別APIにフォールバック）"""
+        with self._credential_report_lock:
+            if not self._credential_report_loaded:
+                self._credential_report_loaded = True
+                try:
+                    self._credential_report = CredentialReport.fetch(self.iam_client, self.path_prefix)
+                except Exception as e:
+                    logger.warning(f"認証情報レポートを取得できません。個別APIで監査します: {str(e)}")
+        return self._credential_report
+
+    def credential_row(self, username: str) -> Optional[Dict[str, Any]]:
+        """ユーザーの認証情報レポート行（レポート生成後に作成されたユーザーはNone）"""
+        report = self.credential_report()
+        return report.row(username) if report else None
+
+    def authorization_snapshot(self) -> Optional[AuthorizationSnapshot]:
+        """認可情報スナップショット（取得に失敗した場合はNoneを返し、呼び出し側は個別APIにフォールバック）"""
+        with self._authorization_snapshot_lock:
+            if not self._authorization_snapshot_loaded:
+                self._authorization_snapshot_loaded = True
+                try:
+                    self._authorization_snapshot = AuthorizationSnapshot.fetch(self.iam_client)
+                except Exception as e:
+                    logger.warning(f"認可情報スナップショットを取得できません。個別APIで監査します: {str(e)}")
+        return self._authorization_snapshot
+
+    def user_authorization(self, username: str) -> Optional[Dict[str, Any]]:
+        """ユーザーのポリシー・グループ・タグ（スナップショット取得後に作成されたユーザーはNone）"""
+        snapshot = self.authorization_snapshot()
+        return snapshot.user(username) if snapshot else None
+
+    def authorization_for(self, username: str) -> Tuple[AuthorizationSnapshot, Dict[str, Any]]:
+        """ユーザーの認可情報と、その評価に使うスナップショット
+
+        一括取得のスナップショットにないユーザー（bulk=False・取得後に作成された等）は
+        個別APIで所属グループ・権限境界を含めて取得し、一括取得時と同じ評価ができるようにする。
+        """
+        snapshot = self.authorization_snapshot()
+        if snapshot is not None and snapshot.user(username) is not None:
+            return snapshot, snapshot.user(username)
+        with self._user_snapshots_lock:
+            user_snapshot = self._user_snapshots.get(username)
+        if user_snapshot is None:
+            user_snapshot = AuthorizationSnapshot.fetch_user(self.iam_client, username)
+            with self._user_snapshots_lock:
+                self._user_snapshots[username] = user_snapshot
+        return user_snapshot, user_snapshot.user(username)
+
+    def access_keys(self, username: str) -> List[Dict[str, Any]]:
+        """ユーザーのアクセスキー一覧"""
+        return self.iam_client.list_access_keys(UserName=username)['AccessKeyMetadata']
+
+    def access_key_last_used(self, access_key_id: str) -> Optional[datetime]:
+        """アクセスキーの最終使用日時（未使用の場合はNone）"""
+        response = self.iam_client.get_access_key_last_used(AccessKeyId=access_key_id)
+        last_used_date = response.get('AccessKeyLastUsed', {}).get('LastUsedDate')
+        return last_used_date.replace(tzinfo=None) if last_used_date else None
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """メモ化のヒット率（同じ情報が一度しか取得されていないことの確認用）"""
+        return self.iam_client.stats()
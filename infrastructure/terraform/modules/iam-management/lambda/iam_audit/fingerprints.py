@@ -0,0 +1,129 @@
+"""
+ITSANDBOX 増分監査用フィンガープリント
+ユーザーごとの監査入力（認証情報レポート行・ポリシー構成・タグ）のハッシュと
+前回の判定結果を状態ストアに保存し、入力が変わっていないユーザーの判定を再利用する
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 入力が変わらなくても判定を再計算するまでの最大日数
+FINGERPRINT_MAX_AGE_DAYS = 7
+
+# 一定期間走査されなかったユーザー（削除済み等）のエントリを破棄するまでの日数
+FINGERPRINT_RETENTION_DAYS = 30
+
+
+def stable_hash(value: Any) -> str:
+    """辞書のキー順に依存しないハッシュ"""
+    encoded = json.dumps(value, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def user_fingerprint(credential_row: Optional[Dict[str, Any]],
+                     authorization: Optional[Dict[str, Any]],
+                     settings: Dict[str, Any],
+                     policy_documents: Any = None) -> Optional[Dict[str, str]]:
+    """ユーザーの監査入力のフィンガープリント（一括取得データがない場合はNone）
+
+    settings には判定に影響する閾値等を渡し、設定変更時に全員を再評価させる。
+    policy_documents には所属グループ分・権限境界を含む実効ポリシー文書（またはそのハッシュ）を渡し、
+    グループや管理ポリシーの内容が変わった場合も再評価させる。
+    """
+    if credential_row is None or authorization is None:
+        return None
+    parts = {
+        'credential': stable_hash(credential_row),
+        'policies': stable_hash({
+            'attached': sorted(authorization['attached_policies']),
+            'inline': authorization['inline_policies'],
+            'groups': sorted(authorization['groups']),
+            'boundary': authorization['permissions_boundary'],
+            'documents': policy_documents,
+        }),
+        'tags': stable_hash(authorization['tags']),
+        'settings': stable_hash(settings),
+    }
+    parts['combined'] = stable_hash(parts)
+    return parts
+
+
+def next_threshold_crossing(timestamps: Iterable[Optional[datetime]],
+                            threshold_days: Iterable[int],
+                            now: datetime) -> Optional[datetime]:
+    """経過日数の閾値を次に超える時刻（入力が同じでも判定が変わる最初の時点）"""
+    crossings = [
+        timestamp + timedelta(days=days)
+        for timestamp in timestamps if timestamp
+        for days in threshold_days
+    ]
+    future = [crossing for crossing in crossings if crossing > now]
+    return min(future) if future else None
+
+
+class FingerprintCache:
+    """ステージ単位のフィンガープリントと判定結果のキャッシュ"""
+
+    def __init__(self, store, stage: str, now: datetime):
+        self.store = store
+        self.key = f"fingerprints/{stage}.json"
+        self.now = now
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = store.get_json(self.key) or {}
+
+    def lookup(self, username: str, fingerprint: Optional[Dict[str, str]]) -> Optional[Any]:
+        """フィンガープリントが一致し有効期限内であれば前回の判定結果を返す"""
+        with self._lock:
+            entry = self._entries.get(username)
+            if (
+                fingerprint is None or entry is None
+                or entry['fingerprint'] != fingerprint['combined']
+                or datetime.fromisoformat(entry['valid_until']) <= self.now
+            ):
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry['last_seen'] = self.now.isoformat()
+            return entry['result']
+
+    def record(self, username: str, fingerprint: Optional[Dict[str, str]], result: Any,
+               valid_until: Optional[datetime] = None):
+        """判定結果を保存（valid_until は時間経過で判定が変わりうる最初の時点）"""
+        if fingerprint is None:
+            return
+        max_valid_until = self.now + timedelta(days=FINGERPRINT_MAX_AGE_DAYS)
+        valid_until = min(valid_until, max_valid_until) if valid_until else max_valid_until
+        with self._lock:
+            self._entries[username] = {
+                'fingerprint': fingerprint['combined'],
+                'parts': fingerprint,
+                'result': result,
+                'valid_until': valid_until.isoformat(),
+                'last_seen': self.now.isoformat(),
+            }
+
+    def save(self):
+        """保持期間を過ぎたエントリを破棄して保存"""
+        cutoff = self.now - timedelta(days=FINGERPRINT_RETENTION_DAYS)
+        with self._lock:
+            self._entries = {
+                username: entry for username, entry in self._entries.items()
+                if datetime.fromisoformat(entry['last_seen']) >= cutoff
+            }
+            entries = dict(self._entries)
+        self.store.put_json(self.key, entries)
+        logger.info(
+            f"増分監査キャッシュを保存しました: {len(entries)}ユーザー "
+            f"(再利用 {self.hits}件, 再評価 {self.misses}件)"
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {'reused': self.hits, 'evaluated': self.misses}
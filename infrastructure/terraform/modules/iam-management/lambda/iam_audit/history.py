@@ -0,0 +1,194 @@
+"""
+ITSANDBOX 監査履歴（時系列）
+実行日ごとのチェック別件数とユーザー単位の状態変化（新規該当・解消）を追記し、
+古い日次データは週次・月次へ集約する。7日・30日前との差分は該当日のキーを直接読むだけで求める。
+
+キー構成（状態ストアの名前空間内）:
+    history/daily/YYYY-MM-DD.json     日次（同日の再実行はその日のレコードを置き換える）
+    history/weekly/YYYY-Www.json      週次（ISO週）
+    history/monthly/YYYY-MM.json      月次
+    history/latest.json               直近の監査結果ストアと、それより前の日の最後の結果ストア（状態変化の算出用）
+
+結果ストアは latest.json にだけ保持する（日次レコードには件数と状態変化のみ）。
+実行をまたいで読み直すため、状態ストアは S3（STATE_BUCKET）である必要がある。
+"""
+
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from .result_store import AUDITED, AuditResultStore
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PREFIX = 'history'
+
+# 日次レコードを保持する日数（30日差分の参照に必要な期間＋余裕）
+DAILY_RETENTION_DAYS = 35
+# 週次レコードを保持する日数（以降は月次へ集約）
+WEEKLY_RETENTION_DAYS = 365
+
+# 差分の基準日に実行がなかった場合に遡る最大日数
+DELTA_LOOKBACK_DAYS = 3
+
+# 日次レコードに保存する状態変化のユーザー名の上限（チェックごと）
+MAX_CHANGED_USERS = 200
+
+
+def _daily_key(day: date) -> str:
+    return f"{HISTORY_PREFIX}/daily/{day.isoformat()}.json"
+
+
+def _weekly_key(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{HISTORY_PREFIX}/weekly/{year}-W{week:02d}.json"
+
+
+def _monthly_key(day: date) -> str:
+    return f"{HISTORY_PREFIX}/monthly/{day.strftime('%Y-%m')}.json"
+
+
+def _key_date(key: str) -> date:
+    return date.fromisoformat(key.rsplit('/', 1)[-1][:-len('.json')])
+
+
+def state_changes(previous: Optional[AuditResultStore], current: AuditResultStore) -> Dict[str, Dict[str, Any]]:
+    """前回から新たに該当したユーザー・該当しなくなったユーザー（チェック別）"""
+    changes = {}
+    checks = set(current.bitsets) | set(previous.bitsets if previous else {})
+    for check in sorted(checks - {AUDITED}):
+        current_users = set(current.query(all_of=[check]))
+        previous_users = set(previous.query(all_of=[check])) if previous else set()
+        added = sorted(current_users - previous_users)
+        removed = sorted(previous_users - current_users)
+        if added or removed:
+            changes[check] = {
+                'added_count': len(added),
+                'removed_count': len(removed),
+                'added': added[:MAX_CHANGED_USERS],
+                'removed': removed[:MAX_CHANGED_USERS],
+            }
+    return changes
+
+
+def rollup(records: List[Dict[str, Any]], period: str) -> Dict[str, Any]:
+    """日次（または週次）レコードを1期間に集約（件数は期末値・平均・最大、変化は件数の合計）"""
+    records = sorted(records, key=lambda record: record['date'])
+    checks = sorted({check for record in records for check in record['counts']})
+    counts = {}
+    for check in checks:
+        values = [record['counts'].get(check, 0) for record in records]
+        counts[check] = {
+            'last': values[-1],
+            'avg': round(sum(values) / len(values), 2),
+            'max': max(values),
+        }
+    changes: Dict[str, Dict[str, int]] = {}
+    for record in records:
+        for check, change in record.get('changes', {}).items():
+            total = changes.setdefault(check, {'added_count': 0, 'removed_count': 0})
+            total['added_count'] += change['added_count']
+            total['removed_count'] += change['removed_count']
+    return {
+        'period': period,
+        'start': records[0].get('start', records[0]['date']),
+        'date': records[-1]['date'],
+        'runs': sum(record.get('runs', 1) for record in records),
+        'counts': {check: value['last'] for check, value in counts.items()},
+        'count_stats': counts,
+        'changes': changes,
+    }
+
+
+class AuditHistory:
+    """状態ストア上の監査履歴"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def record(self, day: date, result_store: AuditResultStore) -> Dict[str, Any]:
+        """実行結果を日次レコードとして追記し、前日以前の最後の実行からの状態変化を返す"""
+        latest = self.store.get_json(f"{HISTORY_PREFIX}/latest.json")
+        baseline = None
+        if latest and latest.get('date') != day.isoformat():
+            baseline = {'date': latest['date'], 'store': latest['store']}
+        elif latest and latest.get('baseline_store'):
+            # 同日の再実行: 前日以前の基準を引き継ぐ
+            baseline = {'date': latest['baseline_date'], 'store': latest['baseline_store']}
+        previous = AuditResultStore.from_dict(baseline['store']) if baseline else None
+
+        record = {
+            'date': day.isoformat(),
+            'counts': result_store.counts(),
+            'changes': state_changes(previous, result_store),
+        }
+        self.store.put_json(_daily_key(day), record)
+        self.store.put_json(f"{HISTORY_PREFIX}/latest.json", {
+            'date': day.isoformat(),
+            'store': result_store.to_dict(),
+            'baseline_date': baseline['date'] if baseline else None,
+            'baseline_store': baseline['store'] if baseline else None,
+        })
+        return record['changes']
+
+    def counts_at(self, day: date) -> Optional[Dict[str, int]]:
+        """指定日（実行がなければ数日前まで遡る）の件数。日次の保持期間外は週次・月次を参照"""
+        for offset in range(DELTA_LOOKBACK_DAYS + 1):
+            record = self.store.get_json(_daily_key(day - timedelta(days=offset)))
+            if record:
+                return record['counts']
+        for key in (_weekly_key(day), _monthly_key(day)):
+            record = self.store.get_json(key)
+            if record:
+                return record['counts']
+        return None
+
+    def deltas(self, day: date, counts: Dict[str, int],
+               periods: Iterable[int] = (7, 30)) -> Dict[str, Dict[str, int]]:
+        """N日前からの件数の増減（{'7d': {check: 差分}, ...}、基準がない期間は含まない）"""
+        deltas = {}
+        for days in periods:
+            baseline = self.counts_at(day - timedelta(days=days))
+            if baseline is None:
+                continue
+            checks = set(counts) | set(baseline)
+            deltas[f"{days}d"] = {
+                check: counts.get(check, 0) - baseline.get(check, 0) for check in sorted(checks)
+            }
+        return deltas
+
+    def compact(self, today: date):
+        """保持期間を過ぎた日次を週次へ、週次を月次へ集約して元のレコードを削除"""
+        self._downsample(
+            f"{HISTORY_PREFIX}/daily/", today - timedelta(days=DAILY_RETENTION_DAYS), _weekly_key, 'weekly'
+        )
+        self._downsample(
+            f"{HISTORY_PREFIX}/weekly/", today - timedelta(days=WEEKLY_RETENTION_DAYS), _monthly_key, 'monthly'
+        )
+
+    def _downsample(self, prefix: str, cutoff: date, target_key, period: str):
+        groups: Dict[str, List[str]] = {}
+        for key in self.store.list_keys(prefix):
+            record_date = self._record_date(key)
+            if record_date is not None and record_date < cutoff:
+                groups.setdefault(target_key(record_date), []).append(key)
+
+        for target, keys in sorted(groups.items()):
+            records = [self.store.get_json(key) for key in keys]
+            existing = self.store.get_json(target)
+            if existing:
+                records.append(existing)
+            self.store.put_json(target, rollup([record for record in records if record], period))
+            for key in keys:
+                self.store.delete(key)
+            logger.info(f"監査履歴を集約しました: {len(keys)}件 -> {target}")
+
+    def _record_date(self, key: str) -> Optional[date]:
+        name = key.rsplit('/', 1)[-1][:-len('.json')]
+        try:
+            if '-W' in name:
+                year, week = name.split('-W')
+                return date.fromisocalendar(int(year), int(week), 7)
+            return _key_date(key)
+        except ValueError:
+            return None
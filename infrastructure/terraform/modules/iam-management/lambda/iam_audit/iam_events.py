@@ -0,0 +1,60 @@
+"""
+ITSANDBOX IAM変更イベント
+EventBridge 経由の CloudTrail イベント（AWS API Call via CloudTrail）から
+監査結果に影響するユーザーを特定する
+"""
+
+from typing import Any, Dict, List
+
+CLOUDTRAIL_DETAIL_TYPE = 'AWS API Call via CloudTrail'
+
+# 1ユーザーの監査結果だけに影響するIAM操作（グループ・ポリシー本体の変更は定期監査で検出）
+USER_EVENT_NAMES = frozenset({
+    'CreateUser', 'DeleteUser', 'UpdateUser', 'TagUser', 'UntagUser',
+    'AttachUserPolicy', 'DetachUserPolicy', 'PutUserPolicy', 'DeleteUserPolicy',
+    'PutUserPermissionsBoundary', 'DeleteUserPermissionsBoundary',
+    'AddUserToGroup', 'RemoveUserFromGroup',
+    'CreateAccessKey', 'UpdateAccessKey', 'DeleteAccessKey',
+    'CreateLoginProfile', 'UpdateLoginProfile', 'DeleteLoginProfile', 'ChangePassword',
+    'EnableMFADevice', 'DeactivateMFADevice', 'ResyncMFADevice',
+})
+
+
+def is_iam_change_event(event: Dict[str, Any]) -> bool:
+    return (
+        event.get('source') == 'aws.iam'
+        and event.get('detail-type') == CLOUDTRAIL_DETAIL_TYPE
+    )
+
+
+def affected_usernames(event: Dict[str, Any]) -> List[str]:
+    """イベントで監査結果が変わりうるユーザー（失敗したAPI呼び出し・対象外の操作は空）"""
+    detail = event.get('detail') or {}
+    if detail.get('eventName') not in USER_EVENT_NAMES or detail.get('errorCode'):
+        return []
+
+    parameters = detail.get('requestParameters') or {}
+    usernames = []
+    username = parameters.get('userName')
+    if username is None:
+        # CreateAccessKey・ChangePassword 等はユーザー名を省略すると呼び出し元自身が対象
+        identity = detail.get('userIdentity') or {}
+        if identity.get('type') == 'IAMUser':
+            username = identity.get('userName')
+    if username:
+        usernames.append(username)
+    # UpdateUser による名前変更は新しい名前も再監査（古い名前はインデックスから削除される）
+    if parameters.get('newUserName'):
+        usernames.append(parameters['newUserName'])
+    return usernames
+
+
+def event_summary(event: Dict[str, Any]) -> Dict[str, Any]:
+    """通知・ログ用のイベント概要"""
+    detail = event.get('detail') or {}
+    return {
+        'event_name': detail.get('eventName'),
+        'event_time': detail.get('eventTime') or event.get('time'),
+        'actor': (detail.get('userIdentity') or {}).get('arn'),
+        'source_ip': detail.get('sourceIPAddress'),
+    }
@@ -0,0 +1,94 @@
+"""
+ITSANDBOX IAM参照呼び出しのメモ化
+1回の実行内で同じパラメータの get_* / list_* 呼び出しを一度だけ実行し、
+結果と NoSuchEntity（存在しない）応答の両方をキャッシュする
+"""
+
+import json
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+# キャッシュ対象とする参照系オペレーションの接頭辞
+MEMOIZED_PREFIXES = ('get_', 'list_')
+
+# 非同期ジョブのポーリング等、同じパラメータでも応答が変わるためキャッシュしない参照系
+UNCACHEABLE_OPERATIONS = {
+    'get_service_last_accessed_details',
+    'get_service_last_accessed_details_with_entities',
+    'get_organizations_access_report',
+}
+
+# 「存在しない」ことを示し、結果としてキャッシュしてよいエラー
+CACHEABLE_ERROR_CODES = {'NoSuchEntity'}
+
+
+def _cache_key(operation: str, params: Dict[str, Any]) -> Tuple[str, str]:
+    return operation, json.dumps(params, sort_keys=True, default=str)
+
+
+def _error_code(error: Exception) -> str:
+    return getattr(error, 'response', {}).get('Error', {}).get('Code', '')
+
+
+class MemoizedIAMClient:
+    """IAMクライアントのラッパー（参照系のみメモ化し、更新系はそのまま呼び出す）"""
+
+    def __init__(self, iam_client):
+        self.client = iam_client
+        self._operations = set(iam_client.meta.method_to_api_mapping)
+        self._cache: Dict[Tuple[str, str], Tuple[bool, Any]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.client, name)
+        if (
+            name in self._operations
+            and name.startswith(MEMOIZED_PREFIXES)
+            and name not in UNCACHEABLE_OPERATIONS
+        ):
+            return self._memoized(name, attribute)
+        return attribute
+
+    def _memoized(self, operation: str, method: Callable) -> Callable:
+        def call(**params):
+            key = _cache_key(operation, params)
+            with self._lock:
+                cached = self._cache.get(key)
+                stats = self._stats.setdefault(operation, {'hits': 0, 'misses': 0})
+                stats['hits' if cached else 'misses'] += 1
+
+            if cached:
+                is_error, value = cached
+                if is_error:
+                    raise value
+                return value
+
+            try:
+                value = method(**params)
+            except Exception as e:
+                if _error_code(e) in CACHEABLE_ERROR_CODES:
+                    with self._lock:
+                        self._cache[key] = (True, e)
+                raise
+            with self._lock:
+                self._cache[key] = (False, value)
+            return value
+
+        return call
+
+    def stats(self) -> Dict[str, Any]:
+        """オペレーション別のヒット数・ミス数とヒット率"""
+        with self._lock:
+            operations = {name: dict(counts) for name, counts in self._stats.items()}
+        hits = sum(counts['hits'] for counts in operations.values())
+        total = hits + sum(counts['misses'] for counts in operations.values())
+        for counts in operations.values():
+            calls = counts['hits'] + counts['misses']
+            counts['hit_rate'] = round(counts['hits'] / calls, 3) if calls else 0.0
+        return {
+            'hits': hits,
+            'misses': total - hits,
+            'hit_rate': round(hits / total, 3) if total else 0.0,
+            'operations': operations,
+        }
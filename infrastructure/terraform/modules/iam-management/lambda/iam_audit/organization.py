@@ -0,0 +1,204 @@
+"""
+ITSANDBOX 組織横断監査
+Organizations からメンバーアカウントを列挙し、各アカウントの監査ロールを引き受けて
+アカウント単位の監査を上限付きで並列実行し、結果を1つの統合結果にまとめる
+"""
+
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+import boto3
+
+from itsandbox_common import bounded_map
+
+logger = logging.getLogger(__name__)
+
+# 監査ロールのセッション名（CloudTrail上で監査による呼び出しを識別する）
+AUDIT_SESSION_NAME = 'itsandbox-org-audit'
+
+# 統合時にユーザー名をアカウントIDで修飾する監査結果のカテゴリ
+MERGED_LIST_CATEGORIES = {
+    'audit_results': (
+        'unused_users', 'users_without_mfa', 'users_with_old_passwords',
+        'users_with_excessive_permissions', 'compliance_violations',
+    ),
+    'key_audit_results': (
+        'users_with_old_keys', 'users_with_unused_keys', 'users_with_multiple_keys',
+        'rotation_recommendations',
+    ),
+}
+MERGED_TOTALS = {
+    'audit_results': 'total_users',
+    'key_audit_results': 'total_users_checked',
+}
+# audit_results 内のロール・グループ監査（名前はアカウントIDで修飾、件数は合算）
+MERGED_PRINCIPAL_CATEGORIES = {
+    'role_audit': (
+        'unused_roles', 'roles_with_risky_trust', 'roles_with_wildcard_permissions',
+        'roles_with_excessive_permissions',
+    ),
+    'group_audit': (
+        'empty_groups', 'groups_with_wildcard_permissions', 'groups_with_excessive_permissions',
+    ),
+}
+MERGED_PRINCIPAL_TOTALS = {
+    'role_audit': 'total_roles',
+    'group_audit': 'total_groups',
+}
+# アカウントIDで修飾する検出結果の名前フィールド
+QUALIFIED_NAME_FIELDS = ('username', 'role_name', 'group_name')
+
+
+def qualified_username(account_id: str, username: str) -> str:
+    """アカウントをまたいで一意なユーザー名（<アカウントID>/<ユーザー名>）"""
+    return f"{account_id}/{username}"
+
+
+def _qualify(account_id: str, finding: Any) -> Any:
+    if isinstance(finding, str):
+        return qualified_username(account_id, finding)
+    qualified = dict(finding, account_id=account_id)
+    for field in QUALIFIED_NAME_FIELDS:
+        if field in finding:
+            qualified[field] = qualified_username(account_id, finding[field])
+    return qualified
+
+
+def _merge_principal_audit(merged: Dict[str, Any], section: str, account_id: str,
+                           section_result: Dict[str, Any]):
+    merged[MERGED_PRINCIPAL_TOTALS[section]] += section_result.get(MERGED_PRINCIPAL_TOTALS[section], 0)
+    for category in MERGED_PRINCIPAL_CATEGORIES[section]:
+        merged[category].extend(
+            _qualify(account_id, finding) for finding in section_result.get(category, [])
+        )
+    # 未解決ポリシーはARN自体がアカウントを含むため修飾せずに重複を除く
+    for policy_arn in section_result.get('unresolved_policies', []):
+        if policy_arn not in merged['unresolved_policies']:
+            merged['unresolved_policies'].append(policy_arn)
+
+
+def list_member_accounts(organizations_client) -> List[Dict[str, str]]:
+    """組織内の有効なアカウント一覧（ID順）"""
+    accounts = []
+    paginator = organizations_client.get_paginator('list_accounts')
+    for page in paginator.paginate():
+        for account in page['Accounts']:
+            if account['Status'] == 'ACTIVE':
+                accounts.append({'id': account['Id'], 'name': account['Name']})
+    return sorted(accounts, key=lambda account: account['id'])
+
+
+def assume_account_session(sts_client, role_arn: str, external_id: str = '') -> boto3.Session:
+    """監査ロールを引き受けた一時認証情報のセッション"""
+    params = {'RoleArn': role_arn, 'RoleSessionName': AUDIT_SESSION_NAME}
+    if external_id:
+        params['ExternalId'] = external_id
+    credentials = sts_client.assume_role(**params)['Credentials']
+    return boto3.Session(
+        aws_access_key_id=credentials['AccessKeyId'],
+        aws_secret_access_key=credentials['SecretAccessKey'],
+        aws_session_token=credentials['SessionToken'],
+    )
+
+
+class OrganizationAudit:
+    """メンバーアカウントへの監査のファンアウト"""
+
+    def __init__(self, sts_client, role_name: str, role_path: str = '/',
+                 external_id: str = '', max_accounts: int = 4,
+                 home_account_id: Optional[str] = None):
+        self.sts_client = sts_client
+        self.role_name = role_name
+        self.role_path = role_path
+        self.external_id = external_id
+        # 同時に監査するアカウント数（アカウント内の並列数は監査関数側で制御）
+        self.max_accounts = max_accounts
+        # 実行中のアカウントはロールを引き受けずにLambdaの認証情報で監査
+        self.home_account_id = home_account_id
+
+    def role_arn(self, account_id: str) -> str:
+        return f"arn:aws:iam::{account_id}:role{self.role_path}{self.role_name}"
+
+    def session_for(self, account_id: str) -> Optional[boto3.Session]:
+        """アカウントのセッション（実行中のアカウントはNone = デフォルトセッション）"""
+        if account_id == self.home_account_id:
+            return None
+        return assume_account_session(self.sts_client, self.role_arn(account_id), self.external_id)
+
+    def run(self, accounts: List[Dict[str, str]],
+            audit_account: Callable[[Dict[str, str], Optional[boto3.Session]], Dict[str, Any]]
+            ) -> Dict[str, Dict[str, Any]]:
+        """アカウントごとに監査を実行し {アカウントID: 結果} を返す（失敗したアカウントは error を含む）"""
+        def run_one(account: Dict[str, str]) -> Dict[str, Any]:
+            try:
+                return audit_account(account, self.session_for(account['id']))
+            except Exception as e:
+                logger.warning(f"アカウント監査失敗 {account['id']}: {str(e)}")
+                return {'error': str(e)}
+
+        results = bounded_map(run_one, accounts, self.max_accounts)
+        return {account['id']: result for account, result in zip(accounts, results)}
+
+
+def merge_account_results(accounts: List[Dict[str, str]],
+                          account_results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """アカウント別の監査結果を統合（ユーザー・ロール・グループ名はアカウントIDで修飾、件数は合算）
+
+    ロール・グループ監査に失敗したアカウントは、アカウント別の結果に principal_audit_errors として残す。
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for section, categories in MERGED_LIST_CATEGORIES.items():
+        merged[section] = {MERGED_TOTALS[section]: 0}
+        merged[section].update({category: [] for category in categories})
+    for section, categories in MERGED_PRINCIPAL_CATEGORIES.items():
+        merged['audit_results'][section] = {MERGED_PRINCIPAL_TOTALS[section]: 0, 'unresolved_policies': []}
+        merged['audit_results'][section].update({category: [] for category in categories})
+    risk_summary = {'finding_counts': {}, 'high_risk_users': []}
+    account_summaries = []
+
+    for account in accounts:
+        account_id = account['id']
+        result = account_results.get(account_id, {'error': 'not audited'})
+        summary = {'account_id': account_id, 'name': account['name']}
+        if 'error' in result:
+            summary['error'] = result['error']
+            account_summaries.append(summary)
+            continue
+
+        for section, categories in MERGED_LIST_CATEGORIES.items():
+            section_result = result[section]
+            merged[section][MERGED_TOTALS[section]] += section_result.get(MERGED_TOTALS[section], 0)
+            for category in categories:
+                merged[section][category].extend(
+                    _qualify(account_id, finding) for finding in section_result.get(category, [])
+                )
+
+        principal_audit_errors = {}
+        for section in MERGED_PRINCIPAL_CATEGORIES:
+            section_result = result['audit_results'].get(section) or {}
+            if 'error' in section_result:
+                principal_audit_errors[section] = section_result['error']
+                continue
+            _merge_principal_audit(merged['audit_results'][section], section, account_id, section_result)
+        if principal_audit_errors:
+            summary['principal_audit_errors'] = principal_audit_errors
+
+        account_risk = result.get('risk_summary') or {'finding_counts': {}, 'high_risk_users': []}
+        for check, count in account_risk['finding_counts'].items():
+            risk_summary['finding_counts'][check] = risk_summary['finding_counts'].get(check, 0) + count
+        risk_summary['high_risk_users'].extend(
+            qualified_username(account_id, username) for username in account_risk['high_risk_users']
+        )
+
+        summary['total_users'] = result['audit_results'].get('total_users', 0)
+        summary['finding_counts'] = account_risk['finding_counts']
+        summary['high_risk_users'] = len(account_risk['high_risk_users'])
+        account_summaries.append(summary)
+
+    return {
+        'audit_results': merged['audit_results'],
+        'key_audit_results': merged['key_audit_results'],
+        'risk_summary': risk_summary,
+        'accounts': account_summaries,
+        'failed_accounts': [summary['account_id'] for summary in account_summaries if 'error' in summary],
+    }
@@ -0,0 +1,120 @@
+"""
+ITSANDBOX 管理ポリシー文書キャッシュ
+管理ポリシーの文書を (PolicyArn, DefaultVersionId) をキーとしてキャッシュする。
+同じキーの文書は内容が変わらないため、warm invocation 間はモジュール内のメモリで、
+実行間は状態ストアで共有し、デフォルトバージョンが変わったポリシーだけを取得し直す。
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from .authorization_snapshot import decode_policy_document
+from .fingerprints import stable_hash
+
+logger = logging.getLogger(__name__)
+
+# (PolicyArn, VersionId) -> 文書。AWS管理ポリシーはアカウント間で共通のため組織監査でも共有される
+_documents: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_documents_lock = threading.Lock()
+
+# 状態ストアのキーの接頭辞
+DOCUMENT_KEY_PREFIX = 'policy-documents'
+
+
+def document_key(policy_arn: str, version_id: str) -> str:
+    return f"{DOCUMENT_KEY_PREFIX}/{stable_hash(policy_arn)[:32]}-{version_id}.json"
+
+
+class PolicyDocumentCache:
+    """管理ポリシーのデフォルトバージョン文書の解決（メモリ → 状態ストア → IAM）
+
+    デフォルトバージョンIDはインスタンス（= 1回の実行）ごとに get_policy で一度だけ確認する。
+    """
+
+    def __init__(self, iam_client, state_store=None):
+        self.iam_client = iam_client
+        self.state_store = state_store
+        # この実行で確認したデフォルトバージョン（取得できなかったポリシーはNone）
+        self._default_versions: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.store_hits = 0
+        self.fetches = 0
+
+    def resolve(self, policy_arn: str) -> Optional[Dict[str, Any]]:
+        """管理ポリシーのデフォルトバージョンの文書（取得できない場合はNone）"""
+        version_id = self._default_version(policy_arn)
+        if version_id is None:
+            return None
+        return self.document(policy_arn, version_id)
+
+    def document(self, policy_arn: str, version_id: str) -> Optional[Dict[str, Any]]:
+        key = (policy_arn, version_id)
+        with _documents_lock:
+            document = _documents.get(key)
+        if document is not None:
+            with self._lock:
+                self.hits += 1
+            return document
+
+        document = self._load(policy_arn, version_id)
+        if document is not None:
+            with self._lock:
+                self.store_hits += 1
+        else:
+            try:
+                response = self.iam_client.get_policy_version(PolicyArn=policy_arn, VersionId=version_id)
+                document = decode_policy_document(response['PolicyVersion']['Document'])
+            except Exception as e:
+                logger.warning(f"ポリシー文書を取得できません {policy_arn} ({version_id}): {str(e)}")
+                return None
+            with self._lock:
+                self.fetches += 1
+            self._save(policy_arn, version_id, document)
+
+        with _documents_lock:
+            _documents[key] = document
+        return document
+
+    def _default_version(self, policy_arn: str) -> Optional[str]:
+        with self._lock:
+            if policy_arn in self._default_versions:
+                return self._default_versions[policy_arn]
+        try:
+            version_id = self.iam_client.get_policy(PolicyArn=policy_arn)['Policy']['DefaultVersionId']
+        except Exception as e:
+            logger.warning(f"ポリシーのデフォルトバージョンを取得できません {policy_arn}: {str(e)}")
+            version_id = None
+        with self._lock:
+            self._default_versions[policy_arn] = version_id
+        return version_id
+
+    def _load(self, policy_arn: str, version_id: str) -> Optional[Dict[str, Any]]:
+        if self.state_store is None:
+            return None
+        try:
+            data = self.state_store.get_json(document_key(policy_arn, version_id))
+        except Exception as e:
+            logger.warning(f"保存済みのポリシー文書を読み込めません {policy_arn}: {str(e)}")
+            return None
+        # キーはARNのハッシュのため、念のためARNとバージョンを照合
+        if data and data.get('policy_arn') == policy_arn and data.get('version_id') == version_id:
+            return data['document']
+        return None
+
+    def _save(self, policy_arn: str, version_id: str, document: Dict[str, Any]):
+        if self.state_store is None:
+            return
+        try:
+            self.state_store.put_json(document_key(policy_arn, version_id), {
+                'policy_arn': policy_arn,
+                'version_id': version_id,
+                'document': document,
+            })
+        except Exception as e:
+            logger.warning(f"ポリシー文書を保存できません {policy_arn}: {str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'store_hits': self.store_hits, 'fetches': self.fetches}
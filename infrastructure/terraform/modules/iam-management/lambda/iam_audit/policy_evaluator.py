@@ -0,0 +1,452 @@
+"""
+ITSANDBOX ローカルIAMポリシー評価
+ポリシー文書をアクション・リソースのマッチャー（完全一致・前方一致・ワイルドカード）に
+コンパイルし、simulate_principal_policy を呼び出さずに実効権限を評価する。
+
+評価順序はIAMと同じ（明示的Deny > Allow > 暗黙的Deny、権限境界はAllowの上限）。
+条件キーは aws:username と aws:PrincipalTag/* のみ評価し、それ以外の条件は判定できないため
+Allow は「許可されうる」として扱い、Deny は適用しない（権限過多の検出側に倒す）。
+"""
+
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .fingerprints import stable_hash
+
+ALLOW = 'allow'
+DENY = 'deny'
+IMPLICIT_DENY = 'implicit_deny'
+
+# 権限過多とみなす操作（アクション, リソースARNの雛形）。{account} はユーザーのアカウントID
+# 他ユーザー・ロールを対象とした権限昇格につながる操作と、全権限の有無を確認する
+PRIVILEGED_ACTION_PROBES: Tuple[Tuple[str, str], ...] = (
+    ('itsandbox:FullAccessProbe', '*'),
+    ('iam:CreateUser', 'arn:aws:iam::{account}:user/itsandbox-audit-probe'),
+    ('iam:CreateAccessKey', 'arn:aws:iam::{account}:user/itsandbox-audit-probe'),
+    ('iam:AttachUserPolicy', 'arn:aws:iam::{account}:user/itsandbox-audit-probe'),
+    ('iam:PutUserPolicy', 'arn:aws:iam::{account}:user/itsandbox-audit-probe'),
+    ('iam:AddUserToGroup', 'arn:aws:iam::{account}:group/itsandbox-audit-probe'),
+    ('iam:CreatePolicyVersion', 'arn:aws:iam::{account}:policy/itsandbox-audit-probe'),
+    ('iam:DeleteUserPermissionsBoundary', 'arn:aws:iam::{account}:user/itsandbox-audit-probe'),
+    ('iam:PassRole', 'arn:aws:iam::{account}:role/itsandbox-audit-probe'),
+    ('iam:UpdateAssumeRolePolicy', 'arn:aws:iam::{account}:role/itsandbox-audit-probe'),
+    ('sts:AssumeRole', 'arn:aws:iam::{account}:role/itsandbox-audit-probe'),
+    ('organizations:LeaveOrganization', '*'),
+)
+
+# スナップショットに含まれないAWS管理ポリシーのうち、評価に必要なもの
+# （ポリシー文書キャッシュで実際の文書を取得できない場合の代替）
+BUILTIN_AWS_MANAGED_POLICIES: Dict[str, Dict[str, Any]] = {
+    'arn:aws:iam::aws:policy/AdministratorAccess': {
+        'Version': '2012-10-17',
+        'Statement': [{'Effect': 'Allow', 'Action': '*', 'Resource': '*'}],
+    },
+    'arn:aws:iam::aws:policy/PowerUserAccess': {
+        'Version': '2012-10-17',
+        'Statement': [
+            {'Effect': 'Allow', 'NotAction': ['iam:*', 'organizations:*', 'account:*'], 'Resource': '*'},
+            {
+                'Effect': 'Allow',
+                'Action': [
+                    'iam:CreateServiceLinkedRole',
+                    'iam:DeleteServiceLinkedRole',
+                    'iam:ListRoles',
+                    'organizations:DescribeOrganization',
+                    'account:ListRegions',
+                    'account:GetAccountInformation',
+                ],
+                'Resource': '*',
+            },
+        ],
+    },
+}
+
+_VARIABLE_PATTERN = re.compile(r'\$\{([^}]+)\}')
+
+_STRING_OPERATORS = {
+    'StringEquals': (False, False),
+    'StringNotEquals': (False, True),
+    'StringEqualsIgnoreCase': (False, False),
+    'StringNotEqualsIgnoreCase': (False, True),
+    'StringLike': (True, False),
+    'StringNotLike': (True, True),
+    'ArnEquals': (False, False),
+    'ArnNotEquals': (False, True),
+    'ArnLike': (True, False),
+    'ArnNotLike': (True, True),
+}
+
+# 評価できる条件キー
+_SUPPORTED_CONDITION_KEYS = ('aws:username', 'aws:principaltag/')
+
+
+def wildcard_regex(pattern: str) -> str:
+    """IAMのワイルドカード（* と ? のみ）を正規表現に変換（[ ] 等はそのままの文字として扱う）"""
+    return re.escape(pattern).replace(r'\*', '.*').replace(r'\?', '.') + r'\Z'
+
+
+def wildcard_match(value: str, pattern: str) -> bool:
+    return re.match(wildcard_regex(pattern), value, re.DOTALL) is not None
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+class PatternSet:
+    """ワイルドカードパターン集合のマッチャー
+
+    完全一致は集合、末尾のみ * のパターンは前方一致のタプル、
+    それ以外は1つの正規表現にまとめ、ポリシー変数を含むパターンのみ評価時に展開する。
+    """
+
+    def __init__(self, patterns: Iterable[str], case_sensitive: bool = True):
+        self.case_sensitive = case_sensitive
+        self.match_all = False
+        exact = set()
+        prefixes = []
+        wildcards = []
+        self.variable_patterns: List[str] = []
+
+        for pattern in patterns:
+            if not case_sensitive:
+                pattern = pattern.lower()
+            if pattern == '*':
+                self.match_all = True
+            elif '${' in pattern:
+                self.variable_patterns.append(pattern)
+            elif '*' not in pattern and '?' not in pattern:
+                exact.add(pattern)
+            elif pattern.endswith('*') and '*' not in pattern[:-1] and '?' not in pattern:
+                prefixes.append(pattern[:-1])
+            else:
+                wildcards.append(wildcard_regex(pattern))
+
+        self.exact = frozenset(exact)
+        self.prefixes = tuple(prefixes)
+        self.regex = re.compile('|'.join(wildcards), re.DOTALL) if wildcards else None
+
+    def matches(self, value: str, context: Optional[Dict[str, str]] = None) -> bool:
+        if self.match_all:
+            return True
+        if not self.case_sensitive:
+            value = value.lower()
+        if value in self.exact:
+            return True
+        if self.prefixes and value.startswith(self.prefixes):
+            return True
+        if self.regex is not None and self.regex.match(value):
+            return True
+        for pattern in self.variable_patterns:
+            expanded = _expand_variables(pattern, context or {})
+            if expanded is not None and wildcard_match(value, expanded):
+                return True
+        return False
+
+
+def _expand_variables(pattern: str, context: Dict[str, str]) -> Optional[str]:
+    """ポリシー変数を展開（コンテキストにない変数を含む場合はNone）"""
+    missing = False
+
+    def replace(match):
+        nonlocal missing
+        key = match.group(1).lower()
+        if key not in context:
+            missing = True
+            return ''
+        return context[key]
+
+    expanded = _VARIABLE_PATTERN.sub(replace, pattern)
+    return None if missing else expanded
+
+
+class CompiledStatement:
+    """コンパイル済みのポリシーステートメント"""
+
+    def __init__(self, statement: Dict[str, Any]):
+        self.effect = ALLOW if statement.get('Effect') == 'Allow' else DENY
+        self.not_action = 'NotAction' in statement
+        self.actions = PatternSet(
+            _as_list(statement.get('NotAction' if self.not_action else 'Action')),
+            case_sensitive=False
+        )
+        self.not_resource = 'NotResource' in statement
+        self.resources = PatternSet(
+            _as_list(statement.get('NotResource' if self.not_resource else 'Resource'))
+        )
+        self.conditions = statement.get('Condition') or {}
+        # 判定結果が依存するコンテキストキー（ポリシーセット単位のメモ化に使用）
+        self.context_keys = frozenset(
+            [key.lower() for clauses in self.conditions.values() for key in clauses]
+            + [
+                name.lower()
+                for patterns in (self.actions.variable_patterns, self.resources.variable_patterns)
+                for pattern in patterns
+                for name in _VARIABLE_PATTERN.findall(pattern)
+            ]
+        )
+
+    def applies(self, action: str, resource: str, context: Dict[str, str]) -> Optional[bool]:
+        """ステートメントが適用されるか（条件を判定できない場合はNone）"""
+        if self.actions.matches(action, context) == self.not_action:
+            return False
+        if self.resources.matches(resource, context) == self.not_resource:
+            return False
+        return _evaluate_conditions(self.conditions, context)
+
+
+def _evaluate_conditions(conditions: Dict[str, Any], context: Dict[str, str]) -> Optional[bool]:
+    result: Optional[bool] = True
+    for operator, clauses in conditions.items():
+        base = operator[:-len('IfExists')] if operator.endswith('IfExists') else operator
+        if base not in _STRING_OPERATORS:
+            result = None
+            continue
+        like, negated = _STRING_OPERATORS[base]
+        ignore_case = base.endswith('IgnoreCase')
+        for key, expected in clauses.items():
+            key = key.lower()
+            if not key.startswith(_SUPPORTED_CONDITION_KEYS):
+                result = None
+                continue
+            actual = context.get(key)
+            if actual is None:
+                # 値がない場合: IfExists は一致扱い、否定演算子は一致、それ以外は不一致
+                if operator.endswith('IfExists') or negated:
+                    continue
+                return False
+            values = _as_list(expected)
+            if ignore_case:
+                actual, values = actual.lower(), [value.lower() for value in values]
+            matched = any(
+                wildcard_match(actual, value) if like else actual == value
+                for value in values
+            )
+            if matched == negated:
+                return False
+    return result
+
+
+class CompiledPolicy:
+    """コンパイル済みのポリシー文書"""
+
+    def __init__(self, document: Dict[str, Any]):
+        statements = document.get('Statement', [])
+        if isinstance(statements, dict):
+            statements = [statements]
+        self.statements = [CompiledStatement(statement) for statement in statements]
+        self.context_keys = frozenset().union(*(statement.context_keys for statement in self.statements))
+
+    def decide(self, action: str, resource: str, context: Dict[str, str]) -> Optional[str]:
+        """このポリシー単体での判定（該当なしはNone）"""
+        decision = None
+        for statement in self.statements:
+            applies = statement.applies(action, resource, context)
+            if statement.effect == DENY:
+                # 条件を判定できない Deny は適用しない
+                if applies:
+                    return DENY
+            elif applies is not False:
+                decision = ALLOW
+        return decision
+
+
+class PolicySet:
+    """ユーザーに適用されるポリシーの組み合わせ（グループ・アタッチ・インライン・権限境界）"""
+
+    def __init__(self, key: str, policies: List[CompiledPolicy],
+                 boundary: Optional[CompiledPolicy], unresolved: List[str], documents_hash: str):
+        self.key = key
+        # 解決済みの文書内容のハッシュ（実行をまたいだ変更検出に使用）
+        self.documents_hash = documents_hash
+        self.policies = policies
+        self.boundary = boundary
+        self.unresolved = unresolved
+        self.context_keys = frozenset().union(
+            *(policy.context_keys for policy in policies + ([boundary] if boundary else []))
+        )
+
+
+class PolicyEvaluator:
+    """ポリシー文書のコンパイル結果を共有して実効権限を評価
+
+    同じポリシーセット（所属グループ・アタッチポリシー・インラインポリシー・権限境界）の
+    ユーザーは、判定に使用するコンテキスト値も同じであれば評価結果を共有する。
+    """
+
+    def __init__(self, policy_documents=None):
+        # スナップショットに含まれない管理ポリシー（AWS管理ポリシー）の文書キャッシュ
+        self.policy_documents = policy_documents
+        self._compiled: Dict[str, CompiledPolicy] = {}
+        self._policy_sets: Dict[str, PolicySet] = {}
+        self._results: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[str]] = {}
+        self._lock = threading.Lock()
+        self.evaluations = 0
+        self.reused = 0
+
+    def compile(self, document: Dict[str, Any]) -> CompiledPolicy:
+        """同じ内容の文書は一度だけコンパイル"""
+        key = stable_hash(document)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = CompiledPolicy(document)
+            self._compiled[key] = compiled
+        return compiled
+
+    def evaluate(self, identity_policies: Sequence[CompiledPolicy],
+                 boundary: Optional[CompiledPolicy],
+                 action: str, resource: str, context: Dict[str, str]) -> str:
+        """アイデンティティベースポリシーと権限境界から実効判定を返す"""
+        allowed = False
+        for policy in identity_policies:
+            decision = policy.decide(action, resource, context)
+            if decision == DENY:
+                return DENY
+            allowed = allowed or decision == ALLOW
+
+        if boundary is not None:
+            boundary_decision = boundary.decide(action, resource, context)
+            if boundary_decision == DENY:
+                return DENY
+            if boundary_decision != ALLOW:
+                return IMPLICIT_DENY
+
+        return ALLOW if allowed else IMPLICIT_DENY
+
+    def policy_set(self, snapshot, authorization: Dict[str, Any]) -> PolicySet:
+        """ユーザー・ロール・グループのポリシーセット（同じ構成のプリンシパル間で共有）"""
+        key = stable_hash({
+            'account': authorization['arn'].split(':')[4],
+            'groups': sorted(authorization.get('groups', [])),
+            'attached': sorted(authorization['attached_policies']),
+            'inline': authorization['inline_policies'],
+            'boundary': authorization.get('permissions_boundary'),
+        })
+        with self._lock:
+            policy_set = self._policy_sets.get(key)
+        if policy_set is None:
+            documents, boundary, unresolved = user_policy_documents(
+                snapshot, authorization, self.policy_documents
+            )
+            policy_set = PolicySet(
+                key,
+                [self.compile(document) for document in documents],
+                self.compile(boundary) if boundary else None,
+                unresolved,
+                stable_hash({'documents': documents, 'boundary': boundary, 'unresolved': unresolved})
+            )
+            with self._lock:
+                self._policy_sets[key] = policy_set
+        return policy_set
+
+    def user_privileged_permissions(self, snapshot, username: str,
+                                    authorization: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+        """ユーザーの権限昇格・全権限の操作と、解決できなかったポリシーARN
+
+        評価はポリシーセットと、そのセットの条件・ポリシー変数が参照するコンテキスト値の
+        組み合わせごとに一度だけ行う。
+        """
+        return self.principal_privileged_permissions(
+            snapshot, authorization, principal_context(username, authorization['tags'])
+        )
+
+    def principal_privileged_permissions(self, snapshot, authorization: Dict[str, Any],
+                                         context: Dict[str, str]) -> Tuple[List[str], List[str]]:
+        """任意のプリンシパル（ユーザー・ロール・グループ）の権限昇格・全権限の操作と、解決できなかったポリシーARN"""
+        policy_set = self.policy_set(snapshot, authorization)
+        relevant_context = tuple(sorted(
+            (key, context[key]) for key in policy_set.context_keys if key in context
+        ))
+        result_key = (policy_set.key, relevant_context)
+
+        with self._lock:
+            granted = self._results.get(result_key)
+            if granted is not None:
+                self.reused += 1
+        if granted is None:
+            granted = self.privileged_permissions(
+                policy_set.policies, policy_set.boundary,
+                authorization['arn'].split(':')[4], context
+            )
+            with self._lock:
+                self._results[result_key] = granted
+                self.evaluations += 1
+        return granted, policy_set.unresolved
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'policy_sets': len(self._policy_sets),
+                'compiled_documents': len(self._compiled),
+                'evaluations': self.evaluations,
+                'reused': self.reused,
+            }
+        if self.policy_documents is not None:
+            stats['policy_documents'] = self.policy_documents.stats()
+        return stats
+
+    def privileged_permissions(self, identity_policies: Sequence[CompiledPolicy],
+                               boundary: Optional[CompiledPolicy],
+                               account_id: str, context: Dict[str, str]) -> List[str]:
+        """PRIVILEGED_ACTION_PROBES のうち実効的に許可される操作"""
+        return [
+            action
+            for action, resource in PRIVILEGED_ACTION_PROBES
+            if self.evaluate(identity_policies, boundary, action,
+                             resource.format(account=account_id), context) == ALLOW
+        ]
+
+
+def user_policy_documents(snapshot, authorization: Dict[str, Any],
+                          policy_documents=None) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]], List[str]]:
+    """ユーザーの実効ポリシー文書（所属グループ分を含む）と権限境界の文書
+
+    戻り値の3番目は文書を解決できなかったポリシーARN（評価対象外）。
+    """
+    documents = list(authorization['inline_policies'].values())
+    attached = list(authorization['attached_policies'])
+    for group_name in authorization.get('groups', []):
+        group = snapshot.group(group_name)
+        if group:
+            documents.extend(group['inline_policies'].values())
+            attached.extend(group['attached_policies'])
+
+    unresolved = []
+    for policy_arn in dict.fromkeys(attached):
+        document = resolve_managed_policy(snapshot, policy_arn, policy_documents)
+        if document is None:
+            unresolved.append(policy_arn)
+        else:
+            documents.append(document)
+
+    boundary = None
+    boundary_arn = authorization.get('permissions_boundary')
+    if boundary_arn:
+        boundary = resolve_managed_policy(snapshot, boundary_arn, policy_documents)
+        if boundary is None:
+            unresolved.append(boundary_arn)
+
+    return documents, boundary, unresolved
+
+
+def resolve_managed_policy(snapshot, policy_arn: str, policy_documents=None) -> Optional[Dict[str, Any]]:
+    """スナップショット → ポリシー文書キャッシュ → 組み込みの代替文書の順に解決"""
+    policy = snapshot.policy(policy_arn)
+    if policy is not None:
+        return policy['document']
+    if policy_documents is not None:
+        document = policy_documents.resolve(policy_arn)
+        if document is not None:
+            return document
+    return BUILTIN_AWS_MANAGED_POLICIES.get(policy_arn)
+
+
+def principal_context(username: str, tags: Dict[str, str]) -> Dict[str, str]:
+    """条件・ポリシー変数の評価に使用するコンテキスト（キーは小文字）"""
+    context = {'aws:username': username}
+    for key, value in tags.items():
+        context[f'aws:principaltag/{key.lower()}'] = value
+    return context
@@ -0,0 +1,173 @@
+"""
+ITSANDBOX ロール・グループ監査
+ユーザー監査と同じ認可情報スナップショット（RoleLastUsed・信頼ポリシーを含む）だけを使い、
+ロールの未使用・信頼ポリシーの不備、ロール・グループのワイルドカード権限と権限過多を検出する。
+エンティティごとの追加API呼び出しは行わない。
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .policy_evaluator import PolicyEvaluator, user_policy_documents
+
+# 削除されたプリンシパルは信頼ポリシー上で一意ID（AROA.../AIDA...）に置き換わる
+STALE_PRINCIPAL_PREFIXES = ('AROA', 'AIDA', 'AGPA')
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _condition_keys(statement: Dict[str, Any]) -> List[str]:
+    return [
+        key.lower()
+        for operator_values in (statement.get('Condition') or {}).values()
+        for key in operator_values
+    ]
+
+
+def trust_policy_findings(assume_role_policy: Dict[str, Any], account_id: str) -> List[str]:
+    """信頼ポリシーの不備（誰でも引き受け可能・削除済みプリンシパル・外部IDなしの外部アカウント）"""
+    findings = []
+    for statement in _as_list(assume_role_policy.get('Statement')):
+        if statement.get('Effect') != 'Allow':
+            continue
+        principal = statement.get('Principal')
+        if principal == '*':
+            principals = ['*']
+        else:
+            principals = _as_list((principal or {}).get('AWS'))
+        condition_keys = _condition_keys(statement)
+
+        for value in principals:
+            if value == '*':
+                if not condition_keys:
+                    findings.append("Trust policy allows any principal ('*') without conditions")
+            elif value.startswith(STALE_PRINCIPAL_PREFIXES):
+                findings.append(f"Trust policy references a deleted principal ({value})")
+            elif value.startswith('arn:aws:iam::') or value.isdigit():
+                trusted_account = value.split(':')[4] if value.startswith('arn:') else value
+                if trusted_account != account_id and 'sts:externalid' not in condition_keys:
+                    findings.append(
+                        f"Trust policy allows external account {trusted_account} without sts:ExternalId"
+                    )
+    return findings
+
+
+def role_context(tags: Dict[str, str]) -> Dict[str, str]:
+    """ロールの条件評価用コンテキスト（ロールのセッションに aws:username は存在しない）"""
+    return {f'aws:principaltag/{key.lower()}': value for key, value in tags.items()}
+
+
+def wildcard_statements(documents: List[Dict[str, Any]]) -> List[str]:
+    """全リソースに対してサービス全体（* / service:*）を許可するステートメントの操作"""
+    wildcards = []
+    for document in documents:
+        for statement in _as_list(document.get('Statement')):
+            if statement.get('Effect') != 'Allow' or '*' not in _as_list(statement.get('Resource')):
+                continue
+            for action in _as_list(statement.get('Action')):
+                if action == '*' or action.endswith(':*'):
+                    wildcards.append(action)
+            if 'NotAction' in statement:
+                wildcards.append('NotAction:' + ','.join(_as_list(statement['NotAction'])))
+    return sorted(set(wildcards))
+
+
+class PrincipalAudit:
+    """スナップショット上のロール・グループの監査"""
+
+    def __init__(self, snapshot, policy_evaluator: PolicyEvaluator,
+                 path_prefix: str = '/itsandbox/'):
+        self.snapshot = snapshot
+        self.policy_evaluator = policy_evaluator
+        self.path_prefix = path_prefix
+
+    def audit_roles(self, unused_threshold: datetime) -> Dict[str, Any]:
+        """ロール監査（未使用・信頼ポリシー・ワイルドカード権限・権限過多）"""
+        results = {
+            'total_roles': 0,
+            'unused_roles': [],
+            'roles_with_risky_trust': [],
+            'roles_with_wildcard_permissions': [],
+            'roles_with_excessive_permissions': [],
+            'unresolved_policies': [],
+        }
+        for role_name, role in sorted(self.snapshot.roles.items()):
+            if not role['path'].startswith(self.path_prefix):
+                continue
+            results['total_roles'] += 1
+            account_id = role['arn'].split(':')[4]
+
+            # 一度も使われていないロールは作成日時で判定（作成直後のロールは対象外）
+            last_used = self._role_last_used(role)
+            last_activity = last_used or (
+                role['create_date'].replace(tzinfo=None) if role['create_date'] else None
+            )
+            if last_activity is not None and last_activity < unused_threshold:
+                results['unused_roles'].append({
+                    'role_name': role_name,
+                    'last_used': last_used.isoformat() if last_used else None,
+                    'last_used_region': role['role_last_used'].get('Region'),
+                })
+
+            trust_findings = trust_policy_findings(role['assume_role_policy'], account_id)
+            if trust_findings:
+                results['roles_with_risky_trust'].append({'role_name': role_name, 'findings': trust_findings})
+
+            self._check_permissions(
+                results, 'roles_with_wildcard_permissions', 'roles_with_excessive_permissions',
+                'role_name', role_name, role, role_context(role['tags'])
+            )
+        return results
+
+    def audit_groups(self) -> Dict[str, Any]:
+        """グループ監査（メンバーなし・ワイルドカード権限・権限過多）"""
+        members: Dict[str, int] = {}
+        for user in self.snapshot.users.values():
+            for group_name in user['groups']:
+                members[group_name] = members.get(group_name, 0) + 1
+
+        results = {
+            'total_groups': 0,
+            'empty_groups': [],
+            'groups_with_wildcard_permissions': [],
+            'groups_with_excessive_permissions': [],
+            'unresolved_policies': [],
+        }
+        for group_name, group in sorted(self.snapshot.groups.items()):
+            if not group['path'].startswith(self.path_prefix):
+                continue
+            results['total_groups'] += 1
+            if not members.get(group_name):
+                results['empty_groups'].append(group_name)
+            self._check_permissions(
+                results, 'groups_with_wildcard_permissions', 'groups_with_excessive_permissions',
+                'group_name', group_name, group, {}
+            )
+        return results
+
+    def _check_permissions(self, results: Dict[str, Any], wildcard_category: str,
+                           excessive_category: str, name_field: str, name: str,
+                           principal: Dict[str, Any], context: Dict[str, str]):
+        documents, _, _ = user_policy_documents(
+            self.snapshot, principal, self.policy_evaluator.policy_documents
+        )
+        wildcards = wildcard_statements(documents)
+        if wildcards:
+            results[wildcard_category].append({name_field: name, 'actions': wildcards})
+
+        granted, unresolved = self.policy_evaluator.principal_privileged_permissions(
+            self.snapshot, principal, context
+        )
+        if granted:
+            results[excessive_category].append({name_field: name, 'permissions': granted})
+        for policy_arn in unresolved:
+            if policy_arn not in results['unresolved_policies']:
+                results['unresolved_policies'].append(policy_arn)
+
+    def _role_last_used(self, role: Dict[str, Any]) -> Optional[datetime]:
+        last_used = role['role_last_used'].get('LastUsedDate')
+        return last_used.replace(tzinfo=None) if last_used else None
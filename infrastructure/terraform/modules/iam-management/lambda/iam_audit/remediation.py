@@ -0,0 +1,203 @@
+"""
+ITSANDBOX 不要アイデンティティの自動修復
+監査結果（未使用ユーザー・未使用アクセスキー）から修復計画を作成し、
+許可リスト・除外タグを適用したうえで、上限付きの並列数と送信レートで実行する。
+ユーザーの無効化は計画時に監査データで最終アクティビティが閾値より前であることを確認し、
+各操作の直前にもIAMから最新の最終使用日時を取得して、監査後に利用されたものは対象外にする。
+ユーザーの無効化はオンボーディングLambdaの deactivate_user と同じ手順
+（アクセスキーの無効化・ログインプロファイルの削除・無効化タグの付与）で行う。
+"""
+
+import fnmatch
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from itsandbox_common import TokenBucket, bounded_map
+
+logger = logging.getLogger(__name__)
+
+DEACTIVATE_USER = 'deactivate_user'
+DEACTIVATE_ACCESS_KEY = 'deactivate_access_key'
+
+# このタグ（値 true）を付けたユーザーは修復しない
+EXEMPT_TAG = 'RemediationExempt'
+
+DEACTIVATED_STATUS = 'Deactivated'
+
+
+def is_allow_listed(username: str, allow_list: Iterable[str]) -> bool:
+    """許可リスト（ユーザー名またはワイルドカードパターン）に一致するか"""
+    return any(fnmatch.fnmatchcase(username, pattern) for pattern in allow_list)
+
+
+def plan_remediation(audit_results: Dict[str, Any], key_audit_results: Dict[str, Any],
+                     user_tags: Dict[str, Dict[str, str]],
+                     last_activity: Dict[str, Optional[datetime]],
+                     unused_threshold: datetime,
+                     allow_list: Iterable[str] = ()) -> Dict[str, List[Dict[str, Any]]]:
+    """修復計画（実行する操作と、対象外にしたユーザー・キーと理由）
+
+    未使用ユーザーはユーザーごと無効化し、その他のユーザーの未使用アクセスキーは
+    キー単位で無効化する。ユーザーの無効化は last_activity（作成・ログイン・キー使用の
+    最新日時）が unused_threshold より前であることを確認できた場合だけ行う。
+    """
+    allow_list = list(allow_list)
+    actions: List[Dict[str, Any]] = []
+    skipped: List[Dict[str, Any]] = []
+
+    def skip_reason(username: str) -> Optional[str]:
+        tags = user_tags.get(username, {})
+        if is_allow_listed(username, allow_list):
+            return 'allow_listed'
+        if tags.get(EXEMPT_TAG, '').lower() == 'true':
+            return 'exempt_tag'
+        if tags.get('Status') == DEACTIVATED_STATUS:
+            return 'already_deactivated'
+        return None
+
+    deactivated_users = set()
+    for finding in audit_results.get('unused_users', []):
+        username = finding['username']
+        reason = skip_reason(username)
+        if reason:
+            skipped.append({'username': username, 'action': DEACTIVATE_USER, 'reason': reason})
+            continue
+        latest = last_activity.get(username)
+        if latest is None:
+            skipped.append({'username': username, 'action': DEACTIVATE_USER, 'reason': 'activity_unknown'})
+            continue
+        if latest >= unused_threshold:
+            skipped.append({'username': username, 'action': DEACTIVATE_USER, 'reason': 'recent_activity'})
+            continue
+        deactivated_users.add(username)
+        actions.append({
+            'action': DEACTIVATE_USER,
+            'username': username,
+            'reason': f"Unused since {latest.isoformat()}",
+        })
+
+    for finding in key_audit_results.get('users_with_unused_keys', []):
+        username = finding['username']
+        # ユーザーごと無効化する場合はキーもまとめて無効化される
+        if username in deactivated_users:
+            continue
+        reason = skip_reason(username)
+        if reason is None and finding['access_key_id'].startswith('slot-'):
+            # 認証情報レポートのキースロットをキーIDに照合できなかった
+            reason = 'unresolved_access_key'
+        if reason:
+            skipped.append({
+                'username': username, 'action': DEACTIVATE_ACCESS_KEY,
+                'access_key_id': finding['access_key_id'], 'reason': reason,
+            })
+            continue
+        actions.append({
+            'action': DEACTIVATE_ACCESS_KEY,
+            'username': username,
+            'access_key_id': finding['access_key_id'],
+            'reason': f"Unused for {finding['unused_days']} days",
+        })
+
+    return {'actions': actions, 'skipped': skipped}
+
+
+class RemediationRunner:
+    """修復操作の実行（dry_run では変更系のAPIを呼び出さない）"""
+
+    def __init__(self, iam_client, rate_limiter: Optional[TokenBucket] = None,
+                 max_workers: int = 4, dry_run: bool = True,
+                 user_threshold: Optional[datetime] = None,
+                 access_key_threshold: Optional[datetime] = None):
+        self.iam_client = iam_client
+        # 変更系の呼び出しだけに掛ける送信レート（IAM全体のレート制限とは別）
+        self.rate_limiter = rate_limiter
+        self.max_workers = max_workers
+        self.dry_run = dry_run
+        # この日時以降に利用されていれば操作しない（None の場合は再確認しない）
+        self.user_threshold = user_threshold
+        self.access_key_threshold = access_key_threshold
+
+    def run(self, actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """操作を並列に実行し、入力と同じ順序で結果を返す（失敗した操作は error を含む）"""
+        return bounded_map(self._run_one, actions, self.max_workers)
+
+    def _run_one(self, action: Dict[str, Any]) -> Dict[str, Any]:
+        """1操作を実行（直前の最終使用日時が閾値以降なら実行せず skipped を付けて返す）"""
+        try:
+            # 監査に使った認証情報レポートは最大4時間前の内容のため、操作の直前に最新の値を確認
+            if action['action'] == DEACTIVATE_USER:
+                threshold = self.user_threshold
+                last_activity = self._user_last_activity(action['username']) if threshold else None
+            else:
+                threshold = self.access_key_threshold
+                last_activity = self._access_key_last_used(action['access_key_id']) if threshold else None
+            if last_activity and last_activity >= threshold:
+                return dict(action, skipped='recent_activity', last_activity=last_activity.isoformat())
+
+            if action['action'] == DEACTIVATE_USER:
+                changes = self._deactivate_user(action['username'], action['reason'])
+            else:
+                changes = self._deactivate_access_key(action['username'], action['access_key_id'])
+            return dict(action, changes=changes)
+        except Exception as e:
+            logger.warning(f"修復失敗 {action['username']}: {str(e)}")
+            return dict(action, error=str(e))
+
+    def _access_key_last_used(self, access_key_id: str) -> Optional[datetime]:
+        response = self.iam_client.get_access_key_last_used(AccessKeyId=access_key_id)
+        last_used = response.get('AccessKeyLastUsed', {}).get('LastUsedDate')
+        return last_used.replace(tzinfo=None) if last_used else None
+
+    def _user_last_activity(self, username: str) -> Optional[datetime]:
+        """作成・パスワード使用・アクセスキー使用のうち最新の日時（IAMから直接取得）"""
+        user = self.iam_client.get_user(UserName=username)['User']
+        timestamps = [user['CreateDate'].replace(tzinfo=None)]
+        if user.get('PasswordLastUsed'):
+            timestamps.append(user['PasswordLastUsed'].replace(tzinfo=None))
+        for key in self.iam_client.list_access_keys(UserName=username)['AccessKeyMetadata']:
+            last_used = self._access_key_last_used(key['AccessKeyId'])
+            if last_used:
+                timestamps.append(last_used)
+        return max(timestamps)
+
+    def _mutate(self, operation: str, **params):
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        getattr(self.iam_client, operation)(**params)
+
+    def _deactivate_user(self, username: str, reason: str) -> List[str]:
+        changes = []
+        keys = self.iam_client.list_access_keys(UserName=username)['AccessKeyMetadata']
+        for key in keys:
+            if key['Status'] == 'Active':
+                changes.append(f"deactivate_access_key:{key['AccessKeyId']}")
+                if not self.dry_run:
+                    self._mutate('update_access_key', UserName=username,
+                                 AccessKeyId=key['AccessKeyId'], Status='Inactive')
+
+        try:
+            self.iam_client.get_login_profile(UserName=username)
+            changes.append('delete_login_profile')
+            if not self.dry_run:
+                try:
+                    self._mutate('delete_login_profile', UserName=username)
+                except self.iam_client.exceptions.NoSuchEntityException:
+                    pass
+        except self.iam_client.exceptions.NoSuchEntityException:
+            pass
+
+        changes.append('tag_user')
+        if not self.dry_run:
+            self._mutate('tag_user', UserName=username, Tags=[
+                {'Key': 'Status', 'Value': DEACTIVATED_STATUS},
+                {'Key': 'DeactivatedDate', 'Value': datetime.utcnow().isoformat()},
+                {'Key': 'DeactivationReason', 'Value': reason},
+            ])
+        return changes
+
+    def _deactivate_access_key(self, username: str, access_key_id: str) -> List[str]:
+        if not self.dry_run:
+            self._mutate('update_access_key', UserName=username,
+                         AccessKeyId=access_key_id, Status='Inactive')
+        return [f"deactivate_access_key:{access_key_id}"]
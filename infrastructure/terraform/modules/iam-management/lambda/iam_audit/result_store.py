@@ -0,0 +1,167 @@
+"""
+ITSANDBOX 監査結果ストア（ビットセット）
+ユーザー名を整数IDに変換し、チェックごとに1つのビットセット（Pythonの整数）で
+該当ユーザーを保持する。複合条件はビット演算で評価し、履歴保存用にコンパクトに直列化する。
+"""
+
+import base64
+from typing import Any, Dict, Iterable, List, Optional
+
+STORE_FORMAT_VERSION = 1
+
+# 監査結果のカテゴリとチェック名の対応
+USER_AUDIT_CHECKS = {
+    'unused_users': 'unused',
+    'users_without_mfa': 'no_mfa',
+    'users_with_old_passwords': 'old_password',
+    'users_with_excessive_permissions': 'excessive_permissions',
+    'compliance_violations': 'compliance_violation',
+}
+KEY_AUDIT_CHECKS = {
+    'users_with_old_keys': 'old_access_key',
+    'users_with_unused_keys': 'unused_access_key',
+    'users_with_multiple_keys': 'multiple_access_keys',
+}
+SERVICE_USAGE_CHECKS = {
+    'users_with_unused_services': 'unused_services',
+}
+
+# 全監査対象ユーザーを表すチェック（none_of 条件の母集団）
+AUDITED = 'audited'
+
+
+def encode_bitset(bitset: int) -> str:
+    """ビットセットをリトルエンディアンのbase64文字列に変換"""
+    return base64.b64encode(bitset.to_bytes((bitset.bit_length() + 7) // 8, 'little')).decode('ascii')
+
+
+def decode_bitset(encoded: str) -> int:
+    return int.from_bytes(base64.b64decode(encoded), 'little')
+
+
+def finding_username(finding: Any) -> str:
+    return finding if isinstance(finding, str) else finding['username']
+
+
+class AuditResultStore:
+    """チェック別ビットセットによる監査結果"""
+
+    def __init__(self):
+        self.usernames: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self.bitsets: Dict[str, int] = {}
+
+    def intern(self, username: str) -> int:
+        """ユーザー名の整数ID（初出時に採番）"""
+        user_id = self._ids.get(username)
+        if user_id is None:
+            user_id = len(self.usernames)
+            self.usernames.append(username)
+            self._ids[username] = user_id
+        return user_id
+
+    def user_id(self, username: str) -> Optional[int]:
+        return self._ids.get(username)
+
+    def mark(self, check: str, username: str):
+        self.bitsets[check] = self.bitsets.get(check, 0) | (1 << self.intern(username))
+
+    def has(self, check: str, username: str) -> bool:
+        user_id = self._ids.get(username)
+        return user_id is not None and bool(self.bitsets.get(check, 0) >> user_id & 1)
+
+    def count(self, check: str) -> int:
+        return self.bitsets.get(check, 0).bit_count()
+
+    def counts(self) -> Dict[str, int]:
+        return {check: bitset.bit_count() for check, bitset in sorted(self.bitsets.items())}
+
+    def checks_for(self, username: str) -> List[str]:
+        """ユーザーが該当するチェックの一覧"""
+        return [check for check in sorted(self.bitsets) if check != AUDITED and self.has(check, username)]
+
+    def select(self, all_of: Iterable[str] = (), any_of: Iterable[str] = (),
+               none_of: Iterable[str] = ()) -> int:
+        """条件に一致するユーザーのビットセット（AND: all_of, OR: any_of, NOT: none_of）"""
+        universe = self.bitsets.get(AUDITED, (1 << len(self.usernames)) - 1)
+        result = universe
+        for check in all_of:
+            result &= self.bitsets.get(check, 0)
+        any_of = list(any_of)
+        if any_of:
+            union = 0
+            for check in any_of:
+                union |= self.bitsets.get(check, 0)
+            result &= union
+        for check in none_of:
+            result &= ~self.bitsets.get(check, 0)
+        return result
+
+    def query(self, all_of: Iterable[str] = (), any_of: Iterable[str] = (),
+              none_of: Iterable[str] = ()) -> List[str]:
+        """条件に一致するユーザー名（ID順）"""
+        return self.usernames_in(self.select(all_of, any_of, none_of))
+
+    def usernames_in(self, bitset: int) -> List[str]:
+        usernames = []
+        while bitset:
+            lowest = bitset & -bitset
+            usernames.append(self.usernames[lowest.bit_length() - 1])
+            bitset ^= lowest
+        return usernames
+
+    def rebuild(self, usernames: Iterable[str]) -> 'AuditResultStore':
+        """usernames だけでIDを採番し直したストア（含まれないユーザーのビットと名前は除く）"""
+        store = AuditResultStore()
+        for username in usernames:
+            store.mark(AUDITED, username)
+        for check, bitset in self.bitsets.items():
+            if check == AUDITED:
+                continue
+            store.bitsets[check] = 0
+            for username in self.usernames_in(bitset):
+                user_id = store.user_id(username)
+                if user_id is not None:
+                    store.bitsets[check] |= 1 << user_id
+        return store
+
+    def add_findings(self, results: Dict[str, Any], categories: Dict[str, str]):
+        """監査結果のカテゴリ別リストをビットセットに反映"""
+        for category, check in categories.items():
+            for finding in results.get(category, []):
+                self.mark(check, finding_username(finding))
+
+    @classmethod
+    def from_results(cls, audited_usernames: Iterable[str],
+                     audit_results: Optional[Dict[str, Any]] = None,
+                     key_audit_results: Optional[Dict[str, Any]] = None,
+                     usage_results: Optional[Dict[str, Any]] = None) -> 'AuditResultStore':
+        """監査結果から構築（audited_usernames の順にIDを採番）"""
+        store = cls()
+        for username in audited_usernames:
+            store.mark(AUDITED, username)
+        if audit_results:
+            store.add_findings(audit_results, USER_AUDIT_CHECKS)
+        if key_audit_results:
+            store.add_findings(key_audit_results, KEY_AUDIT_CHECKS)
+        if usage_results:
+            store.add_findings(usage_results, SERVICE_USAGE_CHECKS)
+        return store
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSONに保存できる形式（ビットセットはリトルエンディアンのbase64）"""
+        return {
+            'version': STORE_FORMAT_VERSION,
+            'usernames': self.usernames,
+            'bitsets': {check: encode_bitset(bitset) for check, bitset in sorted(self.bitsets.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AuditResultStore':
+        if data.get('version') != STORE_FORMAT_VERSION:
+            raise ValueError(f"未対応の監査結果ストア形式です: {data.get('version')}")
+        store = cls()
+        for username in data['usernames']:
+            store.intern(username)
+        store.bitsets = {check: decode_bitset(encoded) for check, encoded in data['bitsets'].items()}
+        return store
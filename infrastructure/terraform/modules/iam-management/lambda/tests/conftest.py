@@ -0,0 +1,20 @@
+"""
+ITSANDBOX IAM管理Lambdaのテスト設定
+Lambdaパッケージと同じ import パス（lambda 直下と共通ライブラリ）で読み込む
+"""
+
+import os
+import sys
+import tempfile
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED_DIR = os.path.abspath(os.path.join(LAMBDA_DIR, '..', '..', '..', '..', 'shared'))
+
+sys.path[:0] = [LAMBDA_DIR, SHARED_DIR]
+
+# モジュール読み込み時にクライアントを作成するため、AWSの接続設定を固定
+os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-northeast-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('STATE_DIR', tempfile.mkdtemp(prefix='itsandbox-state-'))
+os.environ.setdefault('OUTPUT_DIR', tempfile.mkdtemp(prefix='itsandbox-output-'))
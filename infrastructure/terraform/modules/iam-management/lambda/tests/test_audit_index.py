@@ -0,0 +1,33 @@
+"""監査結果インデックスのテスト"""
+
+from itsandbox_common import LocalStateStore
+from iam_audit import AuditIndex
+
+import user_management
+
+
+def test_full_write_rebuilds_usernames_and_keeps_other_checks():
+    index = AuditIndex()
+    index.set_users({'alice': {}, 'bob': {'Project': 'web'}, 'carol': {}}, '2026-10-18T00:00:00')
+    index.update('2026-10-18T00:00:00',
+                 audit_results={'users_without_mfa': ['bob', 'carol']},
+                 usage_results={'users_with_unused_services': [{'username': 'carol', 'services': ['s3']}]})
+
+    # bob がいなくなり dave が追加された翌日、ユーザー監査だけを実行
+    index.set_users({'carol': {}, 'dave': {'Project': 'web'}}, '2026-10-19T00:00:00')
+    index.update('2026-10-19T00:00:00', audit_results={'users_without_mfa': ['dave']})
+
+    assert index.store.usernames == ['carol', 'dave']
+    assert set(index.details) == {'carol'}
+    assert index.user('carol')['checks'] == ['unused_services']
+    assert index.user('dave')['checks'] == ['no_mfa']
+    assert index.user('bob') is None
+    assert index.page(index.select(tags=['Project=web']))[0] == ['dave']
+
+
+def test_query_audit_requires_persistent_state_store(tmp_path):
+    manager = user_management.ITSANDBOXUserManager.__new__(user_management.ITSANDBOXUserManager)
+    manager.state_store = LocalStateStore(str(tmp_path), persistent=False)
+
+    response = manager.query_audit({'check': 'no_mfa'})
+    assert 'STATE_BUCKET' in response['error']
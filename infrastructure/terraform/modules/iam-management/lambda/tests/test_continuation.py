@@ -0,0 +1,72 @@
+"""継続実行（チェックポイントと自己再呼び出し）のテスト"""
+
+import json
+
+import pytest
+
+from itsandbox_common import ContinuationManager, LocalStateStore
+from itsandbox_common import continuation as continuation_module
+
+
+class FakeLambda:
+    def __init__(self):
+        self.calls = []
+
+    def invoke(self, **kwargs):
+        self.calls.append(kwargs)
+
+
+class FakeContext:
+    invoked_function_arn = 'arn:aws:lambda:ap-northeast-1:123456789012:function:itsandbox-user-management'
+
+
+class ExhaustedContext(FakeContext):
+    def get_remaining_time_in_millis(self):
+        return 0
+
+
+def make_continuation(event, store, context=None):
+    return ContinuationManager(event, context or FakeContext(), store=store, lambda_client=FakeLambda())
+
+
+def test_missing_checkpoint_after_first_generation_fails(tmp_path):
+    store = LocalStateStore(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        make_continuation({'continuation_token': 'run', 'continuation_generation': 1}, store)
+
+
+def test_suspend_refuses_store_not_shared_between_invocations(tmp_path):
+    continuation = make_continuation({}, LocalStateStore(str(tmp_path), persistent=False))
+    with pytest.raises(RuntimeError):
+        continuation.suspend('audit_users', 10, {})
+    assert continuation.lambda_client.calls == []
+    assert not continuation.suspended
+
+
+def test_store_not_shared_between_invocations_runs_inline(tmp_path):
+    continuation = make_continuation({}, LocalStateStore(str(tmp_path), persistent=False), ExhaustedContext())
+    continuation.record_progress()
+    assert not continuation.should_yield()
+
+    shared = make_continuation({}, LocalStateStore(str(tmp_path)), ExhaustedContext())
+    assert not shared.should_yield()
+    shared.record_progress()
+    assert shared.should_yield()
+
+
+def test_generation_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(continuation_module, 'MAX_CONTINUATION_GENERATIONS', 2)
+    store = LocalStateStore(str(tmp_path))
+
+    first = make_continuation({}, store)
+    first.suspend('audit_users', 10, {})
+    second = make_continuation(json.loads(first.lambda_client.calls[0]['Payload']), store)
+    assert second.generation == 1
+    assert second.resume('audit_users') == (10, {})
+    second.suspend('audit_users', 20, {})
+
+    third = make_continuation({'continuation_token': first.token, 'continuation_generation': 2}, store)
+    with pytest.raises(RuntimeError):
+        third.suspend('audit_users', 30, {})
+    with pytest.raises(RuntimeError):
+        make_continuation({'continuation_token': first.token, 'continuation_generation': 3}, store)
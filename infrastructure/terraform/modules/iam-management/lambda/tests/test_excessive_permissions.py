@@ -0,0 +1,88 @@
+"""権限過多チェック（個別APIで取得したユーザーの評価）のテスト"""
+
+from types import SimpleNamespace
+
+from iam_audit import IAMEntityIndex, PolicyEvaluator
+
+import user_management
+
+ACCOUNT_ARN = 'arn:aws:iam::123456789012'
+ADMIN_POLICY = 'arn:aws:iam::aws:policy/AdministratorAccess'
+READ_ONLY_DOCUMENT = {
+    'Version': '2012-10-17',
+    'Statement': [{'Effect': 'Allow', 'Action': 's3:GetObject', 'Resource': '*'}],
+}
+
+
+class FakeIAM:
+    """ユーザー・グループのポリシーだけを返すIAMクライアント"""
+
+    def __init__(self, users, groups):
+        self.users = users
+        self.groups = groups
+        self.meta = SimpleNamespace(method_to_api_mapping={
+            name: name for name in dir(self) if name.startswith(('get_', 'list_'))
+        })
+
+    def get_user(self, UserName):
+        user = self.users[UserName]
+        response = {'UserName': UserName, 'Arn': f"{ACCOUNT_ARN}:user/itsandbox/{UserName}", 'Path': '/itsandbox/'}
+        if user.get('boundary'):
+            response['PermissionsBoundary'] = {'PermissionsBoundaryArn': user['boundary']}
+        return {'User': response}
+
+    def list_groups_for_user(self, UserName):
+        return {'Groups': [
+            {'GroupName': name, 'Arn': f"{ACCOUNT_ARN}:group/{name}", 'Path': '/'}
+            for name in self.users[UserName].get('groups', [])
+        ]}
+
+    def list_attached_user_policies(self, UserName):
+        return {'AttachedPolicies': [{'PolicyArn': arn} for arn in self.users[UserName].get('attached', [])]}
+
+    def list_user_policies(self, UserName):
+        return {'PolicyNames': list(self.users[UserName].get('inline', {}))}
+
+    def get_user_policy(self, UserName, PolicyName):
+        return {'PolicyDocument': self.users[UserName]['inline'][PolicyName]}
+
+    def list_attached_group_policies(self, GroupName):
+        return {'AttachedPolicies': [{'PolicyArn': arn} for arn in self.groups[GroupName].get('attached', [])]}
+
+    def list_group_policies(self, GroupName):
+        return {'PolicyNames': list(self.groups[GroupName].get('inline', {}))}
+
+    def get_group_policy(self, GroupName, PolicyName):
+        return {'PolicyDocument': self.groups[GroupName]['inline'][PolicyName]}
+
+
+def make_manager():
+    iam = FakeIAM(
+        users={
+            'inline-reader': {'inline': {'read': READ_ONLY_DOCUMENT}},
+            'group-admin': {'groups': ['admins']},
+            'bounded-admin': {'attached': [ADMIN_POLICY], 'boundary': 'arn:aws:iam::aws:policy/ReadOnlyBoundary'},
+        },
+        groups={'admins': {'attached': [ADMIN_POLICY]}},
+    )
+    manager = user_management.ITSANDBOXUserManager.__new__(user_management.ITSANDBOXUserManager)
+    manager.iam_index = IAMEntityIndex(iam, bulk=False)
+    manager.policy_evaluator = PolicyEvaluator()
+    return manager
+
+
+def test_inline_policy_alone_is_not_excessive():
+    assert not make_manager()._has_excessive_permissions('inline-reader')
+
+
+def test_group_inherited_admin_is_excessive():
+    assert make_manager()._has_excessive_permissions('group-admin')
+
+
+
+def test_event_path_reads_groups_and_boundary():
+    snapshot, authorization = make_manager().iam_index.authorization_for('bounded-admin')
+    assert authorization['attached_policies'] == [ADMIN_POLICY]
+    assert authorization['permissions_boundary'] == 'arn:aws:iam::aws:policy/ReadOnlyBoundary'
+    snapshot, authorization = make_manager().iam_index.authorization_for('group-admin')
+    assert snapshot.group('admins')['attached_policies'] == [ADMIN_POLICY]
@@ -0,0 +1,39 @@
+"""監査履歴のテスト"""
+
+from datetime import date
+
+import pytest
+
+from itsandbox_common import LocalStateStore
+from iam_audit import AuditHistory, AuditResultStore
+
+import user_management
+
+
+def make_store(no_mfa):
+    return AuditResultStore.from_results(['alice', 'bob', 'carol'], {'users_without_mfa': no_mfa})
+
+
+def test_same_day_rerun_uses_previous_day_and_keeps_one_baseline(tmp_path):
+    state_store = LocalStateStore(str(tmp_path))
+    history = AuditHistory(state_store)
+
+    history.record(date(2026, 10, 18), make_store(['alice']))
+    changes = history.record(date(2026, 10, 19), make_store(['alice', 'bob']))
+    assert changes['no_mfa']['added'] == ['bob']
+
+    # 同日の再実行は前日の結果と比較する
+    changes = history.record(date(2026, 10, 19), make_store(['alice', 'bob', 'carol']))
+    assert changes['no_mfa']['added'] == ['bob', 'carol']
+
+    daily = state_store.get_json('history/daily/2026-10-19.json')
+    assert 'baseline_store' not in daily
+    latest = state_store.get_json('history/latest.json')
+    assert latest['baseline_date'] == '2026-10-18'
+
+
+def test_record_history_requires_persistent_state_store(tmp_path):
+    manager = user_management.ITSANDBOXUserManager.__new__(user_management.ITSANDBOXUserManager)
+    manager.state_store = LocalStateStore(str(tmp_path), persistent=False)
+    with pytest.raises(RuntimeError, match='STATE_BUCKET'):
+        manager.record_history(make_store([]))
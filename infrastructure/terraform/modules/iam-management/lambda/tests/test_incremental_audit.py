@@ -0,0 +1,61 @@
+"""増分監査（前回判定の再利用）のテスト"""
+
+from datetime import datetime
+
+from itsandbox_common import LocalStateStore
+from iam_audit import FingerprintCache
+
+import user_management
+
+
+class FakeIndex:
+    """認証情報レポートに行がないユーザーだけを返すインデックス"""
+
+    iam_client = None
+
+    def credential_row(self, username):
+        return None
+
+    def user_authorization(self, username):
+        return {'UserName': username, 'AttachedManagedPolicies': [], 'UserPolicyList': [], 'GroupList': []}
+
+    def authorization_snapshot(self):
+        return None
+
+
+class FakeEvaluator:
+    class PolicySet:
+        documents_hash = 'documents'
+
+    def policy_set(self, snapshot, authorization):
+        return self.PolicySet()
+
+
+def make_manager():
+    manager = user_management.ITSANDBOXUserManager.__new__(user_management.ITSANDBOXUserManager)
+    manager.iam_index = FakeIndex()
+    manager.policy_evaluator = FakeEvaluator()
+    manager.current_date = datetime(2026, 10, 19)
+    return manager
+
+
+def test_user_without_report_row_is_audited_every_time(tmp_path):
+    manager = make_manager()
+    fingerprints = FingerprintCache(LocalStateStore(str(tmp_path)), 'audit_users', manager.current_date)
+    audited = []
+
+    def audit_user(user):
+        audited.append(user['UserName'])
+        return {'username': user['UserName']}
+
+    run = manager._reuse_unchanged(audit_user, fingerprints)
+    user = {'UserName': 'new-user'}
+    assert run(user) == {'username': 'new-user'}
+    assert run(user) == {'username': 'new-user'}
+
+    assert audited == ['new-user', 'new-user']
+    assert fingerprints.stats()['reused'] == 0
+
+
+def test_verdict_valid_until_without_report_row():
+    assert make_manager()._verdict_valid_until(None) is None
@@ -0,0 +1,62 @@
+"""組織横断監査の結果統合のテスト"""
+
+from iam_audit.organization import merge_account_results
+
+
+def account_result(role_audit, group_audit):
+    return {
+        'audit_results': {
+            'total_users': 1,
+            'unused_users': ['alice'],
+            'role_audit': role_audit,
+            'group_audit': group_audit,
+        },
+        'key_audit_results': {'total_users_checked': 1},
+        'risk_summary': {'finding_counts': {'unused_users': 1}, 'high_risk_users': []},
+    }
+
+
+def test_role_and_group_audits_are_merged_across_accounts():
+    accounts = [{'id': '111111111111', 'name': 'dev'}, {'id': '222222222222', 'name': 'prod'}]
+    shared_policy = 'arn:aws:iam::111111111111:policy/missing'
+    results = {
+        '111111111111': account_result(
+            {'total_roles': 2, 'unused_roles': [{'role_name': 'old', 'last_used': None}],
+             'roles_with_excessive_permissions': [{'role_name': 'admin', 'permissions': ['*']}],
+             'unresolved_policies': [shared_policy]},
+            {'total_groups': 1, 'empty_groups': ['empty'], 'unresolved_policies': [shared_policy]},
+        ),
+        '222222222222': account_result(
+            {'total_roles': 1, 'roles_with_risky_trust': [{'role_name': 'ci', 'findings': ['any principal']}]},
+            {'total_groups': 3, 'groups_with_wildcard_permissions': [{'group_name': 'ops', 'actions': ['s3:*']}]},
+        ),
+    }
+
+    merged = merge_account_results(accounts, results)
+
+    role_audit = merged['audit_results']['role_audit']
+    assert role_audit['total_roles'] == 3
+    assert role_audit['unused_roles'] == [
+        {'role_name': '111111111111/old', 'last_used': None, 'account_id': '111111111111'}
+    ]
+    assert role_audit['roles_with_excessive_permissions'][0]['role_name'] == '111111111111/admin'
+    assert role_audit['roles_with_risky_trust'][0]['role_name'] == '222222222222/ci'
+    assert role_audit['unresolved_policies'] == [shared_policy]
+
+    group_audit = merged['audit_results']['group_audit']
+    assert group_audit['total_groups'] == 4
+    assert group_audit['empty_groups'] == ['111111111111/empty']
+    assert group_audit['groups_with_wildcard_permissions'][0]['group_name'] == '222222222222/ops'
+    assert merged['audit_results']['unused_users'] == ['111111111111/alice', '222222222222/alice']
+
+
+def test_failed_role_audit_is_reported_per_account():
+    accounts = [{'id': '111111111111', 'name': 'dev'}]
+    results = {'111111111111': account_result({'error': 'AccessDenied'}, {'total_groups': 1})}
+
+    merged = merge_account_results(accounts, results)
+
+    assert merged['accounts'][0]['principal_audit_errors'] == {'role_audit': 'AccessDenied'}
+    assert merged['audit_results']['role_audit']['total_roles'] == 0
+    assert merged['audit_results']['group_audit']['total_groups'] == 1
+    assert merged['failed_accounts'] == []
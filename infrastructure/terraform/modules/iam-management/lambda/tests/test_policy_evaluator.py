@@ -0,0 +1,98 @@
+"""ローカルIAMポリシー評価のテスト"""
+
+from iam_audit import AuthorizationSnapshot, PolicyEvaluator
+from iam_audit.policy_evaluator import (
+    ALLOW,
+    BUILTIN_AWS_MANAGED_POLICIES,
+    DENY,
+    IMPLICIT_DENY,
+    PatternSet,
+)
+
+ADMIN_ACCESS = 'arn:aws:iam::aws:policy/AdministratorAccess'
+POWER_USER_ACCESS = 'arn:aws:iam::aws:policy/PowerUserAccess'
+PROBE_USER = 'arn:aws:iam::123456789012:user/itsandbox-audit-probe'
+
+
+def policy(*statements):
+    return {'Version': '2012-10-17', 'Statement': list(statements)}
+
+
+def decide(evaluator, documents, action, resource='*', boundary=None, context=None):
+    return evaluator.evaluate(
+        [evaluator.compile(document) for document in documents],
+        evaluator.compile(boundary) if boundary else None,
+        action, resource, context or {}
+    )
+
+
+def test_explicit_deny_overrides_allow():
+    evaluator = PolicyEvaluator()
+    documents = [
+        policy({'Effect': 'Allow', 'Action': '*', 'Resource': '*'}),
+        policy({'Effect': 'Deny', 'Action': 'iam:*', 'Resource': '*'}),
+    ]
+    assert decide(evaluator, documents, 'iam:CreateUser', PROBE_USER) == DENY
+    assert decide(evaluator, documents, 's3:GetObject') == ALLOW
+
+
+def test_not_action_and_not_resource():
+    evaluator = PolicyEvaluator()
+    documents = [
+        policy({'Effect': 'Allow', 'NotAction': 'iam:*', 'Resource': '*'}),
+        policy({'Effect': 'Deny', 'Action': 's3:*', 'NotResource': 'arn:aws:s3:::public/*'}),
+    ]
+    assert decide(evaluator, documents, 'iam:PassRole') == IMPLICIT_DENY
+    assert decide(evaluator, documents, 'ec2:RunInstances') == ALLOW
+    assert decide(evaluator, documents, 's3:GetObject', 'arn:aws:s3:::public/a') == ALLOW
+    assert decide(evaluator, documents, 's3:GetObject', 'arn:aws:s3:::private/a') == DENY
+
+
+def test_permissions_boundary_limits_allow():
+    evaluator = PolicyEvaluator()
+    documents = [policy({'Effect': 'Allow', 'Action': '*', 'Resource': '*'})]
+    boundary = policy({'Effect': 'Allow', 'Action': ['s3:*', 'ec2:*'], 'Resource': '*'})
+    assert decide(evaluator, documents, 's3:PutObject', boundary=boundary) == ALLOW
+    assert decide(evaluator, documents, 'iam:CreateUser', PROBE_USER, boundary=boundary) == IMPLICIT_DENY
+    # 権限境界だけで許可されることはない
+    assert decide(evaluator, [], 's3:PutObject', boundary=boundary) == IMPLICIT_DENY
+
+
+def test_wildcards_treat_brackets_literally():
+    patterns = PatternSet(['iam:[!x]?*', 'arn:aws:s3:::bucket[1]/*'])
+    assert patterns.matches('iam:[!x]yCreateUser')
+    assert not patterns.matches('iam:CreateUser')
+    assert patterns.matches('arn:aws:s3:::bucket[1]/key')
+    assert not patterns.matches('arn:aws:s3:::bucket1/key')
+
+
+def test_group_inherited_admin():
+    snapshot = AuthorizationSnapshot()
+    snapshot.add_page({
+        'UserDetailList': [
+            {'UserName': 'member', 'Arn': 'arn:aws:iam::123456789012:user/member', 'GroupList': ['admins']},
+            {'UserName': 'outsider', 'Arn': 'arn:aws:iam::123456789012:user/outsider', 'GroupList': []},
+        ],
+        'GroupDetailList': [{
+            'GroupName': 'admins', 'Arn': 'arn:aws:iam::123456789012:group/admins',
+            'AttachedManagedPolicies': [{'PolicyArn': ADMIN_ACCESS}],
+        }],
+    })
+    evaluator = PolicyEvaluator()
+    granted, unresolved = evaluator.user_privileged_permissions(snapshot, 'member', snapshot.user('member'))
+    assert 'itsandbox:FullAccessProbe' in granted and 'iam:CreateUser' in granted
+    assert unresolved == []
+    assert evaluator.user_privileged_permissions(snapshot, 'outsider', snapshot.user('outsider'))[0] == []
+
+
+def test_builtin_aws_managed_policies():
+    evaluator = PolicyEvaluator()
+    admin = evaluator.compile(BUILTIN_AWS_MANAGED_POLICIES[ADMIN_ACCESS])
+    power_user = evaluator.compile(BUILTIN_AWS_MANAGED_POLICIES[POWER_USER_ACCESS])
+
+    admin_granted = evaluator.privileged_permissions([admin], None, '123456789012', {})
+    assert 'iam:CreateUser' in admin_granted and 'organizations:LeaveOrganization' in admin_granted
+
+    power_granted = evaluator.privileged_permissions([power_user], None, '123456789012', {})
+    assert power_granted == ['itsandbox:FullAccessProbe', 'sts:AssumeRole']
+    assert evaluator.evaluate([power_user], None, 'iam:ListRoles', '*', {}) == ALLOW
@@ -0,0 +1,164 @@
+"""未使用ユーザーの判定と修復計画のテスト"""
+
+from datetime import datetime, timedelta
+
+from iam_audit import RemediationRunner, plan_remediation
+from iam_audit.remediation import DEACTIVATE_ACCESS_KEY, DEACTIVATE_USER
+
+import user_management
+
+NOW = datetime(2026, 10, 19)
+THRESHOLD = NOW - timedelta(days=90)
+OLD = NOW - timedelta(days=400)
+RECENT = NOW - timedelta(days=1)
+
+
+def report_row(created=OLD, password_enabled=False, password_last_used=None, key_last_used=()):
+    return {
+        'user_creation_time': created,
+        'password_enabled': password_enabled,
+        'password_last_used': password_last_used,
+        'access_keys': [{'last_used': last_used} for last_used in key_last_used],
+    }
+
+
+class FakeIndex:
+    """認証情報レポートの行とアクセスキーの最終使用日時だけを返すインデックス"""
+
+    def __init__(self, rows=None, key_last_used=None):
+        self.rows = rows or {}
+        self.key_last_used = key_last_used or {}
+
+    def credential_row(self, username):
+        return self.rows.get(username)
+
+    def access_keys(self, username):
+        return [{'AccessKeyId': key_id} for key_id in self.key_last_used.get(username, {})]
+
+    def access_key_last_used(self, access_key_id):
+        for keys in self.key_last_used.values():
+            if access_key_id in keys:
+                return keys[access_key_id]
+        return None
+
+
+class FakeIAM:
+    def __init__(self, users):
+        self.users = users
+
+    def get_user(self, UserName):
+        return {'User': self.users[UserName]}
+
+
+def make_manager(index, users=None):
+    manager = user_management.ITSANDBOXUserManager.__new__(user_management.ITSANDBOXUserManager)
+    manager.iam_index = index
+    manager.iam = FakeIAM(users or {})
+    manager.current_date = NOW
+    manager.unused_threshold = THRESHOLD
+    return manager
+
+
+def is_unused(row):
+    return make_manager(FakeIndex({'user': row}))._is_user_unused({'UserName': 'user', 'CreateDate': row['user_creation_time']})
+
+
+def test_console_user_with_recent_login_is_used():
+    assert not is_unused(report_row(password_enabled=True, password_last_used=RECENT))
+
+
+def test_recently_created_user_is_not_unused():
+    assert not is_unused(report_row(created=RECENT, password_enabled=True))
+    assert not is_unused(report_row(created=RECENT))
+
+
+def test_password_user_with_recent_key_use_is_used():
+    assert not is_unused(report_row(password_enabled=True, password_last_used=OLD, key_last_used=[RECENT]))
+
+
+def test_old_user_without_recent_activity_is_unused():
+    assert is_unused(report_row(password_enabled=True, password_last_used=OLD, key_last_used=[OLD, None]))
+    assert is_unused(report_row(password_enabled=True))
+
+
+def test_api_fallback_checks_creation_password_and_keys():
+    index = FakeIndex(key_last_used={'keys': {'AKIA1': RECENT}, 'idle': {'AKIA2': OLD}})
+    manager = make_manager(index)
+    assert not manager._is_user_unused({'UserName': 'new', 'CreateDate': RECENT})
+    assert not manager._is_user_unused({'UserName': 'console', 'CreateDate': OLD, 'PasswordLastUsed': RECENT})
+    assert not manager._is_user_unused({'UserName': 'keys', 'CreateDate': OLD})
+    assert manager._is_user_unused({'UserName': 'idle', 'CreateDate': OLD, 'PasswordLastUsed': OLD})
+
+
+def test_latest_activity_uses_report_row_or_api():
+    index = FakeIndex(
+        rows={'reported': report_row(password_last_used=OLD, key_last_used=[RECENT])},
+        key_last_used={'unreported': {'AKIA1': None}}
+    )
+    manager = make_manager(index, {'unreported': {'CreateDate': OLD, 'PasswordLastUsed': OLD - timedelta(days=1)}})
+    assert manager._latest_activity('reported') == RECENT
+    assert manager._latest_activity('unreported') == OLD
+    assert manager._latest_activity('deleted') is None
+
+
+def test_plan_deactivates_only_confirmed_stale_users():
+    audit_results = {'unused_users': [{'username': name} for name in ('stale', 'active', 'unknown')]}
+    plan = plan_remediation(
+        audit_results, {}, {},
+        {'stale': OLD, 'active': RECENT, 'unknown': None}, THRESHOLD
+    )
+
+    assert [action['username'] for action in plan['actions']] == ['stale']
+    assert {skip['username']: skip['reason'] for skip in plan['skipped']} == {
+        'active': 'recent_activity',
+        'unknown': 'activity_unknown',
+    }
+
+
+class LiveIAM:
+    """監査後に利用されたユーザー・キーを返すIAMクライアント（変更系の呼び出しを記録）"""
+
+    def __init__(self, password_last_used, key_last_used):
+        self.password_last_used = password_last_used
+        self.key_last_used = key_last_used
+        self.mutations = []
+
+    def get_user(self, UserName):
+        return {'User': {'UserName': UserName, 'CreateDate': OLD, 'PasswordLastUsed': self.password_last_used}}
+
+    def list_access_keys(self, UserName):
+        return {'AccessKeyMetadata': [{'AccessKeyId': key_id, 'Status': 'Active'} for key_id in self.key_last_used]}
+
+    def get_access_key_last_used(self, AccessKeyId):
+        return {'AccessKeyLastUsed': {'LastUsedDate': self.key_last_used[AccessKeyId]}}
+
+    def __getattr__(self, name):
+        def mutate(**params):
+            self.mutations.append(name)
+        return mutate
+
+
+def test_runner_skips_actions_with_activity_newer_than_the_report():
+    # 認証情報レポートでは未使用だが、IAMの最新の値では監査後に利用されている
+    iam = LiveIAM(password_last_used=RECENT, key_last_used={'AKIA1': RECENT})
+    runner = RemediationRunner(iam, dry_run=False, user_threshold=THRESHOLD,
+                               access_key_threshold=NOW - timedelta(days=30))
+    results = runner.run([
+        {'action': DEACTIVATE_USER, 'username': 'console', 'reason': 'Unused'},
+        {'action': DEACTIVATE_ACCESS_KEY, 'username': 'keys', 'access_key_id': 'AKIA1', 'reason': 'Unused'},
+    ])
+
+    assert [result['skipped'] for result in results] == ['recent_activity', 'recent_activity']
+    assert iam.mutations == []
+
+
+def test_runner_deactivates_when_live_activity_is_old():
+    iam = LiveIAM(password_last_used=OLD, key_last_used={'AKIA1': OLD})
+    runner = RemediationRunner(iam, dry_run=False, user_threshold=THRESHOLD,
+                               access_key_threshold=NOW - timedelta(days=30))
+    results = runner.run([
+        {'action': DEACTIVATE_ACCESS_KEY, 'username': 'keys', 'access_key_id': 'AKIA1', 'reason': 'Unused'},
+    ])
+
+    assert 'skipped' not in results[0]
+    assert iam.mutations == ['update_access_key']
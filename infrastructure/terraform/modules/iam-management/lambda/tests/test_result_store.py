@@ -0,0 +1,48 @@
+"""監査結果ストアのテスト"""
+
+import user_management
+
+
+class FakeIndex:
+    """ユーザー一覧の取得回数を数えるインデックス"""
+
+    def __init__(self, usernames):
+        self.usernames = usernames
+        self.list_calls = 0
+
+    def iter_users(self):
+        self.list_calls += 1
+        for username in self.usernames:
+            yield {'UserName': username}
+
+
+def audit_user_all(user):
+    username = user['UserName']
+    user_result = {
+        'username': username,
+        'without_mfa': username != 'alice',
+        'password_age': 0,
+        'excessive_permissions': False,
+        'violations': [],
+    }
+    return user_result, {'users_with_old_keys': [], 'users_with_unused_keys': [], 'users_with_multiple_keys': []}
+
+
+def test_result_store_uses_users_audited_by_full_audit(monkeypatch):
+    manager = user_management.ITSANDBOXUserManager.__new__(user_management.ITSANDBOXUserManager)
+    manager.iam_index = FakeIndex(['alice', 'bob', 'carol'])
+    manager.max_workers = 1
+    manager.incremental = False
+    manager.output = None
+    manager.audited_usernames = []
+    monkeypatch.setattr(manager, '_audit_user_all', audit_user_all, raising=False)
+    monkeypatch.setattr(manager, 'audit_roles_and_groups', lambda: {'role_audit': {}}, raising=False)
+
+    audit_results, key_audit_results = manager.audit_all()
+    # 監査後に作成されたユーザーがいてもIDはずれない
+    manager.iam_index.usernames.insert(0, 'new-user')
+    store = manager.build_result_store(audit_results, key_audit_results)
+
+    assert manager.iam_index.list_calls == 1
+    assert store.usernames == ['alice', 'bob', 'carol']
+    assert store.query(all_of=['no_mfa']) == ['bob', 'carol']
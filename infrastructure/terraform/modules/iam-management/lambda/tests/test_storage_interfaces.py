@@ -0,0 +1,38 @@
+"""状態ストア・出力シンクの基底クラスのテスト"""
+
+import pytest
+
+from itsandbox_common.output_sink import LocalOutputSink, OutputSink, OutputUpload
+from itsandbox_common.state_store import LocalStateStore, StateStore
+
+
+class IncompleteStateStore(StateStore):
+    def get_bytes(self, key):
+        return None
+
+
+class IncompleteOutputSink(OutputSink):
+    def begin(self, key):
+        return None
+
+
+class IncompleteUpload(OutputUpload):
+    def write(self, data):
+        pass
+
+
+@pytest.mark.parametrize('cls', [IncompleteStateStore, IncompleteOutputSink, IncompleteUpload])
+def test_missing_override_fails_on_instantiation(cls):
+    with pytest.raises(TypeError):
+        cls()
+
+
+def test_local_implementations_are_complete(tmp_path):
+    store = LocalStateStore(str(tmp_path / 'state'))
+    store.put_json('a.json', {'ok': True})
+    assert store.get_json('a.json') == {'ok': True}
+
+    sink = LocalOutputSink(str(tmp_path / 'output'))
+    with sink.open_writer('records.ndjson') as writer:
+        writer.write({'ok': True})
+    assert [obj['key'] for obj in sink.list_objects()] == ['records.ndjson']
@@ -0,0 +1,25 @@
+"""構造化ログのサンプリングのテスト"""
+
+import logging
+
+from itsandbox_common import SamplingFilter, log_fields
+
+
+def make_record(level, **extra):
+    record = logging.makeLogRecord({'levelno': level, 'msg': 'message'})
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_untagged_info_lines_are_never_sampled_out():
+    sampling = SamplingFilter({logging.INFO: 0.0})
+    assert sampling.filter(make_record(logging.INFO))
+    assert sampling.filter(make_record(logging.INFO, **log_fields(user='a')))
+
+
+def test_only_tagged_lines_are_sampled():
+    sampling = SamplingFilter({logging.INFO: 0.0})
+    assert not sampling.filter(make_record(logging.INFO, **log_fields(sampled=True)))
+    assert sampling.filter(make_record(logging.INFO, **log_fields(always=True, sampled=True)))
+    assert sampling.filter(make_record(logging.ERROR, **log_fields(sampled=True)))
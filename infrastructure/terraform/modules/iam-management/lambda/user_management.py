@@ -4,208 +4,936 @@ ITSANDBOX User Management Lambda Function
 """
 
 import json
-import boto3
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple
 import logging
+import threading
+
+from itsandbox_common import (
+    DEFAULT_MAX_WORKERS,
+    ContinuationManager,
+    InvocationMetrics,
+    LogAggregator,
+    TokenBucket,
+    batched,
+    bounded_map,
+    configure_logging,
+    create_client,
+    log_fields,
+    open_output_sink,
+    open_state_store,
+    start_invocation_metrics,
+)
+from iam_audit import (
+    AccessAdvisorPipeline,
+    AuditHistory,
+    AuditIndex,
+    AuditOutputStream,
+    AuditResultStore,
+    ComplianceRuleEngine,
+    FingerprintCache,
+    IAMEntityIndex,
+    OrganizationAudit,
+    PolicyDocumentCache,
+    PolicyEvaluator,
+    PrincipalAudit,
+    RemediationRunner,
+    affected_usernames,
+    event_summary,
+    is_iam_change_event,
+    list_member_accounts,
+    merge_account_results,
+    next_threshold_crossing,
+    plan_remediation,
+    user_fingerprint,
+    user_record,
+)
+from iam_audit.audit_index import ALL_AUDIT_CHECKS, DEFAULT_PAGE_SIZE, tag_filter
+from iam_audit.audit_output import output_record, result_counts
 
 # ログ設定
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# AWS clients
-iam_client = boto3.client('iam')
-sns_client = boto3.client('sns')
-ses_client = boto3.client('ses')
+# ユーザー単位の警告は実行ごとに1行のサマリーへ集約
+log_aggregator = LogAggregator(logger)
+
+# AWS clients（共通の接続プール・リトライ設定）
+iam_client = create_client('iam')
+sns_client = create_client('sns')
+ses_client = create_client('ses')
+sts_client = create_client('sts')
+organizations_client = create_client('organizations')
 
 # 環境変数
 ORGANIZATION_ID = os.environ.get('ORGANIZATION_ID', '')
 MASTER_ACCOUNT_ID = os.environ.get('MASTER_ACCOUNT_ID', '')
 UNUSED_USER_THRESHOLD_DAYS = int(os.environ.get('UNUSED_USER_THRESHOLD_DAYS', '90'))
 ACCESS_KEY_ROTATION_DAYS = int(os.environ.get('ACCESS_KEY_ROTATION_DAYS', '90'))
+UNUSED_SERVICE_THRESHOLD_DAYS = int(os.environ.get('UNUSED_SERVICE_THRESHOLD_DAYS', '90'))
+# continuation を使用しない直接呼び出し時の Access Advisor ポーリング上限（秒）
+ACCESS_ADVISOR_POLL_TIMEOUT_SECONDS = int(os.environ.get('ACCESS_ADVISOR_POLL_TIMEOUT_SECONDS', '240'))
 NOTIFICATION_EMAIL = os.environ.get('NOTIFICATION_EMAIL', '${notification_email}')
 SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN', '')
 
+# 組織横断監査（org_audit）: メンバーアカウントで引き受ける監査ロールと並列数
+ORG_AUDIT_ROLE_NAME = os.environ.get('ORG_AUDIT_ROLE_NAME', 'ITSANDBOXAuditRole')
+ORG_AUDIT_ROLE_PATH = os.environ.get('ORG_AUDIT_ROLE_PATH', '/itsandbox/')
+ORG_AUDIT_EXTERNAL_ID = os.environ.get('EXTERNAL_ID', '')
+# 同時に監査するアカウント数と、アカウント内のユーザー単位チェックの並列数
+ORG_AUDIT_MAX_ACCOUNTS = int(os.environ.get('ORG_AUDIT_MAX_ACCOUNTS', '4'))
+ORG_AUDIT_ACCOUNT_MAX_WORKERS = int(os.environ.get('ORG_AUDIT_ACCOUNT_MAX_WORKERS', '4'))
+
+# ユーザー単位チェックの並列数と、チェックポイント判定を行うチャンクの大きさ
+AUDIT_MAX_WORKERS = int(os.environ.get('AUDIT_MAX_WORKERS', str(DEFAULT_MAX_WORKERS)))
+AUDIT_CHUNK_SIZE = int(os.environ.get('AUDIT_CHUNK_SIZE', str(AUDIT_MAX_WORKERS * 2)))
+
+# 増分監査（入力が変わっていないユーザーは前回の判定を再利用）。イベントの incremental で上書き可能
+INCREMENTAL_AUDIT = os.environ.get('INCREMENTAL_AUDIT', 'true').lower() == 'true'
+
+# ユーザーごとの監査結果をNDJSONで出力し、レスポンスはマニフェストと件数のみにする。
+# イベントの stream_output で上書き可能（出力先は OUTPUT_BUCKET、未設定時は /tmp）
+AUDIT_OUTPUT_STREAMING = os.environ.get('AUDIT_OUTPUT_STREAMING', 'false').lower() == 'true'
+
+# 不要アイデンティティの自動修復（remediate）。既定は計画のみ（dry_run）で、イベントの dry_run で上書き可能
+REMEDIATION_DRY_RUN = os.environ.get('REMEDIATION_DRY_RUN', 'true').lower() == 'true'
+# 修復しないユーザー名（カンマ区切り、ワイルドカード可）。イベントの allow_list で追加可能
+REMEDIATION_ALLOW_LIST = [
+    pattern.strip() for pattern in os.environ.get('REMEDIATION_ALLOW_LIST', '').split(',') if pattern.strip()
+]
+# 修復操作の並列数・変更系APIの送信レート（リクエスト/秒）・チェックポイント判定を行うバッチの大きさ
+REMEDIATION_MAX_WORKERS = int(os.environ.get('REMEDIATION_MAX_WORKERS', '4'))
+REMEDIATION_REQUESTS_PER_SECOND = float(os.environ.get('REMEDIATION_REQUESTS_PER_SECOND', '2'))
+REMEDIATION_BATCH_SIZE = int(os.environ.get('REMEDIATION_BATCH_SIZE', '25'))
+
+# コンプライアンスルールの設定ファイル（未設定時はパッケージ同梱の iam_audit/compliance_rules.json）
+COMPLIANCE_RULES_PATH = os.environ.get('COMPLIANCE_RULES_PATH', '')
+
+# 判定ロジックを変更した場合に増やし、保存済みの判定を無効化する
+AUDIT_CHECKS_VERSION = 2
+
+# コンプライアンスルールはコールドスタート時に一度だけコンパイル
+compliance_rules = ComplianceRuleEngine.load(COMPLIANCE_RULES_PATH or None)
+
+# レポートの推移欄に表示する差分の期間（日）とチェック
+TREND_PERIODS_DAYS = (7, 30)
+TREND_CHECK_LABELS = {
+    'unused': '未使用ユーザー',
+    'no_mfa': 'MFA未設定',
+    'old_password': '古いパスワード',
+    'excessive_permissions': '権限過多',
+    'compliance_violation': 'コンプライアンス違反',
+    'old_access_key': '古いアクセスキー',
+    'unused_access_key': '未使用アクセスキー',
+}
+
+# lambda_handler が受け付けるアクション
+SUPPORTED_ACTIONS = (
+    'audit_users', 'audit_access_keys', 'audit_service_usage', 'full_audit', 'org_audit', 'query_audit',
+    'remediate'
+)
+
+# ユーザーごとの結果をストリーミング出力できるアクション
+STREAMED_ACTIONS = ('audit_users', 'audit_access_keys', 'audit_service_usage', 'full_audit')
+
 class ITSANDBOXUserManager:
-    def __init__(self):
+    def __init__(self, iam_index: Optional[IAMEntityIndex] = None, max_workers: Optional[int] = None,
+                 incremental: bool = False, state_store=None):
+        # 同一実行内の全アクションで共有するIAMエンティティインデックス
+        self.iam_index = iam_index or IAMEntityIndex(iam_client)
+        # 個別の参照呼び出しもインデックスのメモ化クライアント経由で行う
+        self.iam = self.iam_index.iam_client
+        # ユーザー単位チェックの並列数（1の場合は逐次実行）
+        self.max_workers = max_workers or AUDIT_MAX_WORKERS
+        # 増分監査のフィンガープリント保存先
+        self.incremental = incremental
+        self.state_store = state_store or (open_state_store('iam-audit') if incremental else None)
+        self.incremental_stats: Dict[str, Dict[str, int]] = {}
+        # コンパイル済みポリシー文書を全ユーザーで共有（AWS管理ポリシーの文書は実行をまたいでキャッシュ）
+        self.policy_evaluator = PolicyEvaluator(
+            PolicyDocumentCache(self.iam, self.state_store or open_state_store('iam-audit'))
+        )
+        # スナップショット全体へのコンプライアンスルールの一括評価結果（初回参照時に作成）
+        self._compliance_violations: Optional[Dict[str, List[str]]] = None
+        self._compliance_lock = threading.Lock()
+        # この実行で得た監査結果（実行終了時に検索用インデックスへ反映）
+        self.index_updates: Dict[str, Dict[str, Any]] = {}
+        # full_audit で監査したユーザー（一覧の順。結果ストアのIDに使用）
+        self.audited_usernames: List[str] = []
+        # ユーザーごとの結果の出力先（None の場合はレスポンスに全結果を含める）
+        self.output: Optional[AuditOutputStream] = None
         self.current_date = datetime.utcnow()
         self.unused_threshold = self.current_date - timedelta(days=UNUSED_USER_THRESHOLD_DAYS)
         self.rotation_threshold = self.current_date - timedelta(days=ACCESS_KEY_ROTATION_DAYS)
     
-    def audit_users(self) -> Dict[str, Any]:
-        """ユーザー監査を実行"""
+    def audit_users(self, continuation: Optional[ContinuationManager] = None) -> Dict[str, Any]:
+        """ユーザー監査を実行
+
+        continuation を指定すると、残り実行時間が少なくなった時点で
+        チェックポイントを保存し、非同期の再呼び出しで続きから処理する。
+        """
+        try:
+            audit_results = continuation.stage_result('audit_users') if continuation else None
+            if audit_results is None:
+                audit_results = self._run_user_pipeline(
+                    'audit_users', self._new_audit_results(),
+                    self._audit_user, self._merge_user_result, continuation
+                )
+                if continuation and continuation.suspended:
+                    return audit_results
+            
+            # ロール・グループはユーザー監査と同じスナップショットから評価
+            if 'role_audit' not in audit_results:
+                audit_results.update(self.audit_roles_and_groups())
+            return audit_results
+            
+        except Exception as e:
+            logger.error(f"ユーザー監査エラー: {str(e)}")
+            return {'error': str(e)}
+    
+    def audit_access_keys(self, continuation: Optional[ContinuationManager] = None) -> Dict[str, Any]:
+        """アクセスキー監査を実行（continuation指定時は中断・継続に対応）"""
         try:
-            # 全ユーザーリストを取得
-            users_response = iam_client.list_users(PathPrefix='/itsandbox/')
-            users = users_response['Users']
-            
-            audit_results = {
-                'total_users': len(users),
-                'unused_users': [],
-                'users_without_mfa': [],
-                'users_with_old_passwords': [],
-                'users_with_excessive_permissions': [],
-                'compliance_violations': []
+            if continuation:
+                completed = continuation.stage_result('audit_access_keys')
+                if completed is not None:
+                    return completed
+            
+            return self._run_user_pipeline(
+                'audit_access_keys', self._new_key_audit_results(),
+                self._audit_user_access_keys, self._merge_access_key_result, continuation
+            )
+            
+        except Exception as e:
+            logger.error(f"アクセスキー監査エラー: {str(e)}")
+            return {'error': str(e)}
+    
+    def audit_all(self, continuation: Optional[ContinuationManager] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """ユーザー監査とアクセスキー監査を1回の走査で実行
+
+        各ユーザーを一度だけ訪問し、取得した情報から audit_users と
+        audit_access_keys の両方の結果を生成する（full_audit 用）。
+        """
+        try:
+            results = None
+            if continuation:
+                results = continuation.stage_result('full_audit')
+            
+            if results is None:
+                results = self._run_user_pipeline(
+                    'full_audit',
+                    {
+                        'audit_results': self._new_audit_results(),
+                        'key_audit_results': self._new_key_audit_results(),
+                        'audited_usernames': []
+                    },
+                    self._audit_user_all, self._merge_user_all, continuation
+                )
+                if continuation and continuation.suspended:
+                    return results['audit_results'], results['key_audit_results']
+            
+            self.audited_usernames = results['audited_usernames']
+            if 'role_audit' not in results['audit_results']:
+                results['audit_results'].update(self.audit_roles_and_groups())
+            return results['audit_results'], results['key_audit_results']
+            
+        except Exception as e:
+            logger.error(f"完全監査エラー: {str(e)}")
+            return {'error': str(e)}, {'error': str(e)}
+    
+    def audit_roles_and_groups(self) -> Dict[str, Any]:
+        """対象パス配下のロール・グループを監査
+
+        ユーザー監査で取得済みの認可情報スナップショット（RoleLastUsed・信頼ポリシーを含む）
+        だけを使い、ロール・グループごとのAPI呼び出しは行わない。
+        """
+        try:
+            snapshot = self.iam_index.authorization_snapshot()
+            if snapshot is None:
+                raise RuntimeError('認可情報スナップショットを取得できません')
+            
+            principal_audit = PrincipalAudit(snapshot, self.policy_evaluator, self.iam_index.path_prefix)
+            return {
+                'role_audit': principal_audit.audit_roles(self.unused_threshold),
+                'group_audit': principal_audit.audit_groups()
             }
             
-            for user in users:
-                username = user['UserName']
-                
-                # 未使用ユーザーチェック
-                if self._is_user_unused(user):
-                    audit_results['unused_users'].append({
-                        'username': username,
-                        'last_activity': self._get_user_last_activity(username),
-                        'created_date': user['CreateDate'].isoformat()
-                    })
-                
-                # MFAチェック
-                if not self._has_mfa_enabled(username):
-                    audit_results['users_without_mfa'].append(username)
-                
-                # パスワード年齢チェック
-                password_age = self._get_password_age(username)
-                if password_age and password_age > 90:
-                    audit_results['users_with_old_passwords'].append({
-                        'username': username,
-                        'password_age_days': password_age
-                    })
-                
-                # 権限過多チェック
-                if self._has_excessive_permissions(username):
-                    audit_results['users_with_excessive_permissions'].append(username)
-                
-                # コンプライアンス違反チェック
-                violations = self._check_compliance_violations(username)
-                if violations:
-                    audit_results['compliance_violations'].append({
+        except Exception as e:
+            logger.error(f"ロール・グループ監査エラー: {str(e)}")
+            return {'role_audit': {'error': str(e)}, 'group_audit': {'error': str(e)}}
+    
+    def audit_service_usage(self, continuation: Optional[ContinuationManager] = None) -> Dict[str, Any]:
+        """Access Advisor で許可されているが使われていないサービスをユーザーごとに集計
+
+        全ユーザー分のジョブを先にまとめて投入し、その後ジョブIDをまとめてポーリングする。
+        投入・ポーリングのどちらの途中でも中断・継続できる。
+        """
+        try:
+            if continuation:
+                completed = continuation.stage_result('audit_service_usage')
+                if completed is not None:
+                    return completed
+            
+            state = {'submitted_users': 0, 'submission_complete': False, 'jobs': {}, 'services': {}}
+            if continuation:
+                _, partial = continuation.resume('audit_service_usage')
+                if partial:
+                    state = partial
+            
+            pipeline = AccessAdvisorPipeline(
+                self.iam,
+                self.current_date - timedelta(days=UNUSED_SERVICE_THRESHOLD_DAYS),
+                self.max_workers
+            )
+            
+            # ジョブ投入（ユーザー一覧をストリーミングしながらチャンク単位で投入）
+            if not state['submission_complete']:
+                for chunk in self._stream_user_chunks(state['submitted_users']):
+                    if continuation and continuation.should_yield():
+                        continuation.suspend('audit_service_usage', 0, state)
+                        return state
+                    state['jobs'].update(pipeline.submit({user['UserName']: user['Arn'] for user in chunk}))
+                    state['submitted_users'] += len(chunk)
+                    if continuation:
+                        continuation.record_progress(len(chunk))
+                state['submission_complete'] = True
+            
+            # 全ジョブをまとめてポーリング（未完了が残る間はバックオフ）
+            pending = pipeline.poll(
+                state['jobs'],
+                state['services'],
+                should_stop=lambda: bool(continuation and continuation.should_yield()),
+                on_complete=lambda count: continuation and continuation.record_progress(count),
+                timeout_seconds=ACCESS_ADVISOR_POLL_TIMEOUT_SECONDS
+            )
+            if pending and continuation and continuation.should_yield():
+                continuation.suspend('audit_service_usage', 0, state)
+                return state
+            
+            services = state['services']
+            usage_results = {
+                'total_users': state['submitted_users'],
+                'unused_service_threshold_days': UNUSED_SERVICE_THRESHOLD_DAYS,
+                'users_with_unused_services': [
+                    {
                         'username': username,
-                        'violations': violations
-                    })
+                        'granted_services': services[username]['granted_services'],
+                        'unused_services': services[username]['unused_services']
+                    }
+                    for username in sorted(services)
+                    if services[username].get('unused_services')
+                ],
+                'service_usage': services,
+                'failed_users': sorted(name for name, result in services.items() if 'error' in result),
+                'pending_users': sorted(pending)
+            }
             
-            return audit_results
+            if self.output:
+                self.output.write_all('audit_service_usage', (
+                    output_record('audit_service_usage', username, services[username])
+                    for username in sorted(services)
+                ))
+            
+            if continuation:
+                continuation.complete_stage('audit_service_usage', usage_results)
+            
+            return usage_results
             
         except Exception as e:
-            logger.error(f"ユーザー監査エラー: {str(e)}")
+            logger.error(f"サービス利用状況監査エラー: {str(e)}")
+            return {'error': str(e)}
+    
+    def audit_organization(self, continuation: Optional[ContinuationManager] = None) -> Dict[str, Any]:
+        """組織内の全アカウントを監査し、アカウント別の結果を1つに統合
+
+        各アカウントの監査ロールを引き受け、ORG_AUDIT_MAX_ACCOUNTS 件ずつ並列に監査する。
+        アカウントのバッチの境界で中断・継続できる。
+        """
+        try:
+            if continuation:
+                completed = continuation.stage_result('org_audit')
+                if completed is not None:
+                    return completed
+            
+            state = {'accounts': None, 'account_results': {}}
+            if continuation:
+                _, partial = continuation.resume('org_audit')
+                if partial:
+                    state = partial
+            
+            if state['accounts'] is None:
+                state['accounts'] = list_member_accounts(organizations_client)
+            
+            fan_out = OrganizationAudit(
+                sts_client,
+                ORG_AUDIT_ROLE_NAME,
+                ORG_AUDIT_ROLE_PATH,
+                ORG_AUDIT_EXTERNAL_ID,
+                ORG_AUDIT_MAX_ACCOUNTS,
+                home_account_id=sts_client.get_caller_identity()['Account']
+            )
+            remaining = [account for account in state['accounts']
+                         if account['id'] not in state['account_results']]
+            for accounts in batched(remaining, ORG_AUDIT_MAX_ACCOUNTS):
+                if continuation and continuation.should_yield():
+                    continuation.suspend('org_audit', 0, state)
+                    return state
+                state['account_results'].update(fan_out.run(accounts, self._audit_member_account))
+                if continuation:
+                    continuation.record_progress(len(accounts))
+            
+            org_results = merge_account_results(state['accounts'], state['account_results'])
+            org_results['organization_id'] = ORGANIZATION_ID
+            
+            if continuation:
+                continuation.complete_stage('org_audit', org_results)
+            
+            return org_results
+            
+        except Exception as e:
+            logger.error(f"組織監査エラー: {str(e)}")
+            return {'error': str(e)}
+    
+    def remediate_stale_identities(self, audit_results: Dict[str, Any], key_audit_results: Dict[str, Any],
+                                   dry_run: bool = True, allow_list: Optional[List[str]] = None,
+                                   continuation: Optional[ContinuationManager] = None) -> Dict[str, Any]:
+        """未使用ユーザーの無効化と未使用アクセスキーの無効化をバッチ単位で実行
+
+        許可リスト・除外タグ（RemediationExempt=true）・無効化済みのユーザーは対象外。
+        dry_run では計画と各操作で行う変更だけを返す。バッチの境界で中断・継続できる。
+        """
+        try:
+            if continuation:
+                completed = continuation.stage_result('remediation')
+                if completed is not None:
+                    return completed
+            
+            state = None
+            if continuation:
+                _, state = continuation.resume('remediation')
+            
+            if state is None:
+                # 監査結果は前回の呼び出し・再利用した判定の場合があるため、監査データで最終アクティビティを確認
+                # （各操作の直前にも RemediationRunner がIAMから最新の値を取得して再確認する）
+                last_activity = {
+                    finding['username']: self._latest_activity(finding['username'])
+                    for finding in audit_results.get('unused_users', [])
+                }
+                plan = plan_remediation(
+                    audit_results, key_audit_results,
+                    self._remediation_user_tags(audit_results, key_audit_results),
+                    last_activity, self.unused_threshold,
+                    allow_list or []
+                )
+                state = {'dry_run': dry_run, 'actions': plan['actions'], 'skipped': plan['skipped'], 'results': []}
+            
+            # 変更系APIは読み取りのメモ化を通さず、専用の送信レートで実行
+            runner = RemediationRunner(
+                iam_client,
+                TokenBucket(REMEDIATION_REQUESTS_PER_SECOND, max(1, int(REMEDIATION_REQUESTS_PER_SECOND))),
+                REMEDIATION_MAX_WORKERS,
+                state['dry_run'],
+                user_threshold=self.unused_threshold,
+                # 未使用アクセスキーの判定（最終使用から30日超）と同じ閾値
+                access_key_threshold=self.current_date - timedelta(days=30)
+            )
+            remaining = state['actions'][len(state['results']):]
+            for actions in batched(remaining, REMEDIATION_BATCH_SIZE):
+                if continuation and continuation.should_yield():
+                    continuation.suspend('remediation', 0, state)
+                    return state
+                state['results'].extend(runner.run(actions))
+                if continuation:
+                    continuation.record_progress(len(actions))
+            
+            remediation = {
+                'dry_run': state['dry_run'],
+                'planned': len(state['actions']),
+                'remediated': [
+                    result for result in state['results'] if 'error' not in result and 'skipped' not in result
+                ],
+                'failed': [result for result in state['results'] if 'error' in result],
+                'skipped': state['skipped'] + [
+                    {
+                        'username': result['username'], 'action': result['action'],
+                        **({'access_key_id': result['access_key_id']} if 'access_key_id' in result else {}),
+                        'reason': result['skipped'], 'last_activity': result['last_activity'],
+                    }
+                    for result in state['results'] if 'skipped' in result
+                ]
+            }
+            
+            if continuation:
+                continuation.complete_stage('remediation', remediation)
+            
+            return remediation
+            
+        except Exception as e:
+            logger.error(f"自動修復エラー: {str(e)}")
             return {'error': str(e)}
     
-    def audit_access_keys(self) -> Dict[str, Any]:
-        """アクセスキー監査を実行"""
+    def _remediation_user_tags(self, audit_results: Dict[str, Any],
+                               key_audit_results: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+        """修復候補ユーザーのタグ（スナップショットになければ個別に取得）"""
+        candidates = {finding['username'] for finding in audit_results.get('unused_users', [])}
+        candidates.update(finding['username'] for finding in key_audit_results.get('users_with_unused_keys', []))
+        
+        user_tags = {}
+        for username in sorted(candidates):
+            authorization = self.iam_index.user_authorization(username)
+            if authorization is not None:
+                user_tags[username] = authorization['tags']
+            else:
+                tags_response = self.iam.list_user_tags(UserName=username)
+                user_tags[username] = {tag['Key']: tag['Value'] for tag in tags_response['Tags']}
+        return user_tags
+    
+    def _audit_member_account(self, account: Dict[str, str], session) -> Dict[str, Any]:
+        """1アカウント分の完全監査（session がNoneの場合は実行中のアカウント）"""
+        if session is None:
+            iam_index = self.iam_index
+        else:
+            # アカウントごとに別のクライアント（接続プール・レート制限）を使用
+            iam_index = IAMEntityIndex(
+                create_client('iam', session=session, max_workers=ORG_AUDIT_ACCOUNT_MAX_WORKERS)
+            )
+        manager = ITSANDBOXUserManager(
+            iam_index,
+            max_workers=ORG_AUDIT_ACCOUNT_MAX_WORKERS,
+            incremental=self.incremental,
+            state_store=open_state_store(f"iam-audit/accounts/{account['id']}") if self.incremental else None
+        )
+        
+        audit_results, key_audit_results = manager.audit_all()
+        if 'error' in audit_results:
+            return {'error': audit_results['error']}
+        
+        logger.info(
+            f"アカウント監査完了: {account['name']} ({account['id']}) {audit_results['total_users']}人",
+            extra=log_fields(account_id=account['id'], total_users=audit_results['total_users'])
+        )
+        return {
+            'audit_results': audit_results,
+            'key_audit_results': key_audit_results,
+            'risk_summary': manager.risk_summary(
+                manager.build_result_store(audit_results, key_audit_results)
+            )
+        }
+    
+    def _new_audit_results(self) -> Dict[str, Any]:
+        return {
+            'total_users': 0,
+            'unused_users': [],
+            'users_without_mfa': [],
+            'users_with_old_passwords': [],
+            'users_with_excessive_permissions': [],
+            'compliance_violations': []
+        }
+    
+    def _new_key_audit_results(self) -> Dict[str, Any]:
+        return {
+            'total_users_checked': 0,
+            'users_with_old_keys': [],
+            'users_with_unused_keys': [],
+            'users_with_multiple_keys': [],
+            'rotation_recommendations': []
+        }
+    
+    def _run_user_pipeline(self, stage: str, results: Dict[str, Any],
+                           audit_user: Callable[[Dict], Any],
+                           merge: Callable[[Dict[str, Any], Any], None],
+                           continuation: Optional[ContinuationManager]) -> Dict[str, Any]:
+        """ユーザー一覧をページ単位で取得しながらチャンクごとに並列監査し、結果を集約
+
+        チャンクの境界でチェックポイントを判定し、中断時は処理済みユーザー数を
+        カーソルとして保存する。
+        """
+        start = 0
+        if continuation:
+            start, partial = continuation.resume(stage)
+            if partial:
+                results = partial
+        
+        fingerprints = None
+        if self.incremental:
+            fingerprints = FingerprintCache(self.state_store, stage, self.current_date)
+            audit_user = self._reuse_unchanged(audit_user, fingerprints)
+        
+        # ユーザーごとの結果は集約と同時に出力先へ書き出す（継続呼び出しごとに別オブジェクト）
+        writer = self.output.segment(stage, start) if self.output else None
+        
+        processed = start
         try:
-            users_response = iam_client.list_users(PathPrefix='/itsandbox/')
-            users = users_response['Users']
-            
-            key_audit_results = {
-                'total_users_checked': len(users),
-                'users_with_old_keys': [],
-                'users_with_unused_keys': [],
-                'users_with_multiple_keys': [],
-                'rotation_recommendations': []
+            for chunk in self._stream_user_chunks(start):
+                # タイムアウト前に中断して継続呼び出しへ引き継ぎ
+                if continuation and continuation.should_yield():
+                    if fingerprints:
+                        fingerprints.save()
+                    if writer:
+                        writer.close()
+                    continuation.suspend(stage, processed, results)
+                    return results
+                
+                # 結果はユーザー一覧の順序で集約するため、逐次実行と同じ出力になる
+                for user, user_result in zip(chunk, bounded_map(audit_user, chunk, self.max_workers)):
+                    merge(results, user_result)
+                    if writer:
+                        writer.write(output_record(stage, user['UserName'], user_result))
+                
+                processed += len(chunk)
+                if continuation:
+                    continuation.record_progress(len(chunk))
+            
+            if writer:
+                writer.close()
+        except Exception:
+            if writer:
+                writer.abort()
+            raise
+        
+        if fingerprints:
+            fingerprints.save()
+            self.incremental_stats[stage] = fingerprints.stats()
+        
+        if continuation:
+            continuation.complete_stage(stage, results)
+        
+        return results
+    
+    def _reuse_unchanged(self, audit_user: Callable[[Dict], Any],
+                         fingerprints: FingerprintCache) -> Callable[[Dict], Any]:
+        """フィンガープリントが前回と同じユーザーは判定を再利用し、変化したユーザーのみ監査"""
+        settings = {
+            'checks_version': AUDIT_CHECKS_VERSION,
+            'unused_user_threshold_days': UNUSED_USER_THRESHOLD_DAYS,
+            'access_key_rotation_days': ACCESS_KEY_ROTATION_DAYS,
+            'compliance_rules': compliance_rules.rules_hash,
+        }
+        
+        def run(user: Dict) -> Any:
+            username = user['UserName']
+            row = self.iam_index.credential_row(username)
+            authorization = self.iam_index.user_authorization(username)
+            documents_hash = None
+            if authorization is not None:
+                documents_hash = self.policy_evaluator.policy_set(
+                    self.iam_index.authorization_snapshot(), authorization
+                ).documents_hash
+            fingerprint = user_fingerprint(row, authorization, settings, documents_hash)
+            if fingerprint is None:
+                # 認証情報レポートにない（レポート生成後に作成された等）ユーザーは毎回監査
+                return audit_user(user)
+            
+            result = fingerprints.lookup(username, fingerprint)
+            if result is not None:
+                return result
+            
+            result = audit_user(user)
+            # 経過日数を含む指摘は毎回再計算（レポートの日数を最新に保つ）
+            if not self._has_age_findings(result):
+                fingerprints.record(username, fingerprint, result, self._verdict_valid_until(row))
+            return result
+        
+        return run
+    
+    def _verdict_valid_until(self, row: Optional[Dict[str, Any]]) -> Optional[datetime]:
+        """時間経過だけで判定が変わりうる最初の時点（未使用・パスワード年齢・キー年齢の閾値）"""
+        if row is None:
+            return None
+        timestamps = [
+            row['user_creation_time'],
+            row['password_last_used'],
+            row['password_last_changed'],
+        ]
+        for report_key in row['access_keys']:
+            timestamps.extend([report_key['last_rotated'], report_key['last_used']])
+        return next_threshold_crossing(
+            timestamps,
+            (UNUSED_USER_THRESHOLD_DAYS, ACCESS_KEY_ROTATION_DAYS, 90, 30),
+            self.current_date
+        )
+    
+    def _has_age_findings(self, result: Any) -> bool:
+        parts = result if isinstance(result, (list, tuple)) else [result]
+        for part in parts:
+            if (part.get('password_age') or 0) > 90:
+                return True
+            if part.get('users_with_old_keys') or part.get('users_with_unused_keys'):
+                return True
+        return False
+    
+    def _stream_user_chunks(self, start: int = 0) -> Iterator[List[Dict]]:
+        """ユーザーを先頭から start 件読み飛ばし、AUDIT_CHUNK_SIZE 件ずつ返す"""
+        return batched(islice(self.iam_index.iter_users(), start, None), AUDIT_CHUNK_SIZE)
+    
+    def _audit_user_all(self, user: Dict) -> Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]:
+        """1ユーザー分のユーザーチェックとアクセスキーチェックを実行"""
+        return self._audit_user(user), self._audit_user_access_keys(user)
+    
+    def _merge_user_all(self, results: Dict[str, Any], user_result: Tuple[Dict, Dict]):
+        self._merge_user_result(results['audit_results'], user_result[0])
+        self._merge_access_key_result(results['key_audit_results'], user_result[1])
+        results['audited_usernames'].append(user_result[0]['username'])
+    
+    def _audit_user(self, user: Dict) -> Dict[str, Any]:
+        """1ユーザー分のチェックを実行（スレッドプールから並列に呼び出される）"""
+        username = user['UserName']
+        user_result = {'username': username}
+        
+        # 未使用ユーザーチェック
+        if self._is_user_unused(user):
+            user_result['unused'] = {
+                'username': username,
+                'last_activity': self._get_user_last_activity(username),
+                'created_date': user['CreateDate'].isoformat()
             }
+        
+        # MFAチェック
+        user_result['without_mfa'] = not self._has_mfa_enabled(username)
+        
+        # パスワード年齢チェック
+        user_result['password_age'] = self._get_password_age(username)
+        
+        # 権限過多チェック
+        user_result['excessive_permissions'] = self._has_excessive_permissions(username)
+        
+        # コンプライアンス違反チェック
+        user_result['violations'] = self._check_compliance_violations(username)
+        
+        return user_result
+    
+    def _merge_user_result(self, audit_results: Dict[str, Any], user_result: Dict[str, Any]):
+        """1ユーザー分の結果を監査結果に追加"""
+        username = user_result['username']
+        audit_results['total_users'] += 1
+        
+        if 'unused' in user_result:
+            audit_results['unused_users'].append(user_result['unused'])
+        
+        if user_result['without_mfa']:
+            audit_results['users_without_mfa'].append(username)
+        
+        password_age = user_result['password_age']
+        if password_age and password_age > 90:
+            audit_results['users_with_old_passwords'].append({
+                'username': username,
+                'password_age_days': password_age
+            })
+        
+        if user_result['excessive_permissions']:
+            audit_results['users_with_excessive_permissions'].append(username)
+        
+        if user_result['violations']:
+            audit_results['compliance_violations'].append({
+                'username': username,
+                'violations': user_result['violations']
+            })
+    
+    def _merge_access_key_result(self, key_audit_results: Dict[str, Any],
+                                 user_result: Dict[str, List[Dict[str, Any]]]):
+        """1ユーザー分のアクセスキーチェック結果を監査結果に追加"""
+        key_audit_results['total_users_checked'] += 1
+        for key, findings in user_result.items():
+            key_audit_results[key].extend(findings)
+    
+    def _audit_user_access_keys(self, user: Dict) -> Dict[str, List[Dict[str, Any]]]:
+        """1ユーザー分のアクセスキーチェックを実行（スレッドプールから並列に呼び出される）"""
+        user_result = {
+            'users_with_old_keys': [],
+            'users_with_unused_keys': [],
+            'users_with_multiple_keys': []
+        }
+        username = user['UserName']
+        
+        try:
+            # 認証情報レポートがあれば個別APIを呼ばずに判定
+            row = self.iam_index.credential_row(username)
+            if row is not None:
+                self._audit_report_access_keys(username, row, user_result)
+                return user_result
+            
+            # ユーザーのアクセスキーを取得
+            access_keys = self.iam_index.access_keys(username)
+            
+            if len(access_keys) > 1:
+                user_result['users_with_multiple_keys'].append({
+                    'username': username,
+                    'key_count': len(access_keys)
+                })
             
-            for user in users:
-                username = user['UserName']
+            for key in access_keys:
+                key_age = (self.current_date - key['CreateDate'].replace(tzinfo=None)).days
                 
-                try:
-                    # ユーザーのアクセスキーを取得
-                    keys_response = iam_client.list_access_keys(UserName=username)
-                    access_keys = keys_response['AccessKeyMetadata']
-                    
-                    if len(access_keys) > 1:
-                        key_audit_results['users_with_multiple_keys'].append({
+                # 古いキーのチェック
+                if key_age > ACCESS_KEY_ROTATION_DAYS:
+                    user_result['users_with_old_keys'].append({
+                        'username': username,
+                        'access_key_id': key['AccessKeyId'],
+                        'age_days': key_age,
+                        'status': key['Status']
+                    })
+                
+                # 未使用キーのチェック
+                if key['Status'] == 'Active':
+                    last_used = self._get_access_key_last_used(key['AccessKeyId'])
+                    if last_used and (self.current_date - last_used).days > 30:
+                        user_result['users_with_unused_keys'].append({
                             'username': username,
-                            'key_count': len(access_keys)
+                            'access_key_id': key['AccessKeyId'],
+                            'last_used': last_used.isoformat(),
+                            'unused_days': (self.current_date - last_used).days
                         })
-                    
-                    for key in access_keys:
-                        key_age = (self.current_date - key['CreateDate'].replace(tzinfo=None)).days
-                        
-                        # 古いキーのチェック
-                        if key_age > ACCESS_KEY_ROTATION_DAYS:
-                            key_audit_results['users_with_old_keys'].append({
-                                'username': username,
-                                'access_key_id': key['AccessKeyId'],
-                                'age_days': key_age,
-                                'status': key['Status']
-                            })
-                        
-                        # 未使用キーのチェック
-                        if key['Status'] == 'Active':
-                            last_used = self._get_access_key_last_used(key['AccessKeyId'])
-                            if last_used and (self.current_date - last_used).days > 30:
-                                key_audit_results['users_with_unused_keys'].append({
-                                    'username': username,
-                                    'access_key_id': key['AccessKeyId'],
-                                    'last_used': last_used.isoformat(),
-                                    'unused_days': (self.current_date - last_used).days
-                                })
-                
-                except Exception as e:
-                    logger.warning(f"ユーザー {username} のアクセスキーチェックに失敗: {str(e)}")
+        
+        except Exception as e:
+            log_aggregator.warning('アクセスキーチェック失敗', username, str(e))
+        
+        return user_result
+    
+    def _audit_report_access_keys(self, username: str, row: Dict[str, Any],
+                                  key_audit_results: Dict[str, Any]):
+        """認証情報レポートの行からアクセスキーを監査（指摘がある場合のみキーIDを取得）"""
+        report_keys = row['access_keys']
+        
+        if len(report_keys) > 1:
+            key_audit_results['users_with_multiple_keys'].append({
+                'username': username,
+                'key_count': len(report_keys)
+            })
+        
+        for report_key in report_keys:
+            key_age = (self.current_date - report_key['last_rotated']).days
+            last_used = report_key['last_used']
+            is_old = key_age > ACCESS_KEY_ROTATION_DAYS
+            is_unused = (
+                report_key['active'] and last_used is not None
+                and (self.current_date - last_used).days > 30
+            )
+            if not (is_old or is_unused):
+                continue
             
-            return key_audit_results
+            key = self._match_report_key(username, report_key)
+            access_key_id = key['AccessKeyId'] if key else f"slot-{report_key['slot']}"
+            status = key['Status'] if key else ('Active' if report_key['active'] else 'Inactive')
             
+            # 古いキーのチェック
+            if is_old:
+                key_audit_results['users_with_old_keys'].append({
+                    'username': username,
+                    'access_key_id': access_key_id,
+                    'age_days': key_age,
+                    'status': status
+                })
+            
+            # 未使用キーのチェック
+            if is_unused:
+                key_audit_results['users_with_unused_keys'].append({
+                    'username': username,
+                    'access_key_id': access_key_id,
+                    'last_used': last_used.isoformat(),
+                    'unused_days': (self.current_date - last_used).days
+                })
+    
+    def _match_report_key(self, username: str, report_key: Dict[str, Any]) -> Optional[Dict]:
+        """レポートのキースロットに対応するアクセスキー（作成日時で照合）"""
+        try:
+            for key in self.iam_index.access_keys(username):
+                create_date = key['CreateDate'].replace(tzinfo=None, microsecond=0)
+                if abs((create_date - report_key['last_rotated']).total_seconds()) < 2:
+                    return key
         except Exception as e:
-            logger.error(f"アクセスキー監査エラー: {str(e)}")
-            return {'error': str(e)}
+            log_aggregator.warning('アクセスキー照合失敗', username, str(e))
+        return None
     
     def _is_user_unused(self, user: Dict) -> bool:
-        """ユーザーが未使用かどうかを判定"""
+        """ユーザーが未使用かどうかを判定（作成・ログイン・アクセスキー使用のいずれも閾値より前）"""
         try:
             username = user['UserName']
             
-            # パスワードによるログイン履歴をチェック
-            try:
-                login_profile = iam_client.get_login_profile(UserName=username)
-                password_last_used = login_profile.get('LoginProfile', {}).get('PasswordLastUsed')
-                
-                if password_last_used:
-                    if password_last_used.replace(tzinfo=None) < self.unused_threshold:
-                        return True
-                else:
-                    # パスワードが一度も使用されていない場合
-                    create_date = user['CreateDate'].replace(tzinfo=None)
-                    if create_date < self.unused_threshold:
-                        return True
-            except iam_client.exceptions.NoSuchEntityException:
-                # コンソールアクセスなし（プログラムアクセスのみ）
-                pass
+            row = self.iam_index.credential_row(username)
+            if row is not None:
+                return self._is_report_row_unused(row)
             
-            # アクセスキーの使用履歴をチェック
-            try:
-                keys_response = iam_client.list_access_keys(UserName=username)
-                for key in keys_response['AccessKeyMetadata']:
-                    last_used = self._get_access_key_last_used(key['AccessKeyId'])
-                    if last_used and last_used > self.unused_threshold:
-                        return False
-            except Exception:
-                pass
+            # 閾値より後に作成されたユーザーはまだ判定しない
+            if user['CreateDate'].replace(tzinfo=None) >= self.unused_threshold:
+                return False
+            
+            # パスワードによるログイン履歴をチェック（PasswordLastUsed は list_users・get_user に含まれる）
+            password_last_used = user.get('PasswordLastUsed')
+            if password_last_used and password_last_used.replace(tzinfo=None) >= self.unused_threshold:
+                return False
+            
+            # アクセスキーの使用履歴をチェック（取得に失敗した場合は未使用と判定しない）
+            for key in self.iam_index.access_keys(username):
+                last_used = self.iam_index.access_key_last_used(key['AccessKeyId'])
+                if last_used and last_used >= self.unused_threshold:
+                    return False
             
             return True
             
         except Exception as e:
-            logger.warning(f"ユーザー {user['UserName']} の使用状況チェックに失敗: {str(e)}")
+            log_aggregator.warning('使用状況チェック失敗', user['UserName'], str(e))
             return False
     
+    def _is_report_row_unused(self, row: Dict[str, Any]) -> bool:
+        """認証情報レポートの行からユーザーが未使用かどうかを判定"""
+        # 閾値より後に作成されたユーザーはまだ判定しない
+        if row['user_creation_time'] and row['user_creation_time'] >= self.unused_threshold:
+            return False
+        
+        # コンソールログインのみのユーザーもパスワードの使用で利用中と判定
+        if row['password_last_used'] and row['password_last_used'] >= self.unused_threshold:
+            return False
+        
+        for report_key in row['access_keys']:
+            if report_key['last_used'] and report_key['last_used'] >= self.unused_threshold:
+                return False
+        
+        return True
+    
+    def _latest_activity(self, username: str) -> Optional[datetime]:
+        """作成・パスワード使用・アクセスキー使用のうち最新の日時（確認できない場合はNone）"""
+        try:
+            row = self.iam_index.credential_row(username)
+            if row is not None:
+                timestamps = [row['user_creation_time'], row['password_last_used']]
+                timestamps.extend(report_key['last_used'] for report_key in row['access_keys'])
+            else:
+                user = self.iam.get_user(UserName=username)['User']
+                timestamps = [user['CreateDate'], user.get('PasswordLastUsed')]
+                for key in self.iam_index.access_keys(username):
+                    timestamps.append(self.iam_index.access_key_last_used(key['AccessKeyId']))
+            timestamps = [timestamp.replace(tzinfo=None) for timestamp in timestamps if timestamp]
+            return max(timestamps) if timestamps else None
+        except Exception as e:
+            log_aggregator.warning('最終アクティビティ取得失敗', username, str(e))
+            return None
+    
     def _get_user_last_activity(self, username: str) -> str:
         """ユーザーの最終アクティビティを取得"""
         try:
+            row = self.iam_index.credential_row(username)
+            if row is not None:
+                if row['password_last_used']:
+                    return row['password_last_used'].isoformat()
+                key_last_used = [k['last_used'] for k in row['access_keys'] if k['last_used']]
+                return max(key_last_used).isoformat() if key_last_used else "Never"
+            
             # パスワードによるログイン
             try:
-                login_profile = iam_client.get_login_profile(UserName=username)
+                login_profile = self.iam.get_login_profile(UserName=username)
                 password_last_used = login_profile.get('LoginProfile', {}).get('PasswordLastUsed')
                 if password_last_used:
                     return password_last_used.isoformat()
-            except iam_client.exceptions.NoSuchEntityException:
+            except self.iam.exceptions.NoSuchEntityException:
                 pass
             
             # アクセスキーによるアクセス
             try:
-                keys_response = iam_client.list_access_keys(UserName=username)
                 latest_access = None
                 
-                for key in keys_response['AccessKeyMetadata']:
+                for key in self.iam_index.access_keys(username):
                     last_used = self._get_access_key_last_used(key['AccessKeyId'])
                     if last_used and (not latest_access or last_used > latest_access):
                         latest_access = last_used
@@ -218,111 +946,309 @@ class ITSANDBOXUserManager:
             return "Never"
             
         except Exception as e:
-            logger.warning(f"ユーザー {username} の最終アクティビティ取得に失敗: {str(e)}")
+            log_aggregator.warning('最終アクティビティ取得失敗', username, str(e))
             return "Unknown"
     
     def _get_access_key_last_used(self, access_key_id: str) -> datetime:
         """アクセスキーの最終使用日時を取得"""
         try:
-            response = iam_client.get_access_key_last_used(AccessKeyId=access_key_id)
-            last_used_date = response.get('AccessKeyLastUsed', {}).get('LastUsedDate')
-            
-            if last_used_date:
-                return last_used_date.replace(tzinfo=None)
-            
-            return None
-            
+            return self.iam_index.access_key_last_used(access_key_id)
         except Exception as e:
-            logger.warning(f"アクセスキー {access_key_id} の最終使用日時取得に失敗: {str(e)}")
+            log_aggregator.warning('アクセスキー最終使用日時取得失敗', access_key_id, str(e))
             return None
     
     def _has_mfa_enabled(self, username: str) -> bool:
         """ユーザーのMFA設定状況をチェック"""
         try:
-            response = iam_client.list_mfa_devices(UserName=username)
+            row = self.iam_index.credential_row(username)
+            if row is not None:
+                return row['mfa_active']
+            response = self.iam.list_mfa_devices(UserName=username)
             return len(response['MFADevices']) > 0
         except Exception as e:
-            logger.warning(f"ユーザー {username} のMFAチェックに失敗: {str(e)}")
+            log_aggregator.warning('MFAチェック失敗', username, str(e))
             return False
     
     def _get_password_age(self, username: str) -> int:
         """パスワードの年齢（日数）を取得"""
         try:
-            login_profile = iam_client.get_login_profile(UserName=username)
+            row = self.iam_index.credential_row(username)
+            if row is not None:
+                if not row['password_enabled']:
+                    return None
+                changed = row['password_last_changed'] or row['user_creation_time']
+                return (self.current_date - changed).days if changed else None
+            login_profile = self.iam.get_login_profile(UserName=username)
             create_date = login_profile['LoginProfile']['CreateDate'].replace(tzinfo=None)
             return (self.current_date - create_date).days
-        except iam_client.exceptions.NoSuchEntityException:
+        except self.iam.exceptions.NoSuchEntityException:
             return None
         except Exception as e:
-            logger.warning(f"ユーザー {username} のパスワード年齢取得に失敗: {str(e)}")
+            log_aggregator.warning('パスワード年齢取得失敗', username, str(e))
             return None
     
     def _has_excessive_permissions(self, username: str) -> bool:
         """ユーザーの権限過多をチェック"""
         try:
-            # 直接アタッチされたポリシーをチェック
-            attached_policies = iam_client.list_attached_user_policies(UserName=username)
-            
-            # 管理者権限ポリシーのチェック
-            admin_policies = [
-                'arn:aws:iam::aws:policy/AdministratorAccess',
-                'arn:aws:iam::aws:policy/PowerUserAccess'
-            ]
-            
-            for policy in attached_policies['AttachedPolicies']:
-                if policy['PolicyArn'] in admin_policies:
-                    return True
-            
-            # インラインポリシーのチェック
-            inline_policies = iam_client.list_user_policies(UserName=username)
-            if len(inline_policies['PolicyNames']) > 0:
-                return True
-            
-            return False
+            # 所属グループ・権限境界を含む実効権限をローカルで評価
+            # （スナップショットにないユーザーも個別APIで同じ認可情報を集め、定期監査と同じ判定にする）
+            snapshot, authorization = self.iam_index.authorization_for(username)
+            return len(self._privileged_permissions(username, authorization, snapshot)) > 0
             
         except Exception as e:
-            logger.warning(f"ユーザー {username} の権限チェックに失敗: {str(e)}")
+            log_aggregator.warning('権限チェック失敗', username, str(e))
             return False
     
+    def _privileged_permissions(self, username: str, authorization: Dict[str, Any],
+                                snapshot=None) -> List[str]:
+        """実効的に許可されている権限昇格・全権限の操作（simulate_principal_policy は使用しない）
+
+        同じポリシーセットのユーザー（同じグループのメンバー等）は評価結果を共有する。
+        """
+        granted, unresolved = self.policy_evaluator.user_privileged_permissions(
+            snapshot or self.iam_index.authorization_snapshot(), username, authorization
+        )
+        if unresolved:
+            log_aggregator.warning('ポリシー文書未解決', username, ', '.join(unresolved))
+        return granted
+    
     def _check_compliance_violations(self, username: str) -> List[str]:
         """コンプライアンス違反をチェック"""
-        violations = []
+        try:
+            if self.iam_index.user_authorization(username) is not None:
+                return self._compliance_violations_by_user().get(username, [])
+            
+            # スナップショット取得後に作成されたユーザー等は個別APIで情報を集めて評価
+            record = user_record(username, None)
+            if 'tags' in compliance_rules.fields:
+                try:
+                    user_tags_response = self.iam.list_user_tags(UserName=username)
+                    record['tags'] = {tag['Key']: tag['Value'] for tag in user_tags_response['Tags']}
+                except Exception:
+                    pass
+            if 'groups' in compliance_rules.fields:
+                try:
+                    groups_response = self.iam.list_groups_for_user(UserName=username)
+                    record['groups'] = [group['GroupName'] for group in groups_response['Groups']]
+                except Exception:
+                    pass
+            if 'path' in compliance_rules.fields:
+                try:
+                    record['path'] = self.iam.get_user(UserName=username)['User']['Path']
+                except Exception:
+                    pass
+            return compliance_rules.evaluate(record)
+            
+        except Exception as e:
+            log_aggregator.warning('コンプライアンスチェック失敗', username, str(e))
+            return [f"Compliance check failed: {str(e)}"]
+    
+    def _compliance_violations_by_user(self) -> Dict[str, List[str]]:
+        """スナップショットの全ユーザーへコンプライアンスルールを一括適用した結果"""
+        with self._compliance_lock:
+            if self._compliance_violations is None:
+                snapshot = self.iam_index.authorization_snapshot()
+                self._compliance_violations = compliance_rules.evaluate_all(
+                    user_record(username, authorization)
+                    for username, authorization in snapshot.users.items()
+                )
+        return self._compliance_violations
+    
+    def build_result_store(self, audit_results: Dict[str, Any],
+                           key_audit_results: Optional[Dict[str, Any]] = None,
+                           usage_results: Optional[Dict[str, Any]] = None) -> AuditResultStore:
+        """監査結果をユーザーID・チェック別ビットセットのストアに変換（IDは audit_all で監査した順）"""
+        return AuditResultStore.from_results(
+            self.audited_usernames, audit_results, key_audit_results, usage_results
+        )
+    
+    def risk_summary(self, result_store: AuditResultStore) -> Dict[str, Any]:
+        """チェック別件数と、複数の指摘が重なる高リスクユーザー"""
+        return {
+            'finding_counts': result_store.counts(),
+            # MFA未設定かつ（古いキー・権限過多のいずれか）
+            'high_risk_users': result_store.query(
+                all_of=['no_mfa'], any_of=['old_access_key', 'excessive_permissions']
+            )
+        }
+    
+    def _audit_state_store(self):
+        return self.state_store or open_state_store('iam-audit')
+    
+    def _persistent_audit_state_store(self, purpose: str):
+        """実行をまたいで読み直す状態（監査インデックス・監査履歴）の保存先"""
+        state_store = self._audit_state_store()
+        if not state_store.persistent:
+            raise RuntimeError(
+                f"STATE_BUCKET が未設定のため{purpose}を保持できません"
+                f"（Lambdaの /tmp は実行環境ごとに別です）"
+            )
+        return state_store
+    
+    def save_audit_index(self) -> Optional[Dict[str, Any]]:
+        """この実行で得た監査結果を検索用インデックスへ反映（実行しなかった監査のチェックは前回の値を保持）"""
+        if not self.index_updates:
+            return None
         
+        state_store = self._persistent_audit_state_store('監査インデックス')
         try:
-            # 必須タグのチェック
-            try:
-                user_tags_response = iam_client.list_user_tags(UserName=username)
-                user_tags = {tag['Key']: tag['Value'] for tag in user_tags_response['Tags']}
-                
-                required_tags = ['Project', 'Owner', 'Role']
-                for required_tag in required_tags:
-                    if required_tag not in user_tags:
-                        violations.append(f"Required tag '{required_tag}' is missing")
-            except Exception:
-                violations.append("Unable to check user tags")
+            index = AuditIndex.load(state_store) or AuditIndex()
+        except ValueError as e:
+            logger.warning(f"監査インデックスを再作成します: {str(e)}")
+            index = AuditIndex()
+        
+        # 対象ユーザーとタグは取得済みのスナップショットから（追加のAPI呼び出しなし）
+        snapshot = self.iam_index.authorization_snapshot()
+        if snapshot is not None:
+            user_tags = {
+                username: user['tags'] for username, user in snapshot.users.items()
+                if user['path'].startswith(self.iam_index.path_prefix)
+            }
+        else:
+            user_tags = {user['UserName']: {} for user in self.iam_index.iter_users()}
+        
+        generated_at = self.current_date.isoformat()
+        index.set_users(user_tags, generated_at)
+        index.update(generated_at, **self.index_updates)
+        index.save(state_store)
+        return {'users': len(user_tags), 'generated_at': generated_at}
+    
+    def query_audit(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """直近の監査インデックスをユーザー・チェック・タグで検索（IAMは呼び出さない）
+
+        ユーザー指定:   {"username": "itsandbox-a"}
+        チェック条件:   {"checks": ["no_mfa"], "any_of": [...], "none_of": [...]}
+        準拠状況:       {"compliant": false}
+        タグ:           {"tags": {"Project": "website"}}
+        ページング:     {"limit": 50, "cursor": "<前回の next_cursor>"}
+        """
+        try:
+            index = AuditIndex.load(self._persistent_audit_state_store('監査インデックス'))
+            if index is None:
+                return {'error': '監査インデックスがありません。先に監査を実行してください'}
+            
+            response = {'generated_at': index.generated_at, 'checked_at': index.checked_at}
+            
+            if query.get('username'):
+                user = index.user(query['username'])
+                if user is None:
+                    return dict(response, error=f"ユーザーが監査インデックスにありません: {query['username']}")
+                return dict(response, user=user)
+            
+            all_of = list(query.get('checks') or ([query['check']] if query.get('check') else []))
+            any_of = list(query.get('any_of') or [])
+            none_of = list(query.get('none_of') or [])
+            unknown_checks = sorted(set(all_of + any_of + none_of) - set(ALL_AUDIT_CHECKS))
+            if unknown_checks:
+                return dict(response, error=f"不明なチェックです: {', '.join(unknown_checks)}",
+                            available_checks=list(ALL_AUDIT_CHECKS))
+            if 'compliant' in query:
+                if query['compliant']:
+                    none_of += list(ALL_AUDIT_CHECKS)
+                else:
+                    any_of += list(ALL_AUDIT_CHECKS)
+            tags = [tag_filter(key, value) for key, value in (query.get('tags') or {}).items()]
             
-            # 命名規則のチェック
-            if not username.startswith('itsandbox-'):
-                violations.append("Username does not follow naming convention (should start with 'itsandbox-')")
+            bitset = index.select(all_of, any_of, none_of, tags)
+            usernames, next_cursor = index.page(
+                bitset, query.get('cursor'), int(query.get('limit', DEFAULT_PAGE_SIZE))
+            )
+            return dict(
+                response,
+                total=bitset.bit_count(),
+                users=[index.user(username) for username in usernames],
+                next_cursor=next_cursor
+            )
+            
+        except Exception as e:
+            logger.error(f"監査結果検索エラー: {str(e)}")
+            return {'error': str(e)}
+    
+    def reaudit_user(self, username: str) -> Dict[str, Any]:
+        """IAM変更イベントを受けて1ユーザーだけ再監査し、検索用インデックスの該当ユーザーを更新
+
+        削除されたユーザー・監査対象パス外のユーザーはインデックスから外す。
+        サービス利用状況のチェックは次回の定期監査で更新する。
+        """
+        try:
+            state_store = self._persistent_audit_state_store('監査インデックス')
+            try:
+                index = AuditIndex.load(state_store) or AuditIndex()
+            except ValueError as e:
+                logger.warning(f"監査インデックスを再作成します: {str(e)}")
+                index = AuditIndex()
+            previous = index.user(username)
+            previous_checks = previous['checks'] if previous else []
             
-            # グループメンバーシップのチェック
             try:
-                groups_response = iam_client.get_groups_for_user(UserName=username)
-                groups = [group['GroupName'] for group in groups_response['Groups']]
-                
-                itsandbox_groups = [g for g in groups if g.startswith('ITSANDBOX')]
-                if not itsandbox_groups:
-                    violations.append("User is not member of any ITSANDBOX groups")
-            except Exception:
-                violations.append("Unable to check group membership")
+                user = self.iam.get_user(UserName=username)['User']
+            except self.iam.exceptions.NoSuchEntityException:
+                user = None
+            
+            if user is None or not user['Path'].startswith(self.iam_index.path_prefix):
+                removed = index.remove_user(username)
+                if removed:
+                    index.save(state_store)
+                return {
+                    'username': username,
+                    'removed': removed,
+                    'checks': [],
+                    'new_checks': [],
+                    'resolved_checks': previous_checks
+                }
+            
+            audit_results = self._new_audit_results()
+            key_audit_results = self._new_key_audit_results()
+            self._merge_user_result(audit_results, self._audit_user(user))
+            self._merge_access_key_result(key_audit_results, self._audit_user_access_keys(user))
+            
+            tags = {tag['Key']: tag['Value'] for tag in user.get('Tags', [])}
+            index.replace_user(username, tags, self.current_date.isoformat(),
+                               audit_results, key_audit_results)
+            index.save(state_store)
+            
+            checks = index.user(username)['checks']
+            return {
+                'username': username,
+                'checks': checks,
+                'new_checks': [check for check in checks if check not in previous_checks],
+                'resolved_checks': [check for check in previous_checks if check not in checks]
+            }
             
         except Exception as e:
-            logger.warning(f"ユーザー {username} のコンプライアンスチェックに失敗: {str(e)}")
-            violations.append(f"Compliance check failed: {str(e)}")
-        
-        return violations
+            logger.error(f"ユーザー再監査エラー {username}: {str(e)}")
+            return {'username': username, 'error': str(e)}
+    
+    def create_iam_change_report(self, summary: Dict[str, Any],
+                                 reaudits: List[Dict[str, Any]]) -> str:
+        """IAM変更イベントで新たに検出された指摘の通知文"""
+        report = f"""
+⚡ ITSANDBOX IAM変更検知
+イベント: {summary['event_name']}（{summary['event_time']}）
+実行者: {summary['actor']}"""
+        for reaudit in reaudits:
+            if reaudit.get('new_checks'):
+                labels = [TREND_CHECK_LABELS.get(check, check) for check in reaudit['new_checks']]
+                report += f"\n• {reaudit['username']}: {', '.join(labels)}"
+        return report
+    
+    def record_history(self, result_store: AuditResultStore) -> Dict[str, Any]:
+        """監査履歴へ今回の結果を追記し、チェック別件数と7日・30日前からの増減を返す"""
+        history = AuditHistory(self._persistent_audit_state_store('監査履歴'))
+        today = self.current_date.date()
+        counts = result_store.counts()
+        changes = history.record(today, result_store)
+        trend = {
+            'counts': counts,
+            'deltas': history.deltas(today, counts, TREND_PERIODS_DAYS),
+            'changes': changes,
+        }
+        history.compact(today)
+        return trend
     
-    def create_audit_report(self, audit_results: Dict[str, Any], key_audit_results: Dict[str, Any]) -> str:
+    def create_audit_report(self, audit_results: Dict[str, Any], key_audit_results: Dict[str, Any],
+                            risk_summary: Optional[Dict[str, Any]] = None,
+                            trend: Optional[Dict[str, Any]] = None) -> str:
         """監査レポートを生成"""
         report = f"""
 🔐 ITSANDBOX IAM セキュリティ監査レポート
@@ -340,10 +1266,51 @@ class ITSANDBOXUserManager:
 • チェック対象ユーザー数: {key_audit_results.get('total_users_checked', 0)}
 • 古いキーを持つユーザー: {len(key_audit_results.get('users_with_old_keys', []))}
 • 未使用キーを持つユーザー: {len(key_audit_results.get('users_with_unused_keys', []))}
-• 複数キーを持つユーザー: {len(key_audit_results.get('users_with_multiple_keys', []))}
+• 複数キーを持つユーザー: {len(key_audit_results.get('users_with_multiple_keys', []))}"""
+        
+        role_audit = audit_results.get('role_audit') or {}
+        group_audit = audit_results.get('group_audit') or {}
+        if role_audit and 'error' not in role_audit:
+            report += f"""
 
-⚠️ 要対応項目:"""
+🎭 ロール・グループ監査結果:
+• 対象ロール数: {role_audit['total_roles']}
+• 未使用ロール: {len(role_audit['unused_roles'])}
+• 信頼ポリシーに不備のあるロール: {len(role_audit['roles_with_risky_trust'])}
+• ワイルドカード権限のロール: {len(role_audit['roles_with_wildcard_permissions'])}
+• 権限過多ロール: {len(role_audit['roles_with_excessive_permissions'])}
+• 対象グループ数: {group_audit.get('total_groups', 0)}
+• メンバーのいないグループ: {len(group_audit.get('empty_groups', []))}
+• ワイルドカード権限のグループ: {len(group_audit.get('groups_with_wildcard_permissions', []))}
+• 権限過多グループ: {len(group_audit.get('groups_with_excessive_permissions', []))}"""
+        
+        report += "\n\n⚠️ 要対応項目:"
 
+        if risk_summary and risk_summary['high_risk_users']:
+            high_risk_users = risk_summary['high_risk_users']
+            report += f"\n\n🚨 高リスクユーザー（MFA未設定かつ古いキーまたは権限過多） ({len(high_risk_users)}):"
+            for username in high_risk_users[:5]:
+                report += f"\n• {username}"
+            if len(high_risk_users) > 5:
+                report += f"\n• ... 他{len(high_risk_users) - 5}件"
+        
+        if trend and trend['deltas']:
+            report += "\n\n📈 推移:"
+            for check, label in TREND_CHECK_LABELS.items():
+                deltas = ', '.join(
+                    f"{period.rstrip('d')}日: {period_deltas.get(check, 0):+d}"
+                    for period, period_deltas in trend['deltas'].items()
+                )
+                report += f"\n• {label}: {trend['counts'].get(check, 0)} ({deltas})"
+        
+        if role_audit.get('roles_with_risky_trust'):
+            risky_roles = role_audit['roles_with_risky_trust']
+            report += f"\n\n🎭 信頼ポリシーに不備のあるロール ({len(risky_roles)}):"
+            for role in risky_roles[:5]:
+                report += f"\n• {role['role_name']}: {role['findings'][0]}"
+            if len(risky_roles) > 5:
+                report += f"\n• ... 他{len(risky_roles) - 5}件"
+        
         # 詳細な要対応項目
         if audit_results.get('unused_users'):
             report += f"\n\n🚫 未使用ユーザー ({len(audit_results['unused_users'])}):"
@@ -380,6 +1347,50 @@ class ITSANDBOXUserManager:
         
         return report
     
+    def create_organization_report(self, org_results: Dict[str, Any]) -> str:
+        """組織監査の統合レポート（統合結果のレポートにアカウント別の内訳を追加）"""
+        report = self.create_audit_report(
+            org_results['audit_results'], org_results['key_audit_results'], org_results['risk_summary']
+        )
+        
+        accounts = org_results['accounts']
+        report += f"\n\n🏢 アカウント別結果 ({len(accounts)}アカウント、失敗 {len(org_results['failed_accounts'])}):"
+        for account in accounts:
+            if 'error' in account:
+                report += f"\n• {account['name']} ({account['account_id']}): 監査失敗 - {account['error']}"
+            else:
+                report += (
+                    f"\n• {account['name']} ({account['account_id']}): "
+                    f"ユーザー {account['total_users']}人、高リスク {account['high_risk_users']}人"
+                )
+                if account.get('principal_audit_errors'):
+                    report += f"（ロール・グループ監査失敗: {', '.join(sorted(account['principal_audit_errors']))}）"
+        
+        return report
+    
+    def create_remediation_report(self, remediation: Dict[str, Any]) -> str:
+        """自動修復の結果（dry_run の場合は計画）のレポート"""
+        mode = '計画のみ（dry run）' if remediation['dry_run'] else '実行'
+        report = f"""
+🧹 ITSANDBOX 不要アイデンティティ自動修復
+実行日時: {self.current_date.strftime('%Y-%m-%d %H:%M UTC')}
+モード: {mode}
+
+• 対象操作: {remediation['planned']}
+• 成功: {len(remediation['remediated'])}
+• 失敗: {len(remediation['failed'])}
+• 対象外（許可リスト・除外タグ・無効化済み等）: {len(remediation['skipped'])}"""
+        
+        for result in remediation['remediated'][:20]:
+            target = result.get('access_key_id') or result['username']
+            report += f"\n  - {result['action']}: {target}"
+        if len(remediation['remediated']) > 20:
+            report += f"\n  - 他 {len(remediation['remediated']) - 20}件"
+        for result in remediation['failed']:
+            report += f"\n  ❌ {result['username']}: {result['error']}"
+        
+        return report
+    
     def send_notification(self, report: str, is_critical: bool = False):
         """通知を送信"""
         try:
@@ -409,74 +1420,310 @@ class ITSANDBOXUserManager:
         except Exception as e:
             logger.error(f"通知送信エラー: {str(e)}")
 
+def run_action(user_manager: ITSANDBOXUserManager, action: str,
+               continuation: ContinuationManager, metrics: InvocationMetrics,
+               event: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """単一アクションを実行し、レスポンス本文を返す（中断時は空の辞書）"""
+    if action == 'audit_users':
+        # ユーザー監査実行
+        audit_results = user_manager.audit_users(continuation)
+        if continuation.suspended:
+            return {}
+        user_manager.index_updates['audit_results'] = audit_results
+        logger.info(
+            f"ユーザー監査完了: {audit_results.get('total_users', 0)}人をチェック",
+            extra=log_fields(always=True, action=action, total_users=audit_results.get('total_users', 0))
+        )
+        
+        return {
+            'message': 'User audit completed successfully',
+            'audit_results': audit_results
+        }
+    
+    elif action == 'audit_access_keys':
+        # アクセスキー監査実行
+        key_audit_results = user_manager.audit_access_keys(continuation)
+        if continuation.suspended:
+            return {}
+        user_manager.index_updates['key_audit_results'] = key_audit_results
+        logger.info(
+            f"アクセスキー監査完了: {key_audit_results.get('total_users_checked', 0)}人をチェック",
+            extra=log_fields(always=True, action=action,
+                             total_users_checked=key_audit_results.get('total_users_checked', 0))
+        )
+        
+        return {
+            'message': 'Access key audit completed successfully',
+            'key_audit_results': key_audit_results
+        }
+    
+    elif action == 'audit_service_usage':
+        # Access Advisor による未使用サービス監査
+        usage_results = user_manager.audit_service_usage(continuation)
+        if continuation.suspended:
+            return {}
+        user_manager.index_updates['usage_results'] = usage_results
+        logger.info(
+            f"サービス利用状況監査完了: {len(usage_results.get('users_with_unused_services', []))}人に未使用サービス",
+            extra=log_fields(always=True, action=action, total_users=usage_results.get('total_users', 0),
+                             pending_users=len(usage_results.get('pending_users', [])))
+        )
+        
+        return {
+            'message': 'Service usage audit completed successfully',
+            'usage_results': usage_results
+        }
+    
+    elif action == 'full_audit':
+        # 完全監査実行（中断時は継続呼び出しで残りのステージを実行）
+        audit_results, key_audit_results = user_manager.audit_all(continuation)
+        if continuation.suspended:
+            return {}
+        
+        user_manager.index_updates.update(audit_results=audit_results, key_audit_results=key_audit_results)
+        
+        # 指摘の組み合わせはビットセットで集計
+        result_store = user_manager.build_result_store(audit_results, key_audit_results)
+        risk_summary = user_manager.risk_summary(result_store)
+        
+        # 監査履歴の記録と推移（失敗しても監査結果の通知は継続）
+        trend = None
+        try:
+            with metrics.stage('record_history'):
+                trend = user_manager.record_history(result_store)
+        except Exception as e:
+            logger.warning(f"監査履歴の記録に失敗しました: {str(e)}")
+        
+        # レポート生成
+        report = user_manager.create_audit_report(audit_results, key_audit_results, risk_summary, trend)
+        
+        # 緊急レベル判定
+        critical_issues = (
+            len(audit_results.get('users_with_excessive_permissions', [])) +
+            len(audit_results.get('compliance_violations', [])) +
+            len(audit_results.get('role_audit', {}).get('roles_with_risky_trust', []))
+        )
+        is_critical = critical_issues >= 3
+        
+        # 通知送信
+        with metrics.stage('send_notification'):
+            user_manager.send_notification(report, is_critical)
+        
+        return {
+            'message': 'Full audit completed successfully',
+            'audit_results': audit_results,
+            'key_audit_results': key_audit_results,
+            'risk_summary': risk_summary,
+            'trend': trend,
+            'is_critical': is_critical
+        }
+    
+    elif action == 'org_audit':
+        # 組織内の全アカウントを監査し、統合レポートを送信
+        org_results = user_manager.audit_organization(continuation)
+        if continuation.suspended:
+            return {}
+        if 'error' in org_results:
+            raise RuntimeError(f"組織監査に失敗しました: {org_results['error']}")
+        logger.info(
+            f"組織監査完了: {len(org_results['accounts'])}アカウント",
+            extra=log_fields(always=True, action=action, accounts=len(org_results['accounts']),
+                             failed_accounts=org_results['failed_accounts'])
+        )
+        
+        audit_results = org_results['audit_results']
+        report = user_manager.create_organization_report(org_results)
+        is_critical = (
+            len(audit_results.get('users_with_excessive_permissions', [])) +
+            len(audit_results.get('compliance_violations', []))
+        ) >= 3 or bool(org_results['failed_accounts'])
+        
+        with metrics.stage('send_notification'):
+            user_manager.send_notification(report, is_critical)
+        
+        return {
+            'message': 'Organization audit completed successfully',
+            'organization_results': org_results,
+            'is_critical': is_critical
+        }
+    
+    elif action == 'remediate':
+        # 監査結果から不要アイデンティティを修復（既定は dry_run で計画のみ）
+        audit_results, key_audit_results = user_manager.audit_all(continuation)
+        if continuation.suspended:
+            return {}
+        if 'error' in audit_results:
+            raise RuntimeError(f"監査に失敗したため修復を中止しました: {audit_results['error']}")
+        user_manager.index_updates.update(audit_results=audit_results, key_audit_results=key_audit_results)
+        
+        remediation = user_manager.remediate_stale_identities(
+            audit_results, key_audit_results,
+            dry_run=(event or {}).get('dry_run', REMEDIATION_DRY_RUN),
+            allow_list=REMEDIATION_ALLOW_LIST + list((event or {}).get('allow_list') or []),
+            continuation=continuation
+        )
+        if continuation.suspended:
+            return {}
+        if 'error' in remediation:
+            raise RuntimeError(f"自動修復に失敗しました: {remediation['error']}")
+        logger.info(
+            f"自動修復完了: {len(remediation['remediated'])}/{remediation['planned']}件"
+            f"{'（dry run）' if remediation['dry_run'] else ''}",
+            extra=log_fields(always=True, action=action, dry_run=remediation['dry_run'],
+                             planned=remediation['planned'], failed=len(remediation['failed']),
+                             skipped=len(remediation['skipped']))
+        )
+        
+        if remediation['planned']:
+            with metrics.stage('send_notification'):
+                user_manager.send_notification(
+                    user_manager.create_remediation_report(remediation), bool(remediation['failed'])
+                )
+        
+        return {
+            'message': 'Remediation completed successfully',
+            'remediation': remediation
+        }
+    
+    elif action == 'query_audit':
+        # 永続化済みの監査インデックスを検索（IAMは呼び出さない）
+        return user_manager.query_audit(event or {})
+    
+    raise ValueError(f'Unknown action: {action}')
+
+def handle_iam_change_event(event: Dict[str, Any], metrics: InvocationMetrics) -> Dict[str, Any]:
+    """IAM変更イベント（CloudTrail）の対象ユーザーを再監査し、新たな指摘があれば通知"""
+    summary = event_summary(event)
+    usernames = affected_usernames(event)
+    metrics.set_property('Actions', ['reaudit_user'])
+    metrics.set_property('IAMEvent', summary['event_name'])
+    
+    # 数ユーザーのために認証情報レポート・スナップショットを一括取得しない
+    user_manager = ITSANDBOXUserManager(IAMEntityIndex(iam_client, bulk=False), max_workers=1)
+    reaudits = []
+    for username in usernames:
+        with metrics.stage('reaudit_user'):
+            reaudits.append(user_manager.reaudit_user(username))
+    
+    new_checks = {check for reaudit in reaudits for check in reaudit.get('new_checks', [])}
+    if new_checks:
+        report = user_manager.create_iam_change_report(summary, reaudits)
+        user_manager.send_notification(report, 'excessive_permissions' in new_checks)
+    
+    logger.info(
+        f"IAM変更イベント {summary['event_name']}: {len(usernames)}ユーザーを再監査",
+        extra=log_fields(always=True, iam_event=summary)
+    )
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'event': summary, 'reaudits': reaudits})
+    }
+
 def lambda_handler(event, context):
-    """Lambda エントリーポイント"""
+    """Lambda エントリーポイント
+
+    単一アクション: {"action": "audit_users"}
+    バッチ実行:     {"actions": ["audit_users", "audit_access_keys"]}
+    逐次実行:       {"action": "full_audit", "parallel": false}
+    全員を再評価:   {"action": "full_audit", "incremental": false}
+    組織横断監査:   {"action": "org_audit"}
+    監査結果の検索: {"action": "query_audit", "checks": ["no_mfa"], "limit": 50}
+    自動修復:       {"action": "remediate", "dry_run": false, "allow_list": ["itsandbox-svc-*"]}
+    NDJSON出力:     {"action": "full_audit", "stream_output": true}（レスポンスは件数とマニフェスト）
+    IAM変更イベント: EventBridge の "AWS API Call via CloudTrail"（対象ユーザーのみ再監査）
+    バッチ内の全アクションは同じIAMエンティティインデックスを共有するため、
+    認証情報レポート・認可情報・アクセスキーの取得は1回の呼び出しにつき一度だけ実行される。
+    """
+    # 構造化ログ（サンプリング有効）とAPI呼び出し・ステージ時間の集計を開始
+    configure_logging(context)
+    metrics = start_invocation_metrics(context)
+    
     try:
-        user_manager = ITSANDBOXUserManager()
-        action = event.get('action', 'audit_users')
+        # EventBridge 経由のIAM変更イベントは対象ユーザーだけを再監査
+        if is_iam_change_event(event):
+            return handle_iam_change_event(event, metrics)
         
-        if action == 'audit_users':
-            # ユーザー監査実行
-            audit_results = user_manager.audit_users()
-            logger.info(f"ユーザー監査完了: {audit_results.get('total_users', 0)}人をチェック")
-            
-            # 結果を返す
-            return {
-                'statusCode': 200,
-                'body': json.dumps({
-                    'message': 'User audit completed successfully',
-                    'audit_results': audit_results
-                })
-            }
+        # parallel=false で逐次実行（結果は並列実行と同一）
+        # incremental=false で全ユーザーを再評価
+        user_manager = ITSANDBOXUserManager(
+            max_workers=AUDIT_MAX_WORKERS if event.get('parallel', True) else 1,
+            incremental=event.get('incremental', INCREMENTAL_AUDIT)
+        )
+        actions = event.get('actions') or [event.get('action', 'audit_users')]
+        continuation = ContinuationManager(event, context)
+        metrics.set_property('Actions', actions)
         
-        elif action == 'audit_access_keys':
-            # アクセスキー監査実行
-            key_audit_results = user_manager.audit_access_keys()
-            logger.info(f"アクセスキー監査完了: {key_audit_results.get('total_users_checked', 0)}人をチェック")
-            
+        # stream_output=true でユーザーごとの結果をNDJSONへ書き出し、レスポンスは件数とマニフェストのみ
+        if event.get('stream_output', AUDIT_OUTPUT_STREAMING) and set(actions) & set(STREAMED_ACTIONS):
+            user_manager.output = AuditOutputStream(open_output_sink('iam-audit'), continuation.run_id)
+        
+        unknown_actions = [action for action in actions if action not in SUPPORTED_ACTIONS]
+        if unknown_actions:
             return {
-                'statusCode': 200,
+                'statusCode': 400,
                 'body': json.dumps({
-                    'message': 'Access key audit completed successfully',
-                    'key_audit_results': key_audit_results
+                    'message': f'Unknown action: {", ".join(unknown_actions)}'
                 })
             }
         
-        elif action == 'full_audit':
-            # 完全監査実行
-            audit_results = user_manager.audit_users()
-            key_audit_results = user_manager.audit_access_keys()
-            
-            # レポート生成
-            report = user_manager.create_audit_report(audit_results, key_audit_results)
-            
-            # 緊急レベル判定
-            critical_issues = (
-                len(audit_results.get('users_with_excessive_permissions', [])) +
-                len(audit_results.get('compliance_violations', []))
+        results = {}
+        for action in actions:
+            with metrics.stage(action):
+                results[action] = run_action(user_manager, action, continuation, metrics, event)
+            if continuation.suspended:
+                return continuation.suspended_response(f'{action} continues asynchronously')
+        
+        continuation.finish()
+        
+        # 検索用インデックスの更新（失敗しても監査結果は返す）
+        if user_manager.index_updates:
+            try:
+                with metrics.stage('save_audit_index'):
+                    user_manager.save_audit_index()
+            except Exception as e:
+                logger.warning(f"監査インデックスの保存に失敗しました: {str(e)}")
+        
+        cache_stats = user_manager.iam_index.cache_stats()
+        metrics.set_property('IAMCacheHitRate', cache_stats['hit_rate'])
+        logger.info(
+            f"IAM参照キャッシュ: ヒット率 {cache_stats['hit_rate']:.1%}",
+            extra=log_fields(always=True, iam_cache=cache_stats)
+        )
+        metrics.set_property('PolicyEvaluation', user_manager.policy_evaluator.stats())
+        if user_manager.incremental_stats:
+            metrics.set_property('IncrementalAudit', user_manager.incremental_stats)
+            logger.info(
+                "増分監査: 前回の判定を再利用",
+                extra=log_fields(always=True, incremental=user_manager.incremental_stats)
             )
-            is_critical = critical_issues >= 3
-            
-            # 通知送信
-            user_manager.send_notification(report, is_critical)
-            
-            return {
-                'statusCode': 200,
-                'body': json.dumps({
-                    'message': 'Full audit completed successfully',
-                    'audit_results': audit_results,
-                    'key_audit_results': key_audit_results,
-                    'is_critical': is_critical
-                })
-            }
         
+        manifest = None
+        if user_manager.output:
+            # 出力済みの結果はレスポンスに含めず件数に置き換え
+            for action in actions:
+                if action in STREAMED_ACTIONS:
+                    results[action] = result_counts(results[action])
+            with metrics.stage('write_output_manifest'):
+                manifest = user_manager.output.write_manifest(
+                    user_manager.current_date.isoformat(),
+                    {action: results[action] for action in actions if action in STREAMED_ACTIONS},
+                    actions
+                )
+        
+        if 'actions' not in event:
+            body = results[actions[0]]
         else:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({
-                    'message': f'Unknown action: {action}'
-                })
+            body = {
+                'message': 'Batch completed successfully',
+                'results': results
             }
+        if manifest:
+            body = dict(body, output=manifest)
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps(body)
+        }
         
     except Exception as e:
         logger.error(f"Lambda実行エラー: {str(e)}")
@@ -498,6 +1745,10 @@ def lambda_handler(event, context):
                 'error': str(e)
             })
         }
+    
+    finally:
+        log_aggregator.flush()
+        metrics.emit()
 
 # ローカルテスト用
 if __name__ == "__main__":
@@ -4,22 +4,29 @@ ITSANDBOX User Onboarding Lambda Function
 """
 
 import json
-import boto3
 import os
 import string
 import secrets
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import logging
 
+from itsandbox_common import (
+    ContinuationManager,
+    configure_logging,
+    create_client,
+    log_fields,
+    start_invocation_metrics,
+)
+
 # ログ設定
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# AWS clients
-iam_client = boto3.client('iam')
-sns_client = boto3.client('sns')
-ses_client = boto3.client('ses')
+# AWS clients（共通の接続プール・リトライ設定）
+iam_client = create_client('iam')
+sns_client = create_client('sns')
+ses_client = create_client('ses')
 
 # 環境変数
 ADMIN_GROUP_NAME = os.environ.get('ADMIN_GROUP_NAME', 'ITSANDBOXAdmins')
@@ -253,8 +260,13 @@ class ITSANDBOXUserOnboarding:
                 'message': f'Failed to rotate access keys: {str(e)}'
             }
     
-    def bulk_onboard_users(self, users_data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """複数ユーザーの一括オンボーディング"""
+    def bulk_onboard_users(self, users_data: List[Dict[str, Any]],
+                           continuation: Optional[ContinuationManager] = None) -> Dict[str, Any]:
+        """複数ユーザーの一括オンボーディング
+
+        continuation を指定すると、残り実行時間が少なくなった時点で
+        処理済み件数と途中結果を保存し、非同期の再呼び出しで続きから処理する。
+        """
         try:
             results = {
                 'total_users': len(users_data),
@@ -263,7 +275,18 @@ class ITSANDBOXUserOnboarding:
                 'summary': {}
             }
             
-            for user_data in users_data:
+            start = 0
+            if continuation:
+                start, partial = continuation.resume('bulk_onboard')
+                if partial:
+                    results = partial
+            
+            for index in range(start, len(users_data)):
+                if continuation and continuation.should_yield():
+                    continuation.suspend('bulk_onboard', index, results)
+                    return results
+                
+                user_data = users_data[index]
                 result = self.create_user(user_data)
                 
                 if result['success']:
@@ -276,6 +299,9 @@ class ITSANDBOXUserOnboarding:
                         'username': user_data.get('username', 'unknown'),
                         'error': result['error']
                     })
+                
+                if continuation:
+                    continuation.record_progress()
             
             results['summary'] = {
                 'success_count': len(results['successful']),
@@ -283,6 +309,11 @@ class ITSANDBOXUserOnboarding:
                 'success_rate': (len(results['successful']) / len(users_data)) * 100
             }
             
+            logger.info(
+                "一括オンボーディング完了",
+                extra=log_fields(always=True, **results['summary'])
+            )
+            
             # 一括オンボーディング結果を通知
             self._send_bulk_onboarding_notification(results)
             
@@ -427,70 +458,86 @@ ITSANDBOX 一括ユーザーオンボーディングが完了しました。
         except Exception as e:
             logger.error(f"一括オンボーディング通知エラー: {str(e)}")
 
-def lambda_handler(event, context):
-    """Lambda エントリーポイント"""
-    try:
-        onboarding = ITSANDBOXUserOnboarding()
-        action = event.get('action', 'create_user')
+def run_action(onboarding: ITSANDBOXUserOnboarding, action: str,
+                     event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """アクションを実行してLambdaレスポンスを返す"""
+    if action == 'create_user':
+        user_data = event.get('user_data', {})
+        result = onboarding.create_user(user_data)
         
-        if action == 'create_user':
-            user_data = event.get('user_data', {})
-            result = onboarding.create_user(user_data)
-            
-            return {
-                'statusCode': 200 if result['success'] else 400,
-                'body': json.dumps(result)
-            }
+        return {
+            'statusCode': 200 if result['success'] else 400,
+            'body': json.dumps(result)
+        }
+    
+    elif action == 'update_role':
+        username = event.get('username')
+        new_role = event.get('new_role')
+        project = event.get('project')
         
-        elif action == 'update_role':
-            username = event.get('username')
-            new_role = event.get('new_role')
-            project = event.get('project')
-            
-            result = onboarding.update_user_role(username, new_role, project)
-            
-            return {
-                'statusCode': 200 if result['success'] else 400,
-                'body': json.dumps(result)
-            }
+        result = onboarding.update_user_role(username, new_role, project)
         
-        elif action == 'deactivate_user':
-            username = event.get('username')
-            reason = event.get('reason', 'Administrative action')
-            
-            result = onboarding.deactivate_user(username, reason)
-            
-            return {
-                'statusCode': 200 if result['success'] else 400,
-                'body': json.dumps(result)
-            }
+        return {
+            'statusCode': 200 if result['success'] else 400,
+            'body': json.dumps(result)
+        }
+    
+    elif action == 'deactivate_user':
+        username = event.get('username')
+        reason = event.get('reason', 'Administrative action')
         
-        elif action == 'rotate_keys':
-            username = event.get('username')
-            result = onboarding.rotate_access_keys(username)
-            
-            return {
-                'statusCode': 200 if result['success'] else 400,
-                'body': json.dumps(result)
-            }
+        result = onboarding.deactivate_user(username, reason)
         
-        elif action == 'bulk_onboard':
-            users_data = event.get('users_data', [])
-            result = onboarding.bulk_onboard_users(users_data)
-            
-            return {
-                'statusCode': 200,
-                'body': json.dumps(result)
-            }
+        return {
+            'statusCode': 200 if result['success'] else 400,
+            'body': json.dumps(result)
+        }
+    
+    elif action == 'rotate_keys':
+        username = event.get('username')
+        result = onboarding.rotate_access_keys(username)
         
-        else:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({
-                    'success': False,
-                    'message': f'Unknown action: {action}'
-                })
-            }
+        return {
+            'statusCode': 200 if result['success'] else 400,
+            'body': json.dumps(result)
+        }
+    
+    elif action == 'bulk_onboard':
+        users_data = event.get('users_data', [])
+        continuation = ContinuationManager(event, context)
+        result = onboarding.bulk_onboard_users(users_data, continuation)
+        
+        if continuation.suspended:
+            return continuation.suspended_response('Bulk onboarding continues asynchronously')
+        continuation.finish()
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result)
+        }
+    
+    else:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'success': False,
+                'message': f'Unknown action: {action}'
+            })
+        }
+
+def lambda_handler(event, context):
+    """Lambda エントリーポイント"""
+    # 構造化ログ（サンプリング有効）とAPI呼び出し・処理時間の集計を開始
+    configure_logging(context)
+    metrics = start_invocation_metrics(context)
+    
+    try:
+        onboarding = ITSANDBOXUserOnboarding()
+        action = event.get('action', 'create_user')
+        metrics.set_property('Action', action)
+        
+        with metrics.stage(action):
+            return run_action(onboarding, action, event, context)
         
     except Exception as e:
         logger.error(f"Lambda実行エラー: {str(e)}")
@@ -503,6 +550,9 @@ def lambda_handler(event, context):
                 'message': 'User onboarding failed'
             })
         }
+    
+    finally:
+        metrics.emit()
 
 # ローカルテスト用
 if __name__ == "__main__":
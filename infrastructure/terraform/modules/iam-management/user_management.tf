@@ -37,6 +37,16 @@ resource "aws_lambda_function" "user_management" {
       ACCESS_KEY_ROTATION_DAYS    = var.auto_user_management.access_key_rotation_days
       NOTIFICATION_EMAIL          = var.security_settings.notification_email
       SNS_TOPIC_ARN              = aws_sns_topic.iam_notifications.arn
+      STATE_BUCKET               = var.lambda_state_bucket
+      OUTPUT_BUCKET              = var.lambda_state_bucket
+      AUDIT_OUTPUT_STREAMING     = var.audit_output_streaming
+      REMEDIATION_DRY_RUN        = var.stale_identity_remediation.dry_run
+      REMEDIATION_ALLOW_LIST     = join(",", var.stale_identity_remediation.allow_list)
+      REMEDIATION_REQUESTS_PER_SECOND = var.stale_identity_remediation.requests_per_second
+      EXTERNAL_ID                = var.external_id
+      ORG_AUDIT_ROLE_NAME        = var.organization_audit.audit_role_name
+      ORG_AUDIT_MAX_ACCOUNTS     = var.organization_audit.max_parallel_accounts
+      ORG_AUDIT_ACCOUNT_MAX_WORKERS = var.organization_audit.account_max_workers
     }
   }
 
@@ -70,7 +80,7 @@ resource "aws_iam_role_policy" "user_management_lambda_policy" {
 
   policy = jsonencode({
     Version = "2012-10-17"
-    Statement = [
+    Statement = concat([
       {
         Effect = "Allow"
         Action = [
@@ -80,6 +90,14 @@ resource "aws_iam_role_policy" "user_management_lambda_policy" {
         ]
         Resource = "arn:aws:logs:*:*:*"
       },
+      {
+        # タイムアウト前の継続実行（自身の非同期再呼び出し）
+        Effect = "Allow"
+        Action = [
+          "lambda:InvokeFunction"
+        ]
+        Resource = aws_lambda_function.user_management.arn
+      },
       {
         Effect = "Allow"
         Action = [
@@ -94,10 +112,51 @@ resource "aws_iam_role_policy" "user_management_lambda_policy" {
           "iam:TagUser",
           "iam:UntagUser",
           "iam:GenerateCredentialReport",
-          "iam:GetCredentialReport"
+          "iam:GetCredentialReport",
+          "iam:GetAccountAuthorizationDetails",
+          "iam:GetPolicy",
+          "iam:GetPolicyVersion",
+          "iam:GenerateServiceLastAccessedDetails",
+          "iam:GetServiceLastAccessedDetails"
+        ]
+        Resource = "*"
+      },
+      {
+        # IAM変更イベントの再監査: 一括取得を使わない個別APIでの判定
+        Effect = "Allow"
+        Action = [
+          "iam:ListMFADevices",
+          "iam:GetLoginProfile",
+          "iam:ListAttachedUserPolicies",
+          "iam:ListUserPolicies",
+          "iam:ListGroupsForUser",
+          "iam:GetAccessKeyLastUsed"
         ]
         Resource = "*"
       },
+      {
+        # 不要アイデンティティの自動修復（remediate）: ログインプロファイルの削除
+        Effect = "Allow"
+        Action = [
+          "iam:DeleteLoginProfile"
+        ]
+        Resource = "arn:aws:iam::*:user/itsandbox/*"
+      },
+      {
+        # 組織横断監査（org_audit）: アカウント一覧の取得と各アカウントの監査ロールの引き受け
+        Effect = "Allow"
+        Action = [
+          "organizations:ListAccounts"
+        ]
+        Resource = "*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "sts:AssumeRole"
+        ]
+        Resource = "arn:aws:iam::*:role/itsandbox/${var.organization_audit.audit_role_name}"
+      },
       {
         Effect = "Allow"
         Action = [
@@ -118,8 +177,82 @@ resource "aws_iam_role_policy" "user_management_lambda_policy" {
           }
         }
       }
+    ], local.state_bucket_statements)
+  })
+}
+
+# 組織横断監査で管理アカウントのLambdaが引き受ける読み取り専用の監査ロール
+# （メンバーアカウントにもこのモジュールを適用して作成する）
+resource "aws_iam_role" "itsandbox_audit_role" {
+  name = var.organization_audit.audit_role_name
+  path = "/itsandbox/"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Principal = {
+          AWS = "arn:aws:iam::${var.master_account_id}:role/itsandbox/ITSANDBOXUserManagementLambdaRole"
+        }
+        Action = "sts:AssumeRole"
+        Condition = {
+          StringEquals = {
+            "sts:ExternalId": var.external_id
+          }
+        }
+      }
     ]
   })
+
+  tags = merge(var.common_tags, {
+    Role = "Audit"
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "audit_role_security_audit" {
+  role       = aws_iam_role.itsandbox_audit_role.name
+  policy_arn = "arn:aws:iam::aws:policy/SecurityAudit"
+}
+
+# Lambda共通ライブラリ（infrastructure/shared/itsandbox_common）
+locals {
+  shared_lambda_dir   = "${path.module}/../../../shared"
+  shared_lambda_files = fileset(local.shared_lambda_dir, "itsandbox_common/*.py")
+
+  # user_management専用のIAM監査エンジン（lambda/iam_audit、コンプライアンスルールのJSONを含む）
+  iam_audit_files = fileset("${path.module}/lambda", "iam_audit/*.{py,json}")
+
+  # チェックポイント・状態保存用S3バケットへのアクセス（未設定時はLambdaの/tmpを使用）
+  state_bucket_statements = var.lambda_state_bucket != "" ? [
+    {
+      Effect = "Allow"
+      Action = [
+        "s3:GetObject",
+        "s3:PutObject",
+        "s3:DeleteObject"
+      ]
+      Resource = "arn:aws:s3:::${var.lambda_state_bucket}/itsandbox-state/*"
+    },
+    {
+      # 監査結果のNDJSON出力（マルチパートアップロード）
+      Effect = "Allow"
+      Action = [
+        "s3:GetObject",
+        "s3:PutObject",
+        "s3:AbortMultipartUpload",
+        "s3:ListMultipartUploadParts"
+      ]
+      Resource = "arn:aws:s3:::${var.lambda_state_bucket}/itsandbox-output/*"
+    },
+    {
+      Effect = "Allow"
+      Action = [
+        "s3:ListBucket"
+      ]
+      Resource = "arn:aws:s3:::${var.lambda_state_bucket}"
+    }
+  ] : []
 }
 
 # Lambda function code
@@ -133,6 +266,22 @@ data "archive_file" "user_management_zip" {
     })
     filename = "index.py"
   }
+
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.shared_lambda_dir}/${source.value}")
+      filename = source.value
+    }
+  }
+
+  dynamic "source" {
+    for_each = local.iam_audit_files
+    content {
+      content  = file("${path.module}/lambda/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 # ====================
@@ -157,6 +306,7 @@ resource "aws_lambda_function" "user_onboarding" {
       NOTIFICATION_EMAIL     = var.security_settings.notification_email
       SNS_TOPIC_ARN         = aws_sns_topic.iam_notifications.arn
       EXTERNAL_ID           = var.external_id
+      STATE_BUCKET          = var.lambda_state_bucket
     }
   }
 
@@ -190,7 +340,7 @@ resource "aws_iam_role_policy" "user_onboarding_lambda_policy" {
 
   policy = jsonencode({
     Version = "2012-10-17"
-    Statement = [
+    Statement = concat([
       {
         Effect = "Allow"
         Action = [
@@ -200,6 +350,14 @@ resource "aws_iam_role_policy" "user_onboarding_lambda_policy" {
         ]
         Resource = "arn:aws:logs:*:*:*"
       },
+      {
+        # タイムアウト前の継続実行（自身の非同期再呼び出し）
+        Effect = "Allow"
+        Action = [
+          "lambda:InvokeFunction"
+        ]
+        Resource = aws_lambda_function.user_onboarding.arn
+      },
       {
         Effect = "Allow"
         Action = [
@@ -241,7 +399,7 @@ resource "aws_iam_role_policy" "user_onboarding_lambda_policy" {
           }
         }
       }
-    ]
+    ], local.state_bucket_statements)
   })
 }
 
@@ -257,6 +415,14 @@ data "archive_file" "user_onboarding_zip" {
     })
     filename = "index.py"
   }
+
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.shared_lambda_dir}/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 # ====================
@@ -279,7 +445,7 @@ resource "aws_sns_topic_subscription" "iam_email_notification" {
 # EventBridge Rules for User Management
 # ====================
 
-# 週次ユーザー監査
+# 週次ユーザー監査（ユーザー監査とアクセスキー監査を1回の呼び出しでバッチ実行）
 resource "aws_cloudwatch_event_rule" "weekly_user_audit" {
   name                = "itsandbox-weekly-user-audit"
   description         = "Weekly user access audit"
@@ -294,7 +460,7 @@ resource "aws_cloudwatch_event_target" "user_audit_lambda_target" {
   arn       = aws_lambda_function.user_management.arn
 
   input = jsonencode({
-    action = "audit_users"
+    actions = ["audit_users", "audit_access_keys", "audit_service_usage"]
   })
 }
 
@@ -394,4 +560,67 @@ resource "aws_cloudwatch_event_target" "iam_events_log_group" {
   rule      = aws_cloudwatch_event_rule.iam_events[0].name
   target_id = "SendToCloudWatchLogs"
   arn       = aws_cloudwatch_log_group.iam_events[0].arn
+}
+
+# ユーザー単位のIAM変更で対象ユーザーだけを再監査（IAMのイベントは us-east-1 に配信される）
+resource "aws_cloudwatch_event_rule" "iam_user_changes" {
+  count = var.security_settings.enable_cloudtrail_integration ? 1 : 0
+
+  name        = "itsandbox-iam-user-changes"
+  description = "Re-audit IAM users when their credentials, policies or tags change"
+
+  event_pattern = jsonencode({
+    source      = ["aws.iam"]
+    detail-type = [
+      "AWS API Call via CloudTrail"
+    ]
+    detail = {
+      eventSource = ["iam.amazonaws.com"]
+      eventName = [
+        "CreateUser",
+        "DeleteUser",
+        "UpdateUser",
+        "TagUser",
+        "UntagUser",
+        "AttachUserPolicy",
+        "DetachUserPolicy",
+        "PutUserPolicy",
+        "DeleteUserPolicy",
+        "PutUserPermissionsBoundary",
+        "DeleteUserPermissionsBoundary",
+        "AddUserToGroup",
+        "RemoveUserFromGroup",
+        "CreateAccessKey",
+        "UpdateAccessKey",
+        "DeleteAccessKey",
+        "CreateLoginProfile",
+        "UpdateLoginProfile",
+        "DeleteLoginProfile",
+        "ChangePassword",
+        "EnableMFADevice",
+        "DeactivateMFADevice",
+        "ResyncMFADevice"
+      ]
+    }
+  })
+
+  tags = var.common_tags
+}
+
+resource "aws_cloudwatch_event_target" "iam_user_changes_lambda_target" {
+  count = var.security_settings.enable_cloudtrail_integration ? 1 : 0
+
+  rule      = aws_cloudwatch_event_rule.iam_user_changes[0].name
+  target_id = "ReauditChangedUser"
+  arn       = aws_lambda_function.user_management.arn
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_iam_user_changes" {
+  count = var.security_settings.enable_cloudtrail_integration ? 1 : 0
+
+  statement_id  = "AllowExecutionFromEventBridgeIAMUserChanges"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.user_management.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.iam_user_changes[0].arn
 }
\ No newline at end of file
@@ -202,4 +202,44 @@ variable "lambda_execution_settings" {
     max_memory_mb                = 1024
     vpc_config_required          = false
   }
-}
\ No newline at end of file
+}
+
+variable "lambda_state_bucket" {
+  description = "S3 bucket for Lambda checkpoints and persisted state (empty = local /tmp stand-in, which is not shared between invocations: asynchronous continuation, the query_audit index and audit history trends require this bucket)"
+  type        = string
+  default     = ""
+}
+
+variable "audit_output_streaming" {
+  description = "Write per-user audit results as NDJSON to lambda_state_bucket (or /tmp) and return only a manifest and counts"
+  type        = bool
+  default     = false
+}
+
+variable "stale_identity_remediation" {
+  description = "Automatic deactivation of unused users and access keys (remediate action)"
+  type = object({
+    dry_run             = bool
+    allow_list          = list(string)
+    requests_per_second = number
+  })
+  default = {
+    dry_run             = true
+    allow_list          = []
+    requests_per_second = 2
+  }
+}
+
+variable "organization_audit" {
+  description = "Organization-wide IAM audit (org_audit action) settings"
+  type = object({
+    audit_role_name      = string
+    max_parallel_accounts = number
+    account_max_workers  = number
+  })
+  default = {
+    audit_role_name      = "ITSANDBOXAuditRole"
+    max_parallel_accounts = 4
+    account_max_workers  = 4
+  }
+}
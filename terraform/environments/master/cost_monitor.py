@@ -1,18 +1,28 @@
 import json
 import boto3
+import logging
 import os
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+from itsandbox_common import configure_logging, create_client, log_fields, start_invocation_metrics
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
 def handler(event, context):
     """
     ITSANDBOX Cost Monitor Lambda Function
     Monitors daily AWS costs and sends alerts when thresholds are exceeded
     """
     
-    # Initialize AWS clients
-    ce_client = boto3.client('ce')
-    sns_client = boto3.client('sns')
+    # Structured (sampled) logging plus API call and stage timings emitted as one EMF line
+    configure_logging(context)
+    metrics = start_invocation_metrics(context)
+    
+    # Initialize AWS clients (shared pool/retry configuration, reused across warm invocations)
+    ce_client = create_client('ce')
+    sns_client = create_client('sns')
     
     # Get environment variables
     budget_limit = float(os.environ.get('BUDGET_LIMIT', '100'))
@@ -24,20 +34,21 @@ def handler(event, context):
         start_date = end_date - timedelta(days=1)
         
         # Get cost and usage data
-        response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_date.strftime('%Y-%m-%d'),
-                'End': end_date.strftime('%Y-%m-%d')
-            },
-            Granularity='DAILY',
-            Metrics=['BlendedCost'],
-            GroupBy=[
-                {
-                    'Type': 'DIMENSION',
-                    'Key': 'SERVICE'
-                }
-            ]
-        )
+        with metrics.stage('daily_costs'):
+            response = ce_client.get_cost_and_usage(
+                TimePeriod={
+                    'Start': start_date.strftime('%Y-%m-%d'),
+                    'End': end_date.strftime('%Y-%m-%d')
+                },
+                Granularity='DAILY',
+                Metrics=['BlendedCost'],
+                GroupBy=[
+                    {
+                        'Type': 'DIMENSION',
+                        'Key': 'SERVICE'
+                    }
+                ]
+            )
         
         # Calculate total cost
         total_cost = 0
@@ -56,14 +67,15 @@ def handler(event, context):
         
         # Get monthly cost (current month)
         start_of_month = end_date.replace(day=1)
-        monthly_response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_of_month.strftime('%Y-%m-%d'),
-                'End': end_date.strftime('%Y-%m-%d')
-            },
-            Granularity='MONTHLY',
-            Metrics=['BlendedCost']
-        )
+        with metrics.stage('monthly_costs'):
+            monthly_response = ce_client.get_cost_and_usage(
+                TimePeriod={
+                    'Start': start_of_month.strftime('%Y-%m-%d'),
+                    'End': end_date.strftime('%Y-%m-%d')
+                },
+                Granularity='MONTHLY',
+                Metrics=['BlendedCost']
+            )
         
         monthly_cost = 0
         if monthly_response['ResultsByTime']:
@@ -82,20 +94,27 @@ def handler(event, context):
             'service_costs': sorted(service_costs, key=lambda x: x['cost'], reverse=True)[:10]
         }
         
-        # Log cost information
-        print(f"ITSANDBOX Cost Report for {end_date}")
-        print(f"Daily Cost: ${total_cost:.2f}")
-        print(f"Monthly Cost: ${monthly_cost:.2f}")
-        print(f"Budget Usage: {usage_percentage:.1f}%")
+        # Log cost information (one summary line; the full report goes out via SNS only)
+        logger.info(
+            f"ITSANDBOX Cost Report for {end_date}",
+            extra=log_fields(
+                always=True,
+                daily_cost=round(total_cost, 2),
+                monthly_cost=round(monthly_cost, 2),
+                usage_percentage=round(usage_percentage, 1)
+            )
+        )
         
         # Send alert if threshold exceeded
         alert_sent = False
-        if usage_percentage >= 90:
-            send_alert(sns_client, cost_report, 'CRITICAL', admin_email)
-            alert_sent = True
-        elif usage_percentage >= 80:
-            send_alert(sns_client, cost_report, 'WARNING', admin_email)
-            alert_sent = True
+        with metrics.stage('send_alert'):
+            if usage_percentage >= 90:
+                send_alert(sns_client, cost_report, 'CRITICAL', admin_email)
+                alert_sent = True
+            elif usage_percentage >= 80:
+                send_alert(sns_client, cost_report, 'WARNING', admin_email)
+                alert_sent = True
+        metrics.set_property('BudgetUsagePercentage', round(usage_percentage, 1))
         
         return {
             'statusCode': 200,
@@ -108,7 +127,7 @@ def handler(event, context):
         
     except Exception as e:
         error_message = f"Error in cost monitoring: {str(e)}"
-        print(error_message)
+        logger.error(error_message)
         
         # Send error notification
         try:
@@ -126,6 +145,9 @@ def handler(event, context):
                 'error': error_message
             })
         }
+    
+    finally:
+        metrics.emit()
 
 def send_alert(sns_client, cost_report, alert_type, admin_email):
     """Send cost alert via SNS"""
@@ -175,16 +197,18 @@ ITSANDBOX Budget Alert - {cost_report['date']}
             Subject=subject,
             Message=message
         )
-        print(f"Alert sent successfully: {alert_type}")
+        logger.info(f"Alert sent successfully: {alert_type}", extra=log_fields(always=True))
         
     except Exception as e:
-        print(f"Failed to send SNS alert: {str(e)}")
-        # Fallback: just log the alert
-        print(f"ALERT CONTENT:\nSubject: {subject}\nMessage: {message}")
+        # Fallback: log the full alert so it is not lost
+        logger.error(
+            f"Failed to send SNS alert: {str(e)}",
+            extra=log_fields(alert_subject=subject, alert_message=message)
+        )
 
 def get_sns_topic_arn():
     """Get SNS topic ARN for cost alerts"""
-    sns_client = boto3.client('sns')
+    sns_client = create_client('sns')
     
     try:
         response = sns_client.list_topics()
@@ -192,10 +216,10 @@ def get_sns_topic_arn():
             if 'itsandbox-cost-alerts' in topic['TopicArn']:
                 return topic['TopicArn']
     except Exception as e:
-        print(f"Error finding SNS topic: {str(e)}")
+        logger.warning(f"Error finding SNS topic: {str(e)}")
     
     # Fallback: construct ARN based on current account
-    sts_client = boto3.client('sts')
+    sts_client = create_client('sts')
     account_id = sts_client.get_caller_identity()['Account']
     region = boto3.Session().region_name or 'us-east-1'
     
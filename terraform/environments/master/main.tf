@@ -204,12 +204,37 @@ resource "aws_s3_bucket_policy" "cloudtrail_bucket_policy" {
   })
 }
 
+# Cost monitoring Lambda function code (handler + shared itsandbox_common library)
+locals {
+  shared_lambda_dir   = "${path.module}/../../../infrastructure/shared"
+  shared_lambda_files = fileset(local.shared_lambda_dir, "itsandbox_common/*.py")
+}
+
+data "archive_file" "cost_monitor_zip" {
+  type        = "zip"
+  output_path = "${path.module}/cost_monitor.zip"
+
+  source {
+    content  = file("${path.module}/cost_monitor.py")
+    filename = "index.py"
+  }
+
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.shared_lambda_dir}/${source.value}")
+      filename = source.value
+    }
+  }
+}
+
 # Cost monitoring Lambda function
 resource "aws_lambda_function" "cost_monitor" {
-  filename         = "cost_monitor.zip"
+  filename         = data.archive_file.cost_monitor_zip.output_path
   function_name    = "itsandbox-cost-monitor"
   role            = aws_iam_role.lambda_role.arn
   handler         = "index.handler"
+  source_code_hash = data.archive_file.cost_monitor_zip.output_base64sha256
   runtime         = "python3.9"
   timeout         = 60
 